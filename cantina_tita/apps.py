@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+from django.core.signals import request_started
+
+
+def _iniciar_bus_invalidacion(**kwargs):
+    from .invalidacion import iniciar
+    iniciar()
+
+
+class CantinaTitaConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cantina_tita'
+
+    def ready(self):
+        from .cache import conectar_invalidacion
+        conectar_invalidacion()
+        # El hilo oyente se inicia con la primera petición de cada worker
+        # (después del fork de gunicorn), no al cargar la aplicación
+        request_started.connect(_iniciar_bus_invalidacion, dispatch_uid='bus_invalidacion')
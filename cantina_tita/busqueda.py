@@ -0,0 +1,90 @@
+"""
+Búsqueda de texto independiente de la base de datos
+
+En PostgreSQL las búsquedas "contiene" se hacen sin distinguir acentos
+("Jose" encuentra "José") sobre la expresión ``UPPER(f_unaccent(campo))``, que
+tiene índices GIN de trigramas (``pg_trgm``) creados por las migraciones de
+cada app. Así un ``LIKE '%texto%'`` usa el índice en lugar de recorrer toda la
+tabla.
+
+En otras bases (SQLite en desarrollo) se mantiene el ``icontains`` de siempre.
+"""
+from functools import reduce
+import operator
+
+from django.db import connection
+from django.db.models import CharField, TextField, Q, Transform
+
+# SQL compartido por las migraciones que crean los índices
+SQL_EXTENSIONES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    # unaccent() no es IMMUTABLE y no puede indexarse: se envuelve fijando el diccionario
+    """
+    CREATE OR REPLACE FUNCTION public.f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+]
+
+
+def sql_indice_trigramas(tabla, columna):
+    """Índice GIN de trigramas sobre la misma expresión que genera ``sin_acentos__icontains``"""
+    nombre = f'{tabla}_{columna}_trgm'
+    crear = (
+        f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} '
+        f'USING gin (UPPER(public.f_unaccent({columna})) gin_trgm_ops)'
+    )
+    return crear, f'DROP INDEX IF EXISTS {nombre}'
+
+
+def crear_indices_trigramas(indices):
+    """
+    Arma las funciones para un ``migrations.RunPython`` que crea (y revierte)
+    los índices sólo en PostgreSQL.
+
+    Args:
+        indices: lista de tuplas (tabla, columna)
+    """
+    def crear(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in SQL_EXTENSIONES:
+            schema_editor.execute(sql)
+        for tabla, columna in indices:
+            schema_editor.execute(sql_indice_trigramas(tabla, columna)[0])
+
+    def eliminar(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for tabla, columna in indices:
+            schema_editor.execute(sql_indice_trigramas(tabla, columna)[1])
+
+    return crear, eliminar
+
+
+class SinAcentos(Transform):
+    """``campo__sin_acentos``: compara sin acentos (sólo PostgreSQL)"""
+    lookup_name = 'sin_acentos'
+    function = 'public.f_unaccent'
+    bilateral = True
+
+
+# EmailField y SlugField heredan el lookup de CharField
+for _campo in (CharField, TextField):
+    _campo.register_lookup(SinAcentos)
+
+
+def usa_indices_trigramas():
+    return connection.vendor == 'postgresql'
+
+
+def filtro_texto(campos, termino):
+    """
+    Q que encuentra ``termino`` dentro de cualquiera de los ``campos``.
+
+    Ejemplo:
+        PerfilHijo.objects.filter(filtro_texto(['nombre_completo'], 'jose'))
+    """
+    sufijo = '__sin_acentos__icontains' if usa_indices_trigramas() else '__icontains'
+    return reduce(operator.or_, (Q(**{f'{campo}{sufijo}': termino}) for campo in campos))
@@ -0,0 +1,188 @@
+"""
+Caché de cálculos del proyecto
+
+Cada modelo que se cachea tiene un número de versión guardado en el caché de
+Django (``version:<app>.<modelo>``). Las señales ``post_save`` y ``post_delete``
+lo aumentan, igual que las funciones que modifican filas con
+``QuerySet.update`` (stock, saldo), que no disparan señales.
+
+Un cálculo declarado con ``@cacheado`` guarda su resultado bajo una clave que
+incluye la versión de los modelos de los que depende: cuando alguno cambia la
+clave cambia y el cálculo se rehace; las entradas viejas vencen solas. Como
+las versiones viven en el backend de caché, la invalidación alcanza a todos
+los workers que lo comparten (archivo o memcached); entre servidores con
+cachés separados la propaga el bus de ``invalidacion.py``.
+
+Ejemplo:
+
+    @cacheado('reportes.lista_reportes', ['ventas.Venta', 'productos.Producto'])
+    def estadisticas_generales(hoy):
+        ...
+
+Cada cálculo cuenta sus aciertos y fallos (ver ``estadisticas()``).
+"""
+import functools
+import hashlib
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from . import invalidacion
+
+# Modelos cuya versión aumenta automáticamente al guardarse o borrarse
+MODELOS_VERSIONADOS = [
+    'ventas.Venta',
+    'productos.Producto',
+    'productos.Categoria',
+    'usuarios.PerfilHijo',
+    'ventas.Factura',
+]
+
+_AUSENTE = object()
+
+# Nombres de los cálculos declarados en este proceso
+_calculos = set()
+
+
+def _modelo(modelo):
+    return apps.get_model(modelo) if isinstance(modelo, str) else modelo
+
+
+def _clave_version(modelo):
+    return f'version:{_modelo(modelo)._meta.label_lower}'
+
+
+def versiones(modelos):
+    """Versión actual de cada modelo (una lectura del caché)"""
+    claves = [_clave_version(modelo) for modelo in modelos]
+    actuales = cache.get_many(claves)
+    faltantes = [clave for clave in claves if clave not in actuales]
+    if faltantes:
+        # Valor inicial distinto después de vaciar el caché, para no reutilizar
+        # resultados guardados con una versión anterior
+        for clave in faltantes:
+            cache.add(clave, time.time_ns(), timeout=None)
+        actuales.update(cache.get_many(faltantes))
+    return [actuales[clave] for clave in claves]
+
+
+def _aumentar_version(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # La clave no existe: la próxima lectura crea una versión nueva
+        pass
+
+
+def invalidar_modelo(modelo, ids=None):
+    """
+    Aumenta la versión del modelo: los cálculos que dependen de él se rehacen.
+    Si el modelo está en el bus de invalidación, también se avisa a los demás
+    servidores (``ids``: filas modificadas, si se conocen).
+    """
+    modelo = _modelo(modelo)
+    clave = _clave_version(modelo)
+
+    _aumentar_version(clave)
+    # Otra vez al confirmar: otro proceso pudo recalcular con los datos
+    # anteriores entre el cambio y el commit
+    transaction.on_commit(lambda: _aumentar_version(clave))
+
+    if modelo._meta.label_lower in invalidacion.MODELOS:
+        invalidacion.publicar(modelo._meta.label_lower, ids)
+
+
+def _invalidar_por_senal(sender, instance, **kwargs):
+    invalidar_modelo(sender, [instance.pk])
+
+
+def conectar_invalidacion(modelos=None):
+    """
+    Conecta las señales de guardado y borrado de los modelos versionados y
+    los avisos de otros servidores recibidos por el bus de invalidación
+    """
+    for modelo in modelos or MODELOS_VERSIONADOS:
+        modelo = _modelo(modelo)
+        etiqueta = modelo._meta.label_lower
+        post_save.connect(_invalidar_por_senal, sender=modelo, dispatch_uid=f'cache_guardado_{etiqueta}')
+        post_delete.connect(_invalidar_por_senal, sender=modelo, dispatch_uid=f'cache_borrado_{etiqueta}')
+        if etiqueta in invalidacion.MODELOS:
+            clave = _clave_version(modelo)
+            invalidacion.suscribir(etiqueta, lambda ids, clave=clave: _aumentar_version(clave))
+
+
+def _contar(nombre, resultado):
+    clave = f'estadisticas:{nombre}:{resultado}'
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, timeout=None):
+            cache.incr(clave)
+
+
+def cacheado(nombre, modelos, timeout=DEFAULT_TIMEOUT):
+    """
+    Decorador que cachea el resultado de una función según sus argumentos y
+    la versión de los modelos de los que depende.
+
+    Args:
+        nombre: identificador del cálculo (se usa en las claves y estadísticas)
+        modelos: modelos o etiquetas 'app.Modelo' que invalidan el resultado
+        timeout: segundos que se conserva el resultado (por defecto el de CACHES)
+
+    El resultado debe poder serializarse: convertir los QuerySet a listas.
+    La función original queda disponible como ``funcion.sin_cache``.
+    """
+    def decorador(funcion):
+        _calculos.add(nombre)
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            version = '.'.join(str(v) for v in versiones([_modelo(m) for m in modelos]))
+            argumentos = hashlib.md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+            clave = f'calculo:{nombre}:{version}:{argumentos}'
+
+            valor = cache.get(clave, _AUSENTE)
+            if valor is not _AUSENTE:
+                _contar(nombre, 'aciertos')
+                return valor
+
+            _contar(nombre, 'fallos')
+            valor = funcion(*args, **kwargs)
+            cache.set(clave, valor, timeout)
+            return valor
+
+        envoltura.sin_cache = funcion
+        return envoltura
+    return decorador
+
+
+def estadisticas():
+    """Aciertos, fallos y tasa de aciertos de cada cálculo cacheado"""
+    claves = [
+        f'estadisticas:{nombre}:{resultado}'
+        for nombre in _calculos for resultado in ('aciertos', 'fallos')
+    ]
+    contadores = cache.get_many(claves)
+    datos = {}
+    for nombre in sorted(_calculos):
+        aciertos = contadores.get(f'estadisticas:{nombre}:aciertos', 0)
+        fallos = contadores.get(f'estadisticas:{nombre}:fallos', 0)
+        total = aciertos + fallos
+        datos[nombre] = {
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'tasa_aciertos': round(aciertos / total, 3) if total else None,
+        }
+    return datos
+
+
+def reiniciar_estadisticas():
+    cache.delete_many([
+        f'estadisticas:{nombre}:{resultado}'
+        for nombre in _calculos for resultado in ('aciertos', 'fallos')
+    ])
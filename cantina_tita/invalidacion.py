@@ -0,0 +1,202 @@
+"""
+Bus de invalidación de cachés en memoria entre servidores
+
+Con varios servidores detrás de un mismo PostgreSQL, los datos que cada
+proceso guarda en memoria (índice de productos, tablas de referencia,
+versiones del caché local) quedan viejos cuando el cambio se hace en otro
+nodo. Cada cambio de un modelo publicado se anuncia y cada proceso tiene un
+hilo que escucha y descarta lo afectado.
+
+Modos (``CANTINA_CONFIG['CACHE_INVALIDACION']``):
+
+- ``''``: desactivado (un solo servidor).
+- ``'notify'``: ``pg_notify`` dentro de la transacción del cambio (PostgreSQL
+  sólo lo entrega si la transacción se confirma) y un hilo con ``LISTEN``.
+- ``'polling'``: el cambio aumenta una fila de ``VersionCache`` al confirmarse
+  y el hilo consulta la tabla cada ``CACHE_INVALIDACION_INTERVALO`` segundos.
+  Funciona con cualquier base de datos.
+
+Los módulos que cachean en memoria se suscriben con
+``suscribir('app.modelo', funcion)``; la función recibe la lista de ids
+modificados o ``None`` si hay que descartar todo.
+"""
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+CANAL = 'cantina_invalidacion'
+
+# Modelos cuyos cambios se anuncian
+MODELOS = {
+    'productos.producto',
+    'productos.categoria',
+    'usuarios.perfilhijo',
+    'ventas.metodopago',
+    'ventas.puntoventa',
+    'facturacion.configuracionfacturacion',
+}
+
+# Por encima de esta cantidad se anuncia "todo el modelo" (pg_notify admite ~8000 bytes)
+MAXIMO_IDS = 500
+
+# Identifica a este proceso para ignorar sus propios anuncios
+ORIGEN = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+_suscriptores = {}
+_oyente = None
+_lock = threading.Lock()
+
+
+def modo():
+    return settings.CANTINA_CONFIG.get('CACHE_INVALIDACION', '')
+
+
+def suscribir(etiqueta, funcion):
+    """Registra ``funcion(ids)`` para los cambios del modelo ``etiqueta`` ('app.modelo')"""
+    _suscriptores.setdefault(etiqueta.lower(), []).append(funcion)
+
+
+def despachar(etiqueta, ids=None):
+    """Ejecuta las suscripciones locales de un modelo"""
+    for funcion in _suscriptores.get(etiqueta.lower(), []):
+        try:
+            funcion(ids)
+        except Exception:
+            logger.exception('Error invalidando %s', etiqueta)
+
+
+def despachar_todo():
+    """Descarta todo lo cacheado (p. ej. al reconectar: pudieron perderse anuncios)"""
+    for etiqueta in list(_suscriptores):
+        despachar(etiqueta)
+
+
+def publicar(etiqueta, ids=None):
+    """
+    Anuncia a los demás procesos que cambiaron filas del modelo.
+    Debe llamarse en la misma transacción que el cambio.
+    """
+    actual = modo()
+    if not actual:
+        return
+    etiqueta = etiqueta.lower()
+
+    if actual == 'notify':
+        if connection.vendor != 'postgresql':
+            return
+        ids = sorted(set(ids)) if ids is not None and len(ids) <= MAXIMO_IDS else None
+        mensaje = json.dumps({'modelo': etiqueta, 'ids': ids, 'origen': ORIGEN})
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CANAL, mensaje])
+
+    elif actual == 'polling':
+        transaction.on_commit(lambda: _aumentar_version(etiqueta))
+
+
+def _aumentar_version(etiqueta):
+    from .models import VersionCache
+
+    if not VersionCache.objects.filter(nombre=etiqueta).update(version=F('version') + 1):
+        VersionCache.objects.get_or_create(nombre=etiqueta, defaults={'version': 1})
+
+
+class OyenteNotify:
+    """Escucha ``LISTEN`` en una conexión propia (psycopg2) y despacha los anuncios"""
+
+    def __init__(self):
+        self.conexion = None
+
+    def conectar(self):
+        conexion = connection.Database.connect(**connection.get_connection_params())
+        conexion.autocommit = True
+        with conexion.cursor() as cursor:
+            cursor.execute(f'LISTEN {CANAL}')
+        self.conexion = conexion
+
+    def revisar(self, espera=5):
+        """Espera anuncios hasta ``espera`` segundos y despacha los recibidos"""
+        if self.conexion is None:
+            self.conectar()
+            despachar_todo()
+        if select.select([self.conexion], [], [], espera) == ([], [], []):
+            return
+        self.conexion.poll()
+        while self.conexion.notifies:
+            aviso = self.conexion.notifies.pop(0)
+            try:
+                mensaje = json.loads(aviso.payload)
+            except ValueError:
+                continue
+            if mensaje.get('origen') != ORIGEN:
+                despachar(mensaje['modelo'], mensaje.get('ids'))
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+            self.conexion = None
+
+
+class OyentePolling:
+    """Consulta ``VersionCache`` y despacha los modelos cuya versión cambió"""
+
+    def __init__(self):
+        self.versiones = None
+
+    def revisar(self, espera=None):
+        from .models import VersionCache
+
+        if espera:
+            time.sleep(espera)
+        actuales = dict(VersionCache.objects.values_list('nombre', 'version'))
+        if self.versiones is not None:
+            for etiqueta, version in actuales.items():
+                if self.versiones.get(etiqueta) != version:
+                    despachar(etiqueta)
+        self.versiones = actuales
+
+    def cerrar(self):
+        connection.close()
+
+
+def _escuchar(oyente, intervalo):
+    while True:
+        try:
+            oyente.revisar(intervalo)
+        except Exception:
+            logger.exception('Error en el bus de invalidación; reintentando')
+            oyente.cerrar()
+            time.sleep(intervalo)
+
+
+def iniciar():
+    """Inicia el hilo oyente de este proceso (una sola vez, después del fork de gunicorn)"""
+    global _oyente
+    actual = modo()
+    if _oyente is not None or not actual:
+        return
+    with _lock:
+        if _oyente is not None:
+            return
+        if actual == 'notify':
+            if connection.vendor != 'postgresql':
+                logger.warning('CACHE_INVALIDACION=notify requiere PostgreSQL; bus desactivado')
+                _oyente = False
+                return
+            oyente = OyenteNotify()
+        else:
+            oyente = OyentePolling()
+        intervalo = settings.CANTINA_CONFIG.get('CACHE_INVALIDACION_INTERVALO', 2)
+        _oyente = threading.Thread(
+            target=_escuchar, args=(oyente, intervalo), name='bus-invalidacion', daemon=True
+        )
+        _oyente.start()
@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class VersionCache(models.Model):
+    """
+    Versión de los datos cacheados en memoria de cada modelo.
+    La usa el modo de invalidación por consulta periódica (ver invalidacion.py).
+    """
+    nombre = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre} v{self.version}"
+
+    class Meta:
+        verbose_name = "Versión de Caché"
+        verbose_name_plural = "Versiones de Caché"
@@ -28,6 +28,13 @@ CANTINA_CONFIG = {
     'TAX_RATE': config('TAX_RATE', default=10.0, cast=float),
     'DEBIT_CARD_FEE': config('DEBIT_CARD_FEE', default=4.0, cast=float),
     'CREDIT_CARD_FEE': config('CREDIT_CARD_FEE', default=6.0, cast=float),
+    # Horas que se conserva el resultado de una venta para responder reintentos
+    'IDEMPOTENCY_TTL_HOURS': config('IDEMPOTENCY_TTL_HOURS', default=24, cast=int),
+    # Días hacia atrás que se aceptan en la fecha de una venta hecha sin conexión
+    'DIAS_VENTAS_SIN_CONEXION': config('DIAS_VENTAS_SIN_CONEXION', default=7, cast=int),
+    # Invalidación de cachés en memoria entre servidores: '', 'notify' (PostgreSQL) o 'polling'
+    'CACHE_INVALIDACION': config('CACHE_INVALIDACION', default=''),
+    'CACHE_INVALIDACION_INTERVALO': config('CACHE_INVALIDACION_INTERVALO', default=2, cast=float),
 }
 
 
@@ -106,6 +113,28 @@ DATABASES = {
 }
 
 
+# Cache
+# locmem: desarrollo (un caché por proceso)
+# file / memcached: producción, compartido entre los workers de gunicorn
+# (memcached requiere pymemcache)
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'cantina-tita'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache', '127.0.0.1:11211'),
+}
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': config('CACHE_LOCATION', default=CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+        'KEY_PREFIX': 'cantina',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
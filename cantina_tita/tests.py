@@ -0,0 +1,85 @@
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from productos.busqueda import indice_productos
+from productos.models import Categoria, Producto
+from ventas import referencias
+from ventas.models import MetodoPago
+from . import invalidacion
+from .models import VersionCache
+
+
+def config_bus(modo):
+    return override_settings(CANTINA_CONFIG={**settings.CANTINA_CONFIG, 'CACHE_INVALIDACION': modo})
+
+
+class BusInvalidacionTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        categoria = Categoria.objects.create(nombre='Bebidas')
+        self.producto = Producto.objects.create(
+            categoria=categoria, codigo='B001', nombre='Agua mineral',
+            precio_costo=Decimal('1000'), precio_venta=Decimal('2000'), stock_actual=10
+        )
+        indice_productos.reconstruir()
+
+    def test_aviso_actualiza_el_indice_de_productos(self):
+        # Cambio hecho en otro servidor: este proceso no recibió la señal
+        Producto.objects.filter(pk=self.producto.pk).update(nombre='Jugo de naranja')
+        self.assertEqual(indice_productos.buscar_ids('jugo'), [])
+
+        invalidacion.despachar('productos.producto', [self.producto.pk])
+        self.assertEqual(indice_productos.buscar_ids('jugo'), [self.producto.pk])
+        self.assertEqual(indice_productos.buscar_ids('agua'), [])
+
+    def test_aviso_descarta_las_referencias_locales(self):
+        MetodoPago.objects.create(codigo='efectivo', nombre='Efectivo')
+        self.assertEqual(referencias.metodo_pago('efectivo').nombre, 'Efectivo')
+
+        MetodoPago.objects.filter(codigo='efectivo').update(nombre='Contado')
+        invalidacion.despachar('ventas.metodopago')
+        self.assertEqual(referencias.metodo_pago('efectivo').nombre, 'Contado')
+
+    @config_bus('polling')
+    def test_polling_sobre_la_tabla_de_versiones(self):
+        oyente = invalidacion.OyentePolling()
+        oyente.revisar()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.nombre = 'Jugo de naranja'
+            self.producto.save()
+        self.assertEqual(VersionCache.objects.get(nombre='productos.producto').version, 1)
+
+        recibidos = []
+        invalidacion.suscribir('productos.producto', recibidos.append)
+        try:
+            oyente.revisar()
+        finally:
+            invalidacion._suscriptores['productos.producto'].remove(recibidos.append)
+        self.assertEqual(recibidos, [None])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'LISTEN/NOTIFY requiere PostgreSQL')
+class BusNotifyTest(TransactionTestCase):
+
+    @config_bus('notify')
+    def test_notify_se_entrega_al_confirmar(self):
+        oyente = invalidacion.OyenteNotify()
+        oyente.conectar()
+        recibidos = []
+        invalidacion.suscribir('productos.producto', recibidos.append)
+        try:
+            # Anuncio de otro servidor
+            with mock.patch.object(invalidacion, 'ORIGEN', 'otro-servidor'):
+                invalidacion.publicar('productos.producto', [3, 1])
+            oyente.revisar(espera=2)
+            self.assertEqual(recibidos, [[1, 3]])
+        finally:
+            invalidacion._suscriptores['productos.producto'].remove(recibidos.append)
+            oyente.cerrar()
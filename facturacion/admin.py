@@ -1,3 +1,54 @@
 from django.contrib import admin
+from .models import Establecimiento, PuntoExpedicion, BloqueNumeracion, SaltoNumeracion
+from .numeracion import abandonar_bloques
 
-# Register your models here.
+
+@admin.register(Establecimiento)
+class EstablecimientoAdmin(admin.ModelAdmin):
+    """
+    Administración para establecimientos emisores
+    """
+    list_display = ('codigo', 'nombre', 'activo')
+    list_filter = ('activo',)
+    search_fields = ('codigo', 'nombre')
+    ordering = ('codigo',)
+
+
+class BloqueNumeracionInline(admin.TabularInline):
+    model = BloqueNumeracion
+    extra = 0
+    can_delete = False
+    readonly_fields = ('desde', 'hasta', 'siguiente', 'estado', 'fecha_creacion', 'fecha_cierre')
+
+
+@admin.register(PuntoExpedicion)
+class PuntoExpedicionAdmin(admin.ModelAdmin):
+    """
+    Administración para puntos de expedición
+    """
+    list_display = ('__str__', 'punto_venta', 'ultimo_numero_reservado', 'tamano_bloque', 'activo')
+    list_filter = ('establecimiento', 'activo')
+    ordering = ('establecimiento__codigo', 'codigo')
+    
+    inlines = [BloqueNumeracionInline]
+    readonly_fields = ('ultimo_numero_reservado',)
+    actions = ['abandonar_bloques_activos']
+    
+    @admin.action(description='Abandonar bloques activos (registra los números sin usar)')
+    def abandonar_bloques_activos(self, request, queryset):
+        saltos = []
+        for punto in queryset:
+            saltos += abandonar_bloques(punto, 'Abandonado desde el administrador', request.user)
+        self.message_user(request, f'{len(saltos)} saltos de numeración registrados')
+
+
+@admin.register(SaltoNumeracion)
+class SaltoNumeracionAdmin(admin.ModelAdmin):
+    """
+    Auditoría de números de factura no utilizados
+    """
+    list_display = ('punto_expedicion', 'desde', 'hasta', 'cantidad', 'motivo', 'usuario', 'fecha')
+    list_filter = ('punto_expedicion', 'fecha')
+    ordering = ('-fecha',)
+    
+    readonly_fields = ('punto_expedicion', 'bloque', 'desde', 'hasta', 'motivo', 'usuario', 'fecha')
@@ -0,0 +1,105 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0002_secuenciaventa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('facturacion', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloqueNumeracion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.PositiveIntegerField()),
+                ('hasta', models.PositiveIntegerField()),
+                ('siguiente', models.PositiveIntegerField(help_text='Próximo número a utilizar')),
+                ('estado', models.CharField(choices=[('activo', 'Activo'), ('agotado', 'Agotado'), ('abandonado', 'Abandonado')], default='activo', max_length=15)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_cierre', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Bloque de Numeración',
+                'verbose_name_plural': 'Bloques de Numeración',
+                'ordering': ['punto_expedicion', 'desde'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Establecimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(help_text='Ej: 001', max_length=3, unique=True)),
+                ('nombre', models.CharField(max_length=100)),
+                ('direccion', models.TextField(blank=True)),
+                ('activo', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Establecimiento',
+                'verbose_name_plural': 'Establecimientos',
+                'ordering': ['codigo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PuntoExpedicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(help_text='Ej: 001', max_length=3)),
+                ('ultimo_numero_reservado', models.PositiveIntegerField(default=0, help_text='Último número entregado a un bloque de este punto')),
+                ('tamano_bloque', models.PositiveIntegerField(default=50, help_text='Cantidad de números que se reservan de una vez')),
+                ('activo', models.BooleanField(default=True)),
+                ('establecimiento', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='puntos_expedicion', to='facturacion.establecimiento')),
+                ('punto_venta', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='punto_expedicion', to='ventas.puntoventa')),
+            ],
+            options={
+                'verbose_name': 'Punto de Expedición',
+                'verbose_name_plural': 'Puntos de Expedición',
+                'ordering': ['establecimiento__codigo', 'codigo'],
+            },
+        ),
+        migrations.RemoveField(
+            model_name='configuracionfacturacion',
+            name='proximo_numero_boleta',
+        ),
+        migrations.RemoveField(
+            model_name='configuracionfacturacion',
+            name='proximo_numero_factura',
+        ),
+        migrations.CreateModel(
+            name='SaltoNumeracion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.PositiveIntegerField()),
+                ('hasta', models.PositiveIntegerField()),
+                ('motivo', models.CharField(max_length=200)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('bloque', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='saltos', to='facturacion.bloquenumeracion')),
+                ('punto_expedicion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='saltos', to='facturacion.puntoexpedicion')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Salto de Numeración',
+                'verbose_name_plural': 'Saltos de Numeración',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddField(
+            model_name='bloquenumeracion',
+            name='punto_expedicion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='bloques', to='facturacion.puntoexpedicion'),
+        ),
+        migrations.AddConstraint(
+            model_name='puntoexpedicion',
+            constraint=models.UniqueConstraint(fields=('establecimiento', 'codigo'), name='punto_expedicion_unico_por_establecimiento'),
+        ),
+        migrations.AddIndex(
+            model_name='bloquenumeracion',
+            index=models.Index(fields=['punto_expedicion', 'estado'], name='facturacion_punto_e_e3845e_idx'),
+        ),
+    ]
@@ -29,10 +29,6 @@ class ConfiguracionFacturacion(models.Model):
     empresa_telefono = models.CharField(max_length=20, default="+56 9 1234 5678")
     empresa_email = models.EmailField(default="info@cantinatita.cl")
     
-    # Configuración de numeración
-    proximo_numero_boleta = models.PositiveIntegerField(default=1)
-    proximo_numero_factura = models.PositiveIntegerField(default=1)
-    
     # Configuración de impuestos
     iva_porcentaje = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('19.00'))
     
@@ -77,3 +73,135 @@ class HistorialFacturacion(models.Model):
         verbose_name = "Historial de Facturación"
         verbose_name_plural = "Historiales de Facturación"
         ordering = ['-fecha']
+
+
+class Establecimiento(models.Model):
+    """Establecimiento emisor (primer segmento del número de factura)"""
+    codigo = models.CharField(max_length=3, unique=True, help_text="Ej: 001")
+    nombre = models.CharField(max_length=100)
+    direccion = models.TextField(blank=True)
+    activo = models.BooleanField(default=True)
+    
+    def __str__(self):
+        return f"{self.codigo} - {self.nombre}"
+    
+    class Meta:
+        verbose_name = "Establecimiento"
+        verbose_name_plural = "Establecimientos"
+        ordering = ['codigo']
+
+
+class PuntoExpedicion(models.Model):
+    """
+    Punto de expedición de un establecimiento (segundo segmento del número).
+    Cada punto de venta factura desde su propio punto de expedición.
+    """
+    establecimiento = models.ForeignKey(
+        Establecimiento,
+        on_delete=models.PROTECT,
+        related_name='puntos_expedicion'
+    )
+    punto_venta = models.OneToOneField(
+        'ventas.PuntoVenta',
+        on_delete=models.PROTECT,
+        related_name='punto_expedicion'
+    )
+    codigo = models.CharField(max_length=3, help_text="Ej: 001")
+    
+    # Numeración
+    ultimo_numero_reservado = models.PositiveIntegerField(
+        default=0,
+        help_text="Último número entregado a un bloque de este punto"
+    )
+    tamano_bloque = models.PositiveIntegerField(
+        default=50,
+        help_text="Cantidad de números que se reservan de una vez"
+    )
+    activo = models.BooleanField(default=True)
+    
+    def __str__(self):
+        return f"{self.establecimiento.codigo}-{self.codigo} ({self.punto_venta})"
+    
+    class Meta:
+        verbose_name = "Punto de Expedición"
+        verbose_name_plural = "Puntos de Expedición"
+        ordering = ['establecimiento__codigo', 'codigo']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['establecimiento', 'codigo'],
+                name='punto_expedicion_unico_por_establecimiento'
+            ),
+        ]
+
+
+class BloqueNumeracion(models.Model):
+    """Rango de números reservado por un punto de expedición"""
+    
+    ESTADOS = [
+        ('activo', 'Activo'),
+        ('agotado', 'Agotado'),
+        ('abandonado', 'Abandonado'),
+    ]
+    
+    punto_expedicion = models.ForeignKey(
+        PuntoExpedicion,
+        on_delete=models.PROTECT,
+        related_name='bloques'
+    )
+    desde = models.PositiveIntegerField()
+    hasta = models.PositiveIntegerField()
+    siguiente = models.PositiveIntegerField(help_text="Próximo número a utilizar")
+    estado = models.CharField(max_length=15, choices=ESTADOS, default='activo')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_cierre = models.DateTimeField(blank=True, null=True)
+    
+    @property
+    def disponibles(self):
+        return max(self.hasta - self.siguiente + 1, 0)
+    
+    def __str__(self):
+        return f"{self.punto_expedicion}: {self.desde}-{self.hasta} ({self.get_estado_display()})"
+    
+    class Meta:
+        verbose_name = "Bloque de Numeración"
+        verbose_name_plural = "Bloques de Numeración"
+        ordering = ['punto_expedicion', 'desde']
+        indexes = [
+            models.Index(fields=['punto_expedicion', 'estado']),
+        ]
+
+
+class SaltoNumeracion(models.Model):
+    """Números que nunca se utilizaron (auditoría de bloques abandonados)"""
+    punto_expedicion = models.ForeignKey(
+        PuntoExpedicion,
+        on_delete=models.PROTECT,
+        related_name='saltos'
+    )
+    bloque = models.ForeignKey(
+        BloqueNumeracion,
+        on_delete=models.PROTECT,
+        related_name='saltos'
+    )
+    desde = models.PositiveIntegerField()
+    hasta = models.PositiveIntegerField()
+    motivo = models.CharField(max_length=200)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    fecha = models.DateTimeField(auto_now_add=True)
+    
+    @property
+    def cantidad(self):
+        return self.hasta - self.desde + 1
+    
+    def __str__(self):
+        return f"{self.punto_expedicion}: {self.desde}-{self.hasta} - {self.motivo}"
+    
+    class Meta:
+        verbose_name = "Salto de Numeración"
+        verbose_name_plural = "Saltos de Numeración"
+        ordering = ['-fecha']
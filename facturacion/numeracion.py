@@ -0,0 +1,132 @@
+"""
+Numeración de facturas por punto de expedición
+
+Los números tienen el formato ``EEE-PPP-NNNNNNN`` (establecimiento, punto de
+expedición y número correlativo). Cada punto de venta tiene su propio punto
+de expedición y toma números de a bloques: reservar un bloque es lo único que
+escribe sobre la fila compartida del punto de expedición; cada factura sólo
+avanza el bloque activo de su terminal con un UPDATE condicionado.
+
+Los bloques viven en la base de datos, por lo que si la transacción de una
+factura se revierte el número vuelve al bloque y no se pierde. Los números que
+quedan sin usar al abandonar un bloque se registran en ``SaltoNumeracion``.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Establecimiento, PuntoExpedicion, BloqueNumeracion, SaltoNumeracion
+
+
+def formatear_numero(punto_expedicion, numero):
+    """Formato: 001-001-0000001"""
+    return f'{punto_expedicion.establecimiento.codigo}-{punto_expedicion.codigo}-{numero:07d}'
+
+
+def obtener_punto_expedicion(punto_venta_id):
+    """
+    Retorna el punto de expedición del punto de venta, creándolo en el
+    establecimiento principal si todavía no fue configurado.
+    """
+    punto = PuntoExpedicion.objects.select_related('establecimiento').filter(
+        punto_venta_id=punto_venta_id
+    ).first()
+    if punto:
+        return punto
+
+    with transaction.atomic():
+        establecimiento, _ = Establecimiento.objects.get_or_create(
+            codigo='001', defaults={'nombre': 'Casa Central'}
+        )
+        codigos = establecimiento.puntos_expedicion.values_list('codigo', flat=True)
+        siguiente_codigo = max((int(c) for c in codigos if c.isdigit()), default=0) + 1
+        punto, _ = PuntoExpedicion.objects.get_or_create(
+            punto_venta_id=punto_venta_id,
+            defaults={'establecimiento': establecimiento, 'codigo': f'{siguiente_codigo:03d}'}
+        )
+    return punto
+
+
+def reservar_bloque(punto_expedicion):
+    """
+    Reserva el siguiente bloque de números del punto de expedición.
+    Si otra transacción ya reservó uno que sigue activo, se usa ese.
+    """
+    with transaction.atomic():
+        punto = PuntoExpedicion.objects.select_for_update().get(pk=punto_expedicion.pk)
+
+        bloque = punto.bloques.filter(estado='activo').order_by('desde').first()
+        if bloque:
+            return bloque
+
+        desde = punto.ultimo_numero_reservado + 1
+        hasta = punto.ultimo_numero_reservado + punto.tamano_bloque
+        PuntoExpedicion.objects.filter(pk=punto.pk).update(ultimo_numero_reservado=hasta)
+
+        return BloqueNumeracion.objects.create(
+            punto_expedicion=punto,
+            desde=desde,
+            hasta=hasta,
+            siguiente=desde
+        )
+
+
+def siguiente_numero_factura(punto_venta_id):
+    """
+    Toma el próximo número del bloque activo del punto de venta.
+
+    Returns:
+        Número formateado, ej. ``001-002-0000153``
+    """
+    punto = obtener_punto_expedicion(punto_venta_id)
+
+    with transaction.atomic():
+        while True:
+            bloque = punto.bloques.filter(estado='activo').order_by('desde').first()
+            if bloque is None:
+                bloque = reservar_bloque(punto)
+
+            tomado = BloqueNumeracion.objects.filter(
+                pk=bloque.pk, estado='activo', siguiente__lte=F('hasta')
+            ).update(siguiente=F('siguiente') + 1)
+
+            if tomado:
+                numero = BloqueNumeracion.objects.filter(pk=bloque.pk).values_list(
+                    'siguiente', flat=True
+                ).get() - 1
+                return formatear_numero(punto, numero)
+
+            # El bloque se agotó: cerrarlo y continuar con el siguiente
+            BloqueNumeracion.objects.filter(
+                pk=bloque.pk, estado='activo', siguiente__gt=F('hasta')
+            ).update(estado='agotado', fecha_cierre=timezone.now())
+
+
+def abandonar_bloques(punto_expedicion, motivo, usuario=None):
+    """
+    Cierra los bloques activos del punto de expedición (cambio de timbrado,
+    baja de la terminal, etc.) y registra los números que quedaron sin usar.
+
+    Returns:
+        Lista de SaltoNumeracion registrados
+    """
+    saltos = []
+    with transaction.atomic():
+        bloques = BloqueNumeracion.objects.select_for_update().filter(
+            punto_expedicion=punto_expedicion, estado='activo'
+        )
+        for bloque in bloques:
+            bloque.estado = 'abandonado'
+            bloque.fecha_cierre = timezone.now()
+            bloque.save(update_fields=['estado', 'fecha_cierre'])
+
+            if bloque.siguiente <= bloque.hasta:
+                saltos.append(SaltoNumeracion.objects.create(
+                    punto_expedicion=punto_expedicion,
+                    bloque=bloque,
+                    desde=bloque.siguiente,
+                    hasta=bloque.hasta,
+                    motivo=motivo,
+                    usuario=usuario
+                ))
+    return saltos
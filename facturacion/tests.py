@@ -1,3 +1,57 @@
+from django.db import transaction
 from django.test import TestCase
 
-# Create your tests here.
+from usuarios.models import Usuario
+from ventas.models import Venta, PuntoVenta, Factura
+from .models import PuntoExpedicion, BloqueNumeracion, SaltoNumeracion
+from .numeracion import obtener_punto_expedicion, siguiente_numero_factura, abandonar_bloques
+
+
+class NumeracionFacturaTest(TestCase):
+
+    def setUp(self):
+        self.cajero = Usuario.objects.create_user(username='cajero', tipo_usuario='cajero')
+        self.caja1 = PuntoVenta.objects.create(nombre='Caja 1', codigo='CAJA1')
+        self.caja2 = PuntoVenta.objects.create(nombre='Caja 2', codigo='CAJA2')
+
+    def facturar(self, punto_venta):
+        venta = Venta.objects.create(punto_venta=punto_venta, cajero=self.cajero, total=5000)
+        return Factura.objects.create(venta=venta, cliente_nombre='Cliente General', subtotal_factura=0, total_factura=0)
+
+    def test_formato_por_punto_de_venta(self):
+        self.assertEqual(self.facturar(self.caja1).numero_factura, '001-001-0000001')
+        self.assertEqual(self.facturar(self.caja2).numero_factura, '001-002-0000001')
+        self.assertEqual(self.facturar(self.caja1).numero_factura, '001-001-0000002')
+
+    def test_reserva_un_bloque_cada_tamano_bloque_facturas(self):
+        punto = obtener_punto_expedicion(self.caja1.id)
+        PuntoExpedicion.objects.filter(pk=punto.pk).update(tamano_bloque=3)
+
+        numeros = [siguiente_numero_factura(self.caja1.id) for _ in range(7)]
+
+        self.assertEqual(numeros[-1], '001-001-0000007')
+        self.assertEqual(BloqueNumeracion.objects.count(), 3)
+        self.assertEqual(BloqueNumeracion.objects.filter(estado='agotado').count(), 2)
+        self.assertEqual(PuntoExpedicion.objects.get(punto_venta=self.caja1).ultimo_numero_reservado, 9)
+
+    def test_transaccion_revertida_no_pierde_numero(self):
+        siguiente_numero_factura(self.caja1.id)
+        try:
+            with transaction.atomic():
+                siguiente_numero_factura(self.caja1.id)
+                raise RuntimeError('venta cancelada')
+        except RuntimeError:
+            pass
+        self.assertEqual(siguiente_numero_factura(self.caja1.id), '001-001-0000002')
+
+    def test_abandonar_bloque_registra_salto(self):
+        for _ in range(4):
+            siguiente_numero_factura(self.caja1.id)
+        punto = PuntoExpedicion.objects.get(punto_venta=self.caja1)
+
+        saltos = abandonar_bloques(punto, 'Cambio de timbrado')
+
+        self.assertEqual(len(saltos), 1)
+        self.assertEqual((saltos[0].desde, saltos[0].hasta), (5, 50))
+        self.assertEqual(SaltoNumeracion.objects.get().cantidad, 46)
+        self.assertEqual(siguiente_numero_factura(self.caja1.id), '001-001-0000051')
@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from django.core.paginator import Paginator
 from django.template.loader import render_to_string
@@ -25,7 +26,7 @@ except ImportError:
     REPORTLAB_AVAILABLE = False
 
 from ventas.models import Venta, Factura
-from .models import TipoDocumento, ConfiguracionFacturacion, HistorialFacturacion
+from .models import TipoDocumento, ConfiguracionFacturacion, HistorialFacturacion, PuntoExpedicion, BloqueNumeracion
 
 
 @login_required
@@ -51,9 +52,9 @@ def lista_facturas(request):
     if estado:
         facturas = facturas.filter(estado=estado)
     if fecha_desde:
-        facturas = facturas.filter(fecha_emision__date__gte=fecha_desde)
+        facturas = facturas.filter(fecha_local__gte=fecha_desde)
     if fecha_hasta:
-        facturas = facturas.filter(fecha_emision__date__lte=fecha_hasta)
+        facturas = facturas.filter(fecha_local__lte=fecha_hasta)
     if cliente:
         facturas = facturas.filter(cliente_nombre__icontains=cliente)
     
@@ -368,6 +369,15 @@ def configuracion_facturacion(request):
     context = {
         'title': 'Configuración de Facturación',
         'config': config,
+        'puntos_expedicion': PuntoExpedicion.objects.select_related(
+            'establecimiento', 'punto_venta'
+        ).prefetch_related(
+            Prefetch(
+                'bloques',
+                queryset=BloqueNumeracion.objects.filter(estado='activo'),
+                to_attr='bloques_activos'
+            )
+        ),
     }
     
     return render(request, 'facturacion/configuracion.html', context)
@@ -384,28 +394,28 @@ def reporte_facturacion(request):
     from django.db.models import Sum, Count
     from datetime import datetime, timedelta
     
-    hoy = timezone.now().date()
+    hoy = timezone.localdate()
     hace_30_dias = hoy - timedelta(days=30)
     
     stats = {
         'facturas_mes': Factura.objects.filter(
-            fecha_emision__date__gte=hace_30_dias,
+            fecha_local__gte=hace_30_dias,
             estado='emitida'
         ).count(),
         
         'boletas_mes': Factura.objects.filter(
-            fecha_emision__date__gte=hace_30_dias,
+            fecha_local__gte=hace_30_dias,
             tipo_factura='boleta',
             estado='emitida'
         ).count(),
         
         'ingresos_mes': Factura.objects.filter(
-            fecha_emision__date__gte=hace_30_dias,
+            fecha_local__gte=hace_30_dias,
             estado='emitida'
         ).aggregate(total=Sum('total_factura'))['total'] or Decimal('0.00'),
         
         'documentos_anulados': Factura.objects.filter(
-            fecha_emision__date__gte=hace_30_dias,
+            fecha_local__gte=hace_30_dias,
             estado='anulada'
         ).count(),
     }
@@ -415,7 +425,7 @@ def reporte_facturacion(request):
     for tipo_key, tipo_nombre in Factura.TIPO_FACTURA_CHOICES:
         count = Factura.objects.filter(
             tipo_factura=tipo_key,
-            fecha_emision__date__gte=hace_30_dias,
+            fecha_local__gte=hace_30_dias,
             estado='emitida'
         ).count()
         facturas_por_tipo[tipo_nombre] = count
@@ -0,0 +1,221 @@
+"""
+Índice de búsqueda de productos en memoria
+
+Cada proceso mantiene un índice con el código y el nombre normalizados (sin
+acentos ni mayúsculas) de los productos disponibles. La búsqueda recorre el
+índice en memoria y sólo consulta la base para traer los productos
+encontrados por clave primaria.
+
+Orden de relevancia:
+
+0. código exacto
+1. código que empieza con el término
+2. nombre que empieza con el término
+3. cada palabra del término es el comienzo de una palabra del nombre
+4. el término aparece en cualquier parte del código o del nombre
+
+El índice se actualiza con las señales de guardado y borrado de ``Producto``
+y con los avisos de otros servidores (bus de invalidación).
+Los cambios hechos desde otros procesos (o con ``QuerySet.update``) se
+incorporan al revalidar periódicamente contra ``fecha_actualizacion``.
+"""
+import threading
+import time
+import unicodedata
+from datetime import timedelta
+
+from django.db.models import Max, Count
+
+from .models import Producto
+
+# Cada cuántos segundos se buscan cambios hechos fuera de este proceso
+REVALIDAR_CADA = 30
+
+# Margen para no perder filas de transacciones que confirman tarde
+SOLAPAMIENTO = timedelta(seconds=10)
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos: 'Jugo de Piña' -> 'jugo de pina'"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower().strip()
+
+
+class _Entrada:
+    __slots__ = ('id', 'codigo', 'nombre', 'palabras', 'texto')
+
+    def __init__(self, producto_id, codigo, nombre):
+        self.id = producto_id
+        self.codigo = normalizar(codigo)
+        self.nombre = normalizar(nombre)
+        self.palabras = self.nombre.split()
+        # Toda coincidencia contiene cada palabra buscada en este texto
+        self.texto = f'{self.codigo} {self.nombre}'
+
+    def relevancia(self, termino, palabras):
+        """Nivel de relevancia (menor es mejor) o None si no coincide"""
+        if self.codigo == termino:
+            return 0
+        if self.codigo.startswith(termino):
+            return 1
+        if self.nombre.startswith(termino):
+            return 2
+        if all(any(p.startswith(buscada) for p in self.palabras) for buscada in palabras):
+            return 3
+        if termino in self.codigo or termino in self.nombre:
+            return 4
+        return None
+
+
+class IndiceProductos:
+    """Índice en memoria de los productos disponibles"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entradas = None
+        self._ultima_modificacion = None
+        self._total = 0
+        self._revalidado = 0
+        self._pendientes = set()
+
+    def _campos(self, queryset):
+        return queryset.filter(disponible=True).values_list('id', 'codigo', 'nombre')
+
+    def reconstruir(self):
+        """Carga el índice completo desde la base. Retorna sus entradas."""
+        datos = Producto.objects.aggregate(ultima=Max('fecha_actualizacion'), total=Count('id'))
+        entradas = {
+            producto_id: _Entrada(producto_id, codigo, nombre)
+            for producto_id, codigo, nombre in self._campos(Producto.objects.all())
+        }
+        with self._lock:
+            self._entradas = entradas
+            self._ultima_modificacion = datos['ultima']
+            self._total = datos['total']
+            self._revalidado = time.monotonic()
+        return entradas
+
+    def _revalidar(self):
+        """Incorpora los cambios hechos fuera de este proceso"""
+        self._revalidado = time.monotonic()
+        datos = Producto.objects.aggregate(ultima=Max('fecha_actualizacion'), total=Count('id'))
+        if datos['total'] != self._total or self._ultima_modificacion is None:
+            # Hubo altas o bajas que no se vieron: reconstruir
+            self.reconstruir()
+            return
+        if datos['ultima'] == self._ultima_modificacion:
+            return
+
+        modificados = Producto.objects.filter(
+            fecha_actualizacion__gte=self._ultima_modificacion - SOLAPAMIENTO
+        ).values_list('id', 'codigo', 'nombre', 'disponible')
+        with self._lock:
+            if self._entradas is None:
+                # Se descartó mientras tanto: la próxima búsqueda lo reconstruye
+                return
+            for producto_id, codigo, nombre, disponible in modificados:
+                if disponible:
+                    self._entradas[producto_id] = _Entrada(producto_id, codigo, nombre)
+                else:
+                    self._entradas.pop(producto_id, None)
+            self._ultima_modificacion = datos['ultima']
+
+    def _asegurar_cargado(self):
+        """
+        Carga el índice o lo pone al día y retorna sus entradas. Otro hilo
+        puede descartarlo (``invalidar``) en cualquier momento, así que quien
+        busca trabaja con la referencia retornada y no con ``self._entradas``.
+        """
+        entradas = self._entradas
+        if entradas is None:
+            entradas = self.reconstruir()
+        elif time.monotonic() - self._revalidado > REVALIDAR_CADA:
+            self._revalidar()
+        if self._pendientes:
+            self._recargar_pendientes()
+        actuales = self._entradas
+        return actuales if actuales is not None else entradas
+
+    def invalidar(self, ids=None):
+        """
+        Marca productos modificados en otro servidor; se releen en la próxima
+        búsqueda. Sin ids se descarta el índice completo.
+        """
+        with self._lock:
+            if ids is None:
+                self._entradas = None
+                self._pendientes.clear()
+            else:
+                self._pendientes.update(ids)
+
+    def _recargar_pendientes(self):
+        with self._lock:
+            ids, self._pendientes = self._pendientes, set()
+        filas = {
+            producto_id: (codigo, nombre, disponible)
+            for producto_id, codigo, nombre, disponible in Producto.objects.filter(
+                id__in=ids
+            ).values_list('id', 'codigo', 'nombre', 'disponible')
+        }
+        with self._lock:
+            if self._entradas is None:
+                return
+            for producto_id in ids:
+                codigo, nombre, disponible = filas.get(producto_id, (None, None, False))
+                if disponible:
+                    self._entradas[producto_id] = _Entrada(producto_id, codigo, nombre)
+                else:
+                    self._entradas.pop(producto_id, None)
+
+    def actualizar(self, producto, creado=False):
+        """Agrega, actualiza o quita un producto según su disponibilidad"""
+        with self._lock:
+            if self._entradas is None:
+                return
+            if producto.disponible:
+                self._entradas[producto.id] = _Entrada(producto.id, producto.codigo, producto.nombre)
+            else:
+                self._entradas.pop(producto.id, None)
+            if creado:
+                self._total += 1
+
+    def eliminar(self, producto_id):
+        with self._lock:
+            if self._entradas is None:
+                return
+            self._entradas.pop(producto_id, None)
+            self._total -= 1
+
+    def buscar_ids(self, termino, limite=15):
+        """Ids de los productos que coinciden con el término, ordenados por relevancia"""
+        termino = normalizar(termino)
+        if not termino:
+            return []
+        entradas = self._asegurar_cargado()
+        with self._lock:
+            candidatas = list(entradas.values())
+
+        palabras = termino.split()
+        # Descarte rápido (comparación de texto en C) antes de calcular la relevancia
+        mas_larga = max(palabras, key=len)
+        encontrados = []
+        for entrada in candidatas:
+            if mas_larga not in entrada.texto:
+                continue
+            nivel = entrada.relevancia(termino, palabras)
+            if nivel is not None:
+                encontrados.append((nivel, entrada.nombre, entrada.id))
+        encontrados.sort()
+        return [producto_id for _, _, producto_id in encontrados[:limite]]
+
+    def buscar(self, termino, limite=15, queryset=None):
+        """Productos que coinciden con el término, ordenados por relevancia"""
+        ids = self.buscar_ids(termino, limite)
+        if not ids:
+            return []
+        queryset = queryset if queryset is not None else Producto.objects.all()
+        productos = queryset.filter(disponible=True).in_bulk(ids)
+        return [productos[producto_id] for producto_id in ids if producto_id in productos]
+
+
+indice_productos = IndiceProductos()
@@ -0,0 +1,122 @@
+"""
+Catálogo de productos versionado para el POS
+
+El POS descarga el catálogo completo una vez, busca localmente y sólo vuelve
+a pedirlo cuando cambia la versión. La versión se arma con las versiones de
+``Producto`` y ``Categoria`` del caché (``cantina_tita/cache.py``), que
+aumentan dentro de la transacción que modifica las filas (incluido el stock)
+y otra vez al confirmarla: un cambio que se confirma tarde también cambia la
+versión.
+
+Con ``desde=<versión>`` se envían sólo los productos modificados desde que se
+entregó esa versión, más las categorías y la lista de ids vendibles para que
+el cliente descarte los que ya no están. Si la versión es desconocida se
+envía el catálogo completo.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from cantina_tita.cache import versiones
+
+from .models import Categoria, Producto
+
+# Campos de cada fila del catálogo, en orden
+CAMPOS = ['id', 'codigo', 'nombre', 'precio', 'categoria_id', 'requiere_stock', 'stock', 'stock_minimo']
+
+# Margen de los deltas por diferencias de reloj entre servidores (el cliente
+# reemplaza por id, repetir filas no es un problema)
+SOLAPAMIENTO = timedelta(seconds=10)
+
+# Segundos que se recuerda desde cuándo rige cada versión entregada
+VIGENCIA_MARCA = 7 * 24 * 3600
+
+
+def version_catalogo():
+    """Versión actual del catálogo (una lectura del caché)"""
+    producto, categoria = versiones(['productos.Producto', 'productos.Categoria'])
+    return f'{producto}.{categoria}'
+
+
+def _clave_marca(version):
+    return f'catalogo:marca:{version}'
+
+
+def _horizonte():
+    """
+    Fecha a partir de la cual puede haber cambios que todavía no se ven: el
+    inicio de la transacción abierta más vieja (en PostgreSQL), o ahora.
+    """
+    ahora = timezone.now()
+    if connection.vendor != 'postgresql':
+        return ahora
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT min(xact_start) FROM pg_stat_activity '
+            'WHERE datname = current_database() AND xact_start IS NOT NULL'
+        )
+        inicio, = cursor.fetchone()
+    return min(ahora, inicio) if inicio else ahora
+
+
+def _fecha_de_version(version):
+    """Desde cuándo rige una versión entregada, o None si no se conoce"""
+    return cache.get(_clave_marca(version))
+
+
+def _vendibles():
+    return Producto.objects.filter(disponible=True, categoria__activo=True)
+
+
+def _fila(producto):
+    return [
+        producto.id,
+        producto.codigo,
+        producto.nombre,
+        float(producto.precio_venta),
+        producto.categoria_id,
+        producto.requiere_stock,
+        producto.stock_actual,
+        producto.stock_minimo,
+    ]
+
+
+def snapshot_catalogo(desde=None):
+    """
+    Arma el catálogo en formato compacto (filas con el orden de ``CAMPOS``).
+
+    Args:
+        desde: versión que ya tiene el cliente; si es válida se envía un delta
+
+    Returns:
+        dict con version, completo, campos, productos y categorías; en los
+        deltas también ``ids`` (todos los productos vendibles)
+    """
+    # La versión se lee antes que las filas: un cambio que no alcance a verse
+    # ya estaba en una transacción abierta (y cambia la versión al confirmarse)
+    version = version_catalogo()
+    cache.add(_clave_marca(version), _horizonte(), timeout=VIGENCIA_MARCA)
+    fecha_desde = _fecha_de_version(desde) if desde else None
+
+    productos = _vendibles().only(
+        'id', 'codigo', 'nombre', 'precio_venta', 'categoria_id',
+        'requiere_stock', 'stock_actual', 'stock_minimo'
+    ).order_by('id')
+
+    catalogo = {
+        'version': version,
+        'completo': fecha_desde is None,
+        'campos': CAMPOS,
+        'categorias': dict(Categoria.objects.filter(activo=True).values_list('id', 'nombre')),
+    }
+
+    if fecha_desde is None:
+        catalogo['productos'] = [_fila(producto) for producto in productos]
+    else:
+        modificados = productos.filter(fecha_actualizacion__gte=fecha_desde - SOLAPAMIENTO)
+        catalogo['productos'] = [_fila(producto) for producto in modificados]
+        catalogo['ids'] = list(_vendibles().order_by('id').values_list('id', flat=True))
+
+    return catalogo
@@ -0,0 +1,21 @@
+# Índices de trigramas para la búsqueda de productos (sólo PostgreSQL)
+
+from django.db import migrations
+
+from cantina_tita.busqueda import crear_indices_trigramas
+
+crear, eliminar = crear_indices_trigramas([
+    ('productos_producto', 'nombre'),
+    ('productos_producto', 'codigo'),
+])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear, eliminar),
+    ]
@@ -0,0 +1,27 @@
+"""
+Señales de productos: mantienen actualizado el índice de búsqueda en memoria.
+El índice se toca al confirmar la transacción, para no quedar con cambios que
+se deshacen. Los cambios hechos en otros servidores llegan por el bus de
+invalidación.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from cantina_tita import invalidacion
+from .busqueda import indice_productos
+from .models import Producto
+
+
+@receiver(post_save, sender=Producto, dispatch_uid='indice_productos_guardado')
+def actualizar_indice(sender, instance, created, **kwargs):
+    transaction.on_commit(lambda: indice_productos.actualizar(instance, creado=created))
+
+
+@receiver(post_delete, sender=Producto, dispatch_uid='indice_productos_borrado')
+def quitar_del_indice(sender, instance, **kwargs):
+    producto_id = instance.id
+    transaction.on_commit(lambda: indice_productos.eliminar(producto_id))
+
+
+invalidacion.suscribir('productos.producto', indice_productos.invalidar)
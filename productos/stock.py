@@ -0,0 +1,109 @@
+"""
+Reserva de stock para ventas concurrentes
+
+Varios puntos de venta pueden vender el mismo producto al mismo tiempo, por
+lo que el stock nunca se lee, se modifica en Python y se guarda. En su lugar:
+
+1. Los productos de la venta se bloquean en orden de id, así dos carritos con
+   los mismos productos no pueden bloquearse mutuamente (deadlock).
+2. El descuento se aplica con un único UPDATE condicionado
+   (``stock_actual = stock_actual - n WHERE stock_actual >= n``), de modo que
+   el stock nunca queda negativo ni se pierde una actualización.
+"""
+from django.db import transaction
+from django.db.models import Case, When, F, Q
+from django.utils import timezone
+
+from cantina_tita.cache import invalidar_modelo
+from .models import Producto
+
+
+class StockInsuficiente(Exception):
+    """No hay stock suficiente para reservar la cantidad solicitada"""
+
+    def __init__(self, producto, cantidad):
+        self.producto = producto
+        self.cantidad = cantidad
+        super().__init__(
+            f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock_actual}'
+        )
+
+
+class _GuardaIncumplida(Exception):
+    pass
+
+
+def bloquear_productos(ids):
+    """
+    Bloquea los productos indicados (SELECT ... FOR UPDATE) en orden de id.
+    Debe llamarse dentro de una transacción. Retorna un dict {id: Producto}.
+    """
+    productos = Producto.objects.select_for_update().filter(id__in=ids).order_by('id')
+    return {producto.id: producto for producto in productos}
+
+
+def descontar_stock(cantidades):
+    """
+    Descuenta stock con un único UPDATE condicionado.
+
+    Args:
+        cantidades: dict {producto_id: cantidad} de productos que controlan stock
+
+    Raises:
+        StockInsuficiente: si algún producto no tiene stock suficiente. En ese
+        caso no se descuenta nada.
+    """
+    cantidades = {producto_id: cantidad for producto_id, cantidad in cantidades.items() if cantidad > 0}
+    if not cantidades:
+        return
+
+    guardas = Q()
+    for producto_id, cantidad in cantidades.items():
+        guardas |= Q(id=producto_id, stock_actual__gte=cantidad)
+
+    try:
+        with transaction.atomic():
+            actualizados = Producto.objects.filter(guardas).update(
+                stock_actual=Case(
+                    *[When(id=producto_id, then=F('stock_actual') - cantidad)
+                      for producto_id, cantidad in cantidades.items()],
+                    default=F('stock_actual')
+                ),
+                fecha_actualizacion=timezone.now()
+            )
+            if actualizados != len(cantidades):
+                raise _GuardaIncumplida
+        # El UPDATE no dispara señales
+        invalidar_modelo(Producto, list(cantidades))
+    except _GuardaIncumplida:
+        productos = Producto.objects.in_bulk(list(cantidades))
+        for producto_id in sorted(cantidades):
+            producto = productos.get(producto_id)
+            if producto is None:
+                raise Producto.DoesNotExist(f'Producto {producto_id} no encontrado')
+            if producto.stock_actual < cantidades[producto_id]:
+                raise StockInsuficiente(producto, cantidades[producto_id])
+        # El stock se repuso entre el UPDATE y la verificación; se informa el primero
+        producto_id = min(cantidades)
+        raise StockInsuficiente(productos[producto_id], cantidades[producto_id])
+
+
+def reservar_stock(cantidades):
+    """
+    Bloquea los productos en orden de id y descuenta las cantidades de los
+    que requieren control de stock.
+
+    Args:
+        cantidades: dict {producto_id: cantidad}
+
+    Returns:
+        dict {id: Producto} con los productos bloqueados (valores previos al descuento)
+    """
+    with transaction.atomic():
+        productos = bloquear_productos(cantidades)
+        descontar_stock({
+            producto_id: cantidad
+            for producto_id, cantidad in cantidades.items()
+            if producto_id in productos and productos[producto_id].requiere_stock
+        })
+    return productos
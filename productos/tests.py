@@ -1,3 +1,266 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from cantina_tita.cache import invalidar_modelo
+from usuarios.models import Usuario
+from .busqueda import indice_productos
+from .catalogo import snapshot_catalogo, version_catalogo
+from .models import Categoria, Producto
+from .stock import reservar_stock, descontar_stock, StockInsuficiente
+
+
+def crear_producto(categoria, codigo, stock, requiere_stock=True):
+    return Producto.objects.create(
+        categoria=categoria,
+        codigo=codigo,
+        nombre=f'Producto {codigo}',
+        precio_costo=1000,
+        precio_venta=1500,
+        stock_actual=stock,
+        requiere_stock=requiere_stock,
+    )
+
+
+class ReservaStockTest(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Bebidas')
+        self.agua = crear_producto(categoria, 'AGUA', 10)
+        self.jugo = crear_producto(categoria, 'JUGO', 3)
+        self.cafe = crear_producto(categoria, 'CAFE', 0, requiere_stock=False)
+
+    def stock(self, producto):
+        return Producto.objects.get(pk=producto.pk).stock_actual
+
+    def test_descuenta_todos_los_productos(self):
+        reservar_stock({self.agua.id: 4, self.jugo.id: 3, self.cafe.id: 2})
+        self.assertEqual(self.stock(self.agua), 6)
+        self.assertEqual(self.stock(self.jugo), 0)
+        self.assertEqual(self.stock(self.cafe), 0)
+
+    def test_stock_insuficiente_no_descuenta_nada(self):
+        with self.assertRaises(StockInsuficiente) as contexto:
+            reservar_stock({self.agua.id: 4, self.jugo.id: 4})
+        self.assertEqual(contexto.exception.producto, self.jugo)
+        self.assertEqual(self.stock(self.agua), 10)
+        self.assertEqual(self.stock(self.jugo), 3)
+
+    def test_descontar_stock_es_un_unico_update(self):
+        with self.assertNumQueries(3):  # SAVEPOINT, UPDATE, RELEASE
+            descontar_stock({self.agua.id: 1, self.jugo.id: 1})
+
+
+class ReservaStockConcurrenteTest(TransactionTestCase):
+    """Varias cajas vendiendo los mismos productos al mismo tiempo"""
+
+    CAJAS = 12
+    VENTAS_POR_CAJA = 5
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Snacks')
+        self.chipa = crear_producto(categoria, 'CHIPA', 40)
+        self.gaseosa = crear_producto(categoria, 'GASEOSA', 1000)
+
+    def vender(self, carrito, resultados):
+        try:
+            for _ in range(self.VENTAS_POR_CAJA):
+                while True:
+                    try:
+                        with transaction.atomic():
+                            reservar_stock(carrito)
+                        resultados.append(True)
+                        break
+                    except StockInsuficiente:
+                        resultados.append(False)
+                        break
+                    except OperationalError:
+                        # SQLite no soporta bloqueo de filas: reintentar si la base está ocupada
+                        time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def test_stock_no_se_sobrevende_ni_se_pierde(self):
+        resultados = []
+        # La mitad de las cajas arma el carrito en orden inverso para provocar deadlocks
+        carritos = [
+            {self.chipa.id: 1, self.gaseosa.id: 2},
+            {self.gaseosa.id: 2, self.chipa.id: 1},
+        ]
+        cajas = [
+            threading.Thread(target=self.vender, args=(carritos[i % 2], resultados))
+            for i in range(self.CAJAS)
+        ]
+        for caja in cajas:
+            caja.start()
+        for caja in cajas:
+            caja.join()
+
+        exitosas = resultados.count(True)
+        chipa = Producto.objects.get(pk=self.chipa.pk)
+        gaseosa = Producto.objects.get(pk=self.gaseosa.pk)
+
+        self.assertEqual(len(resultados), self.CAJAS * self.VENTAS_POR_CAJA)
+        self.assertEqual(exitosas, 40)
+        self.assertEqual(chipa.stock_actual, 0)
+        self.assertEqual(gaseosa.stock_actual, 1000 - 2 * exitosas)
+
+
+class CatalogoVersionadoTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = categoria = Categoria.objects.create(nombre='Bebidas')
+        self.agua = crear_producto(categoria, 'AGUA', 10)
+        self.jugo = crear_producto(categoria, 'JUGO', 3)
+        self.oculto = crear_producto(categoria, 'VIEJO', 5)
+        Producto.objects.filter(pk=self.oculto.pk).update(disponible=False)
+        # Simular un catálogo que no cambia desde hace una hora
+        Producto.objects.update(fecha_actualizacion=timezone.now() - timedelta(hours=1))
+
+    def test_snapshot_completo(self):
+        catalogo = snapshot_catalogo()
+        self.assertTrue(catalogo['completo'])
+        filas = [dict(zip(catalogo['campos'], fila)) for fila in catalogo['productos']]
+        self.assertEqual([fila['codigo'] for fila in filas], ['AGUA', 'JUGO'])
+        self.assertEqual(filas[0]['precio'], 1500.0)
+
+    def test_version_cambia_con_cada_modificacion(self):
+        version = version_catalogo()
+        reservar_stock({self.agua.id: 1})
+        self.assertNotEqual(version_catalogo(), version)
+
+        version = version_catalogo()
+        Producto.objects.get(pk=self.oculto.pk).delete()
+        self.assertNotEqual(version_catalogo(), version)
+
+    def test_version_cambia_con_las_categorias(self):
+        version = version_catalogo()
+        self.categoria.nombre = 'Bebidas frías'
+        self.categoria.save()
+        self.assertNotEqual(version_catalogo(), version)
+
+        catalogo = snapshot_catalogo(desde=version)
+        self.assertEqual(catalogo['categorias'], {self.categoria.id: 'Bebidas frías'})
+
+    def test_cambio_confirmado_tarde_cambia_la_version(self):
+        version = snapshot_catalogo()['version']
+        # Fila modificada antes de entregar la versión, confirmada después
+        Producto.objects.filter(pk=self.jugo.pk).update(
+            precio_venta=2000, fecha_actualizacion=timezone.now() - timedelta(minutes=5)
+        )
+        invalidar_modelo(Producto, [self.jugo.pk])
+
+        self.assertNotEqual(version_catalogo(), version)
+
+    def test_version_desconocida_envia_todo(self):
+        catalogo = snapshot_catalogo(desde='123-4')
+        self.assertTrue(catalogo['completo'])
+        self.assertEqual(len(catalogo['productos']), 2)
+
+    def test_delta_solo_trae_lo_modificado(self):
+        Producto.objects.filter(pk=self.agua.pk).update(fecha_actualizacion=timezone.now() - timedelta(hours=2))
+        version = snapshot_catalogo()['version']
+        self.jugo.precio_venta = 2000
+        self.jugo.save()
+
+        catalogo = snapshot_catalogo(desde=version)
+
+        self.assertFalse(catalogo['completo'])
+        self.assertEqual([fila[0] for fila in catalogo['productos']], [self.jugo.id])
+        self.assertEqual(catalogo['ids'], [self.agua.id, self.jugo.id])
+
+    def test_endpoint_responde_304_si_no_hubo_cambios(self):
+        cajero = Usuario.objects.create_user(username='cajero', tipo_usuario='cajero')
+        self.client.force_login(cajero)
+        url = reverse('ventas:api_catalogo_productos')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.agua.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class IndiceBusquedaTest(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Varios')
+        self.coca = crear_producto(categoria, 'COC500', 10)
+        self.coca.nombre = 'Coca Cola 500ml'
+        self.coca.save()
+        self.pina = crear_producto(categoria, 'JUG01', 10)
+        self.pina.nombre = 'Jugo de Piña'
+        self.pina.save()
+        self.chocolate = crear_producto(categoria, 'CHO', 10)
+        self.chocolate.nombre = 'Chocolatada'
+        self.chocolate.save()
+        self.alfajor = crear_producto(categoria, 'ALF', 10)
+        self.alfajor.nombre = 'Alfajor de chocolate'
+        self.alfajor.save()
+        indice_productos.reconstruir()
+
+    def buscar(self, termino):
+        return [producto.codigo for producto in indice_productos.buscar(termino)]
+
+    def test_orden_de_relevancia(self):
+        # código exacto, nombre que empieza, palabra que empieza
+        self.assertEqual(self.buscar('cho'), ['CHO', 'ALF'])
+        # prefijo de código antes que subcadena del nombre
+        self.assertEqual(self.buscar('co'), ['COC500', 'ALF', 'CHO'])
+
+    def test_sin_acentos_y_por_palabras(self):
+        self.assertEqual(self.buscar('pina'), ['JUG01'])
+        self.assertEqual(self.buscar('PIÑA'), ['JUG01'])
+        self.assertEqual(self.buscar('jugo pi'), ['JUG01'])
+        self.assertEqual(self.buscar('cola coca'), ['COC500'])
+
+    def test_se_actualiza_con_las_senales(self):
+        self.pina.nombre = 'Jugo de Durazno'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pina.save()
+        self.assertEqual(self.buscar('pina'), [])
+        self.assertEqual(self.buscar('durazno'), ['JUG01'])
+
+        self.alfajor.disponible = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alfajor.save()
+        self.assertEqual(self.buscar('alfajor'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coca.delete()
+        self.assertEqual(self.buscar('coca'), [])
+
+    def test_cambios_deshechos_no_llegan_al_indice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.pina.nombre = 'Jugo de Durazno'
+                self.pina.save()
+                self.coca.delete()
+                transaction.set_rollback(True)
+
+        self.assertEqual(self.buscar('durazno'), [])
+        self.assertEqual(self.buscar('pina'), ['JUG01'])
+        self.assertEqual(self.buscar('coca'), ['COC500'])
+
+    def test_busqueda_no_consulta_la_base_si_no_hay_resultados(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.buscar('zzz'), [])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buscar('COC500'), ['COC500'])
+
+    def test_invalidar_durante_la_busqueda(self):
+        indice_productos.invalidar([self.coca.id])
+        # Otro hilo descarta el índice mientras esta búsqueda lo pone al día
+        with mock.patch.object(indice_productos, '_recargar_pendientes', side_effect=indice_productos.invalidar):
+            self.assertEqual(indice_productos.buscar_ids('coca'), [self.coca.id])
+        self.assertEqual(self.buscar('coca'), ['COC500'])
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     ReporteConsumoEstudiante, ReporteProductosMasVendidos, ReporteIngresosPorMetodo,
-    DetalleReporteProducto, DetalleReporteMetodoPago, AlertaStock, ConfiguracionReporte
+    DetalleReporteProducto, DetalleReporteMetodoPago, AlertaStock, ConfiguracionReporte,
+    ResumenVentaDiario, TrabajoReporte, CierreReporte
 )
 
 @admin.register(ReporteConsumoEstudiante)
@@ -60,3 +61,43 @@ class ConfiguracionReporteAdmin(admin.ModelAdmin):
     list_display = ('tipo_reporte', 'frecuencia', 'hora_generacion', 'activo', 'fecha_ultimo_reporte')
     list_filter = ('tipo_reporte', 'frecuencia', 'activo')
     ordering = ('tipo_reporte', 'frecuencia')
+
+
+@admin.register(ResumenVentaDiario)
+class ResumenVentaDiarioAdmin(admin.ModelAdmin):
+    """
+    Consulta del resumen diario de ventas (se mantiene solo; no editable)
+    """
+    list_display = ('fecha', 'punto_venta', 'producto', 'metodo_pago', 'cantidad', 'unidades', 'monto')
+    list_filter = ('fecha', 'punto_venta')
+    ordering = ('-fecha',)
+    list_select_related = ('punto_venta', 'producto', 'metodo_pago')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    """
+    Administración de los trabajos de generación de reportes en segundo plano
+    """
+    list_display = ('tipo_reporte', 'fecha_inicio', 'fecha_fin', 'estado', 'intentos', 'programado_para', 'fecha_fin_proceso')
+    list_filter = ('estado', 'tipo_reporte')
+    ordering = ('-programado_para',)
+    
+    readonly_fields = ('fecha_creacion', 'fecha_inicio_proceso', 'fecha_fin_proceso', 'error')
+
+
+@admin.register(CierreReporte)
+class CierreReporteAdmin(admin.ModelAdmin):
+    """
+    Períodos cerrados ya generados (borrar uno lo vuelve a generar)
+    """
+    list_display = ('tipo_reporte', 'fecha_inicio', 'fecha_fin', 'fecha_generacion')
+    list_filter = ('tipo_reporte',)
+    ordering = ('-fecha_generacion',)
+    readonly_fields = ('fecha_generacion',)
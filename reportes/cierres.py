@@ -0,0 +1,69 @@
+"""
+Reportes de períodos cerrados servidos desde los reportes guardados
+
+Un período está cerrado cuando es un mes o un año calendario completo que
+termina antes del mes en curso. Sus ventas ya no cambian, así que el reporte se calcula una sola vez con los generadores
+(ver generadores.py) y las consultas siguientes leen lo guardado
+(ReporteProductosMasVendidos, ReporteIngresosPorMetodo y
+ReporteConsumoEstudiante) en lugar de recorrer las ventas del período.
+
+El período abierto (el que incluye el mes actual) y cualquier otro rango se
+calculan en vivo: guardar rangos arbitrarios dejaría un reporte por cada
+combinación de fechas consultada.
+Cada generación de un período cerrado deja un CierreReporte: así un período
+sin filas (p. ej. consumo de un mes sin ventas) tampoco se vuelve a generar.
+Solo se usan los reportes guardados desde ese cierre; los anteriores (p. ej.
+uno programado que corrió a mitad de mes) quedaron incompletos. Para rehacer
+un período cerrado (p. ej. tras corregir ventas viejas) basta con borrar su
+CierreReporte desde el admin.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .generadores import GENERADORES
+from .models import (
+    ReporteConsumoEstudiante, ReporteProductosMasVendidos, ReporteIngresosPorMetodo, CierreReporte
+)
+
+# tipo_reporte -> modelo en el que se guarda
+MODELOS = {
+    'consumo_estudiante': ReporteConsumoEstudiante,
+    'productos_mas_vendidos': ReporteProductosMasVendidos,
+    'ingresos_metodo_pago': ReporteIngresosPorMetodo,
+}
+
+
+def periodo_cerrado(desde, hasta):
+    """
+    Si el período entre dos fechas (date o None) es un mes o un año calendario
+    completo que terminó antes del mes actual
+    """
+    if desde is None or hasta is None or desde.day != 1 or desde.year != hasta.year:
+        return False
+    if hasta >= timezone.localdate().replace(day=1) or (hasta + timedelta(days=1)).day != 1:
+        return False
+    un_mes = desde.month == hasta.month
+    un_anio = desde.month == 1 and hasta.month == 12
+    return un_mes or un_anio
+
+
+def reportes_guardados(tipo_reporte, desde, hasta, usuario):
+    """
+    Reportes guardados de un período cerrado, generándolos si el período
+    todavía no tiene CierreReporte. Retorna un queryset del más reciente al
+    más antiguo (puede haber varios si el período también se programó en una
+    ConfiguracionReporte después del cierre).
+    """
+    with transaction.atomic():
+        # Si otra consulta está generando el mismo período, get_or_create
+        # espera a que confirme y lee su cierre
+        cierre, creado = CierreReporte.objects.get_or_create(
+            tipo_reporte=tipo_reporte, fecha_inicio=desde, fecha_fin=hasta
+        )
+        if creado:
+            GENERADORES[tipo_reporte](desde, hasta, usuario)
+    return MODELOS[tipo_reporte].objects.filter(
+        fecha_inicio=desde, fecha_fin=hasta, fecha_generacion__gte=cierre.fecha_generacion
+    ).order_by('-fecha_generacion', '-id')
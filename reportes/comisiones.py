@@ -0,0 +1,142 @@
+"""
+Reporte de comisiones de pagos (``comisiones_pagos``)
+
+``PagoVenta.save()`` guarda la comisión de cada pago según el método. El
+reporte la agrupa por método de pago, punto de venta, cajero o día con una
+sola consulta agrupada que trae, en la misma pasada, los totales del período
+anterior de igual duración para comparar. Así los números se concilian con
+los extractos del banco sin traer cada pago a Python.
+
+El resumen diario (``ResumenVentaDiario``) no guarda comisiones, por lo que
+el reporte lee ``PagoVenta`` por su índice (fecha_local, metodo_pago).
+
+Agrupando por día, cada día del período anterior se compara con el día en
+la misma posición del actual (el 1.º con el 1.º, el 2.º con el 2.º...).
+
+Los períodos cerrados (ver cierres.py) no cambian: ``comisiones_cerradas``
+guarda su resultado en el caché para el cierre mensual.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Sum, Count, Q
+
+from cantina_tita.cache import cacheado
+from ventas.models import PagoVenta
+
+# agrupación -> (campo de PagoVenta, encabezado)
+AGRUPACIONES = {
+    'metodo': ('metodo_pago__nombre', 'Método de pago'),
+    'punto_venta': ('venta__punto_venta__codigo', 'Punto de venta'),
+    'cajero': ('venta__cajero__username', 'Cajero'),
+    'dia': ('fecha_local', 'Día'),
+}
+
+# Segundos que se conserva en caché el cierre de un período cerrado
+DURACION_CIERRE = 24 * 60 * 60
+
+CERO = Decimal('0.00')
+
+
+def periodo_anterior(desde, hasta):
+    """Período de igual duración que termina el día antes de ``desde``"""
+    dias = (hasta - desde).days + 1
+    return desde - timedelta(days=dias), desde - timedelta(days=1)
+
+
+def _variacion(actual, anterior):
+    if not anterior:
+        return None
+    return round((actual - anterior) / anterior * 100, 2)
+
+
+def comisiones(desde, hasta, agrupar='metodo'):
+    """
+    Comisiones de los pagos de ventas pagadas entre dos fechas locales
+    (inclusive), agrupadas y comparadas con el período anterior.
+
+    Args:
+        desde, hasta: fechas (date) del período
+        agrupar: 'metodo', 'punto_venta', 'cajero' o 'dia'
+
+    Returns:
+        dict con 'filas' (grupo, pagos, monto, comision, neto,
+        comision_anterior y variacion), 'totales' y el período anterior.
+    """
+    if agrupar not in AGRUPACIONES:
+        raise ValueError(f'Agrupación inválida: {agrupar}')
+    campo = AGRUPACIONES[agrupar][0]
+    anterior_desde, anterior_hasta = periodo_anterior(desde, hasta)
+
+    actual = Q(fecha_local__gte=desde)
+    anterior = Q(fecha_local__lt=desde)
+    grupos = PagoVenta.objects.filter(
+        venta__estado='pagada',
+        fecha_local__gte=anterior_desde,
+        fecha_local__lte=hasta
+    ).values(campo).annotate(
+        pagos=Count('id', filter=actual),
+        monto_actual=Sum('monto', filter=actual),
+        comision_actual=Sum('comision', filter=actual),
+        monto_anterior=Sum('monto', filter=anterior),
+        comision_anterior=Sum('comision', filter=anterior),
+    ).order_by(campo)
+
+    dias = (hasta - desde).days + 1
+    por_grupo = {}
+    ceros = {'pagos': 0, 'monto': CERO, 'comision': CERO, 'monto_anterior': CERO, 'comision_anterior': CERO}
+    totales = dict(ceros)
+    for grupo in grupos:
+        clave = grupo[campo]
+        if agrupar == 'dia' and clave < desde:
+            # Día del período anterior: se suma al día en la misma posición del actual
+            clave += timedelta(days=dias)
+        fila = por_grupo.setdefault(clave, dict(ceros, grupo=clave))
+        valores = {
+            'pagos': grupo['pagos'],
+            'monto': grupo['monto_actual'] or CERO,
+            'comision': grupo['comision_actual'] or CERO,
+            'monto_anterior': grupo['monto_anterior'] or CERO,
+            'comision_anterior': grupo['comision_anterior'] or CERO,
+        }
+        for nombre, valor in valores.items():
+            fila[nombre] += valor
+            totales[nombre] += valor
+    filas = list(por_grupo.values())
+    if agrupar == 'dia':
+        filas.sort(key=lambda fila: fila['grupo'])
+
+    for fila in filas + [totales]:
+        fila['neto'] = fila['monto'] - fila['comision']
+        fila['variacion'] = _variacion(fila['comision'], fila['comision_anterior'])
+
+    return {
+        'filas': filas,
+        'totales': totales,
+        'anterior_desde': anterior_desde,
+        'anterior_hasta': anterior_hasta,
+    }
+
+
+# Cierre de un período cerrado: sus pagos ya no cambian, así que no depende
+# de la versión de ningún modelo
+comisiones_cerradas = cacheado('reportes.cierre_comisiones', [], timeout=DURACION_CIERRE)(comisiones)
+
+
+def tabla(resultado, agrupar):
+    """Encabezados y filas del reporte para Excel"""
+    encabezados = [
+        AGRUPACIONES[agrupar][1], 'Pagos', 'Monto', 'Comisión', 'Neto',
+        'Comisión período anterior', 'Variación %'
+    ]
+    filas = [
+        [fila['grupo'], fila['pagos'], fila['monto'], fila['comision'], fila['neto'],
+         fila['comision_anterior'], fila['variacion']]
+        for fila in resultado['filas']
+    ]
+    totales = resultado['totales']
+    filas.append([
+        'Total', totales['pagos'], totales['monto'], totales['comision'], totales['neto'],
+        totales['comision_anterior'], totales['variacion']
+    ])
+    return encabezados, filas
@@ -0,0 +1,180 @@
+"""
+Exportación de ventas y transacciones a CSV y Excel con memoria constante
+
+Cada exportación lee las filas con ``values_list(...).iterator(chunk_size=...)``
+(en PostgreSQL, un cursor del lado del servidor), por lo que nunca se cargan
+todas en memoria:
+
+- CSV: se genera mientras se descarga (``StreamingHttpResponse``); el primer
+  bloque sale apenas llegan las primeras filas.
+- XLSX: openpyxl en modo ``write_only`` escribe las filas a disco a medida que
+  se agregan. Un .xlsx es un ZIP cuyo índice va al final, así que el libro se
+  arma en un archivo temporal y después se envía por bloques. Una hoja admite
+  1.048.576 filas: al llegar al límite se continúa en otra hoja.
+
+Exportaciones disponibles: ver ``EXPORTACIONES``.
+"""
+import csv
+import tempfile
+from datetime import datetime
+
+from django.utils import timezone
+from openpyxl import Workbook
+
+from usuarios.models import TransaccionTarjeta
+from ventas.models import Venta, DetalleVenta, PagoVenta
+
+# Filas por lectura a la base
+TAMANO_LOTE = 2000
+
+# Bytes por bloque al enviar un archivo
+TAMANO_BLOQUE = 64 * 1024
+
+# Filas de datos por hoja de Excel (1.048.576 filas menos el encabezado)
+FILAS_POR_HOJA = 1048575
+
+EXPORTACIONES = {
+    'ventas': {
+        'titulo': 'Ventas',
+        'columnas': [
+            ('Número', 'numero_venta'),
+            ('Fecha y hora', 'fecha_venta'),
+            ('Día', 'fecha_local'),
+            ('Punto de venta', 'punto_venta__codigo'),
+            ('Cajero', 'cajero__username'),
+            ('Hijo', 'hijo__nombre_completo'),
+            ('Cliente', 'cliente_nombre'),
+            ('Subtotal', 'subtotal'),
+            ('Descuento', 'descuento'),
+            ('Impuesto', 'impuesto'),
+            ('Total', 'total'),
+            ('Estado', 'estado'),
+        ],
+        'consulta': lambda desde, hasta: Venta.objects.filter(
+            fecha_local__gte=desde, fecha_local__lte=hasta
+        ),
+    },
+    'detalles': {
+        'titulo': 'Detalle de ventas',
+        'columnas': [
+            ('Venta', 'venta__numero_venta'),
+            ('Día', 'venta__fecha_local'),
+            ('Estado de la venta', 'venta__estado'),
+            ('Código', 'producto__codigo'),
+            ('Producto', 'producto__nombre'),
+            ('Cantidad', 'cantidad'),
+            ('Precio unitario', 'precio_unitario'),
+            ('Subtotal', 'subtotal'),
+        ],
+        'consulta': lambda desde, hasta: DetalleVenta.objects.filter(
+            venta__fecha_local__gte=desde, venta__fecha_local__lte=hasta
+        ),
+    },
+    'pagos': {
+        'titulo': 'Pagos de ventas',
+        'columnas': [
+            ('Venta', 'venta__numero_venta'),
+            ('Fecha y hora', 'fecha_pago'),
+            ('Día', 'fecha_local'),
+            ('Método de pago', 'metodo_pago__nombre'),
+            ('Monto', 'monto'),
+            ('Comisión', 'comision'),
+            ('Referencia', 'referencia'),
+        ],
+        'consulta': lambda desde, hasta: PagoVenta.objects.filter(
+            fecha_local__gte=desde, fecha_local__lte=hasta
+        ),
+    },
+    'transacciones': {
+        'titulo': 'Transacciones de tarjetas',
+        'columnas': [
+            ('Fecha y hora', 'fecha_transaccion'),
+            ('Día', 'fecha_local'),
+            ('Hijo', 'hijo__nombre_completo'),
+            ('Tarjeta', 'numero_tarjeta_utilizada'),
+            ('Tipo', 'tipo_transaccion'),
+            ('Monto', 'monto'),
+            ('Saldo anterior', 'saldo_anterior'),
+            ('Saldo posterior', 'saldo_posterior'),
+            ('Estado', 'estado'),
+            ('Punto de venta', 'punto_venta'),
+            ('Venta', 'venta_relacionada__numero_venta'),
+        ],
+        'consulta': lambda desde, hasta: TransaccionTarjeta.objects.filter(
+            fecha_local__gte=desde, fecha_local__lte=hasta
+        ),
+    },
+}
+
+
+def encabezados(nombre):
+    return [encabezado for encabezado, _ in EXPORTACIONES[nombre]['columnas']]
+
+
+def _valor(valor):
+    # Excel no admite fechas con zona horaria: se exporta la hora local
+    if isinstance(valor, datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor).replace(tzinfo=None)
+    return valor
+
+
+def filas(nombre, desde, hasta):
+    """Itera las filas de la exportación entre dos fechas locales (inclusive)"""
+    exportacion = EXPORTACIONES[nombre]
+    campos = [campo for _, campo in exportacion['columnas']]
+    consulta = exportacion['consulta'](desde, hasta).order_by('id').values_list(*campos)
+    for fila in consulta.iterator(chunk_size=TAMANO_LOTE):
+        yield [_valor(valor) for valor in fila]
+
+
+class _Eco:
+    """Destino de csv.writer que devuelve la línea en lugar de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def iterar_csv(nombre, desde, hasta):
+    """Genera el CSV por bloques de ``TAMANO_LOTE`` líneas"""
+    escritor = csv.writer(_Eco())
+    # BOM: Excel abre el archivo como UTF-8
+    bloque = ['\ufeff' + escritor.writerow(encabezados(nombre))]
+    for fila in filas(nombre, desde, hasta):
+        bloque.append(escritor.writerow(fila))
+        if len(bloque) >= TAMANO_LOTE:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+def escribir_xlsx(nombre, desde, hasta, destino):
+    """
+    Escribe la exportación como libro de Excel en ``destino`` (ruta o archivo),
+    en hojas de hasta ``FILAS_POR_HOJA`` filas: "Ventas", "Ventas (2)"...
+    """
+    titulo = EXPORTACIONES[nombre]['titulo']
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(titulo)
+    hoja.append(encabezados(nombre))
+    en_hoja = 0
+    for fila in filas(nombre, desde, hasta):
+        if en_hoja == FILAS_POR_HOJA:
+            hoja = libro.create_sheet(f'{titulo} ({len(libro.worksheets) + 1})')
+            hoja.append(encabezados(nombre))
+            en_hoja = 0
+        hoja.append(fila)
+        en_hoja += 1
+    libro.save(destino)
+
+
+def iterar_xlsx(nombre, desde, hasta):
+    """Arma el libro en un archivo temporal y lo entrega por bloques"""
+    with tempfile.TemporaryFile() as archivo:
+        escribir_xlsx(nombre, desde, hasta, archivo)
+        archivo.seek(0)
+        while True:
+            bloque = archivo.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            yield bloque
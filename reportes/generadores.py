@@ -0,0 +1,199 @@
+"""
+Generadores de los reportes guardados (ReporteBase y sus detalles)
+
+Cada generador recibe el período y el usuario al que se atribuye el reporte;
+guarda los modelos con consultas agrupadas (sin consultas por fila) y
+devuelve la tabla que se escribe en los archivos:
+
+    {
+        'titulo': str,
+        'encabezados': [...],
+        'filas': [[...], ...],
+        'reportes': [instancias de ReporteBase a las que adjuntar los archivos],
+    }
+"""
+from decimal import Decimal
+
+from django.db.models import Sum, Count, F, Window
+from django.db.models.functions import RowNumber
+
+from usuarios.models import PerfilHijo
+from ventas.models import Venta, DetalleVenta, PagoVenta
+from .models import (
+    ReporteConsumoEstudiante, ReporteProductosMasVendidos, DetalleReporteProducto,
+    ReporteIngresosPorMetodo, DetalleReporteMetodoPago
+)
+from .resumen import resumen_ventas, por_producto
+from . import comisiones
+
+# Filas por INSERT al guardar detalles
+TAMANO_LOTE = 1000
+
+
+def _periodo(inicio, fin):
+    return f'{inicio:%d/%m/%Y} a {fin:%d/%m/%Y}'
+
+
+def consumo_estudiante(inicio, fin, usuario):
+    """Un ReporteConsumoEstudiante por hijo con compras en el período"""
+    ventas = Venta.objects.filter(
+        estado='pagada', fecha_local__gte=inicio, fecha_local__lte=fin, hijo__isnull=False
+    )
+    gastos = list(ventas.values('hijo_id').annotate(
+        total=Sum('total'),
+        compras=Count('id')
+    ).order_by('-total'))
+
+    # Producto más comprado por cada hijo
+    favoritos = dict(
+        DetalleVenta.objects.filter(venta__in=ventas).values(
+            'venta__hijo_id', 'producto__nombre'
+        ).annotate(
+            cantidad_total=Sum('cantidad')
+        ).annotate(
+            posicion=Window(
+                RowNumber(),
+                partition_by=[F('venta__hijo_id')],
+                order_by=[F('cantidad_total').desc(), F('producto__nombre').asc()]
+            )
+        ).filter(posicion=1).values_list('venta__hijo_id', 'producto__nombre')
+    )
+    nombres = dict(
+        PerfilHijo.objects.filter(id__in=[gasto['hijo_id'] for gasto in gastos])
+        .values_list('id', 'nombre_completo')
+    )
+
+    dias = (fin - inicio).days + 1
+    periodo = _periodo(inicio, fin)
+    reportes = []
+    filas = []
+    for gasto in gastos:
+        hijo_id = gasto['hijo_id']
+        promedio = (gasto['total'] / dias).quantize(Decimal('0.01'))
+        reportes.append(ReporteConsumoEstudiante(
+            tipo_reporte='consumo_estudiante',
+            nombre=f'Consumo de {nombres.get(hijo_id, hijo_id)} ({periodo})',
+            fecha_inicio=inicio,
+            fecha_fin=fin,
+            generado_por=usuario,
+            estudiante_id=hijo_id,
+            total_compras=gasto['total'],
+            cantidad_transacciones=gasto['compras'],
+            producto_mas_comprado=favoritos.get(hijo_id, ''),
+            promedio_gasto_diario=promedio,
+        ))
+        filas.append([
+            nombres.get(hijo_id, ''), gasto['compras'], gasto['total'], promedio, favoritos.get(hijo_id, '')
+        ])
+    reportes = ReporteConsumoEstudiante.objects.bulk_create(reportes, batch_size=TAMANO_LOTE)
+
+    return {
+        'titulo': f'Consumo por hijo ({periodo})',
+        'encabezados': ['Hijo', 'Compras', 'Total gastado', 'Promedio diario', 'Producto más comprado'],
+        'filas': filas,
+        'reportes': reportes,
+    }
+
+
+def productos_mas_vendidos(inicio, fin, usuario):
+    """ReporteProductosMasVendidos con un detalle por producto vendido (del resumen diario)"""
+    periodo = _periodo(inicio, fin)
+    productos = list(por_producto(resumen_ventas(inicio, fin)).values(
+        'producto_id', 'producto__codigo', 'producto__nombre'
+    ).annotate(
+        unidades=Sum('unidades'),
+        monto=Sum('monto'),
+        transacciones=Sum('cantidad')
+    ).order_by('-unidades', 'producto__nombre'))
+
+    reporte = ReporteProductosMasVendidos.objects.create(
+        tipo_reporte='productos_mas_vendidos',
+        nombre=f'Productos más vendidos ({periodo})',
+        fecha_inicio=inicio,
+        fecha_fin=fin,
+        generado_por=usuario,
+    )
+    DetalleReporteProducto.objects.bulk_create([
+        DetalleReporteProducto(
+            reporte=reporte,
+            producto_id=producto['producto_id'],
+            cantidad_vendida=producto['unidades'],
+            monto_total_vendido=producto['monto'],
+            numero_transacciones=producto['transacciones'],
+        )
+        for producto in productos
+    ], batch_size=TAMANO_LOTE)
+
+    return {
+        'titulo': reporte.nombre,
+        'encabezados': ['Código', 'Producto', 'Unidades', 'Monto', 'Ventas'],
+        'filas': [
+            [p['producto__codigo'], p['producto__nombre'], p['unidades'], p['monto'], p['transacciones']]
+            for p in productos
+        ],
+        'reportes': [reporte],
+    }
+
+
+def ingresos_metodo_pago(inicio, fin, usuario):
+    """ReporteIngresosPorMetodo con un detalle por método de pago"""
+    periodo = _periodo(inicio, fin)
+    metodos = list(PagoVenta.objects.filter(
+        venta__estado='pagada', fecha_local__gte=inicio, fecha_local__lte=fin
+    ).values(
+        'metodo_pago_id', 'metodo_pago__nombre'
+    ).annotate(
+        monto=Sum('monto'),
+        pagos=Count('id'),
+        comision=Sum('comision')
+    ).order_by('-monto'))
+
+    reporte = ReporteIngresosPorMetodo.objects.create(
+        tipo_reporte='ingresos_metodo_pago',
+        nombre=f'Ingresos por método de pago ({periodo})',
+        fecha_inicio=inicio,
+        fecha_fin=fin,
+        generado_por=usuario,
+        total_ingresos=sum((metodo['monto'] for metodo in metodos), Decimal('0.00')),
+        total_comisiones=sum((metodo['comision'] for metodo in metodos), Decimal('0.00')),
+    )
+    DetalleReporteMetodoPago.objects.bulk_create([
+        DetalleReporteMetodoPago(
+            reporte=reporte,
+            metodo_pago_id=metodo['metodo_pago_id'],
+            monto_total=metodo['monto'],
+            cantidad_transacciones=metodo['pagos'],
+            comision_total=metodo['comision'],
+        )
+        for metodo in metodos
+    ])
+
+    return {
+        'titulo': reporte.nombre,
+        'encabezados': ['Método de pago', 'Pagos', 'Monto', 'Comisiones'],
+        'filas': [
+            [m['metodo_pago__nombre'], m['pagos'], m['monto'], m['comision']]
+            for m in metodos
+        ],
+        'reportes': [reporte],
+    }
+
+
+def comisiones_pagos(inicio, fin, usuario):
+    """Comisiones por método de pago (no tiene modelo propio: solo genera los archivos)"""
+    encabezados, filas = comisiones.tabla(comisiones.comisiones(inicio, fin, 'metodo'), 'metodo')
+    return {
+        'titulo': f'Comisiones de pagos ({_periodo(inicio, fin)})',
+        'encabezados': encabezados,
+        'filas': filas,
+        'reportes': [],
+    }
+
+
+# tipo_reporte -> generador
+GENERADORES = {
+    'consumo_estudiante': consumo_estudiante,
+    'productos_mas_vendidos': productos_mas_vendidos,
+    'ingresos_metodo_pago': ingresos_metodo_pago,
+    'comisiones_pagos': comisiones_pagos,
+}
@@ -0,0 +1,41 @@
+"""
+Exporta ventas, detalles, pagos o transacciones de un rango de fechas a CSV o Excel
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reportes.exportacion import EXPORTACIONES, iterar_csv, escribir_xlsx
+
+
+class Command(BaseCommand):
+    help = 'Exporta datos de ventas o transacciones de tarjetas a CSV o XLSX con memoria constante'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('nombre', choices=sorted(EXPORTACIONES))
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD, por defecto hoy)')
+        parser.add_argument('--hasta', help='Fecha final inclusive (AAAA-MM-DD, por defecto hoy)')
+        parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--salida', help='Archivo de salida (por defecto <nombre>_<desde>_<hasta>.<formato>)')
+    
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else hoy
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else hoy
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato AAAA-MM-DD')
+        
+        nombre = options['nombre']
+        formato = options['formato']
+        salida = options['salida'] or f'{nombre}_{desde}_{hasta}.{formato}'
+        
+        if formato == 'csv':
+            with open(salida, 'w', encoding='utf-8', newline='') as archivo:
+                for bloque in iterar_csv(nombre, desde, hasta):
+                    archivo.write(bloque)
+        else:
+            escribir_xlsx(nombre, desde, hasta, salida)
+        
+        self.stdout.write(self.style.SUCCESS(f'Exportación guardada en {salida}'))
@@ -0,0 +1,42 @@
+"""
+Proceso de reportes en segundo plano: programa y genera los reportes pendientes
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from reportes.trabajos import programar_vencidos, procesar_pendientes
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera los reportes programados (ConfiguracionReporte) y los pedidos desde la web, '
+        'y envía los emails. Corre en un ciclo; con --una-vez procesa lo pendiente y termina.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesar lo pendiente y terminar')
+        parser.add_argument('--intervalo', type=float, default=30, help='Segundos entre revisiones (por defecto 30)')
+    
+    def handle(self, *args, **options):
+        while True:
+            try:
+                close_old_connections()
+                encolados = programar_vencidos()
+                procesados = procesar_pendientes()
+                if encolados or procesados or options['una_vez']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{encolados} reportes programados, {procesados} trabajos procesados'
+                    ))
+            except Exception:
+                if options['una_vez']:
+                    raise
+                logger.exception('Error en el proceso de reportes; se reintenta en el próximo ciclo')
+            
+            if options['una_vez']:
+                return
+            time.sleep(options['intervalo'])
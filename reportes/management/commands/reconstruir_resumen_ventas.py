@@ -0,0 +1,38 @@
+"""
+Reconstruye el resumen diario de ventas desde el historial
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reportes.resumen import reconstruir, aplicar_eventos
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye el resumen diario de ventas a partir de las ventas pagadas. '
+        'Conviene ejecutarlo fuera del horario de ventas.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final inclusive (AAAA-MM-DD)')
+        parser.add_argument(
+            '--solo-pendientes', action='store_true',
+            help='Sólo aplica los cambios de ventas pendientes (para ejecutar periódicamente)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['solo_pendientes']:
+            aplicados = aplicar_eventos()
+            self.stdout.write(self.style.SUCCESS(f'{aplicados} cambios de ventas aplicados al resumen'))
+            return
+        
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else None
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else None
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato AAAA-MM-DD')
+        
+        procesadas = reconstruir(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(f'Resumen reconstruido con {procesadas} ventas'))
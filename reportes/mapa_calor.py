@@ -0,0 +1,148 @@
+"""
+Mapa de calor de ventas por día de la semana y franja horaria
+
+Las ventas se concentran en los recreos, así que la cantidad de cajas a abrir
+y el momento de preparar productos dependen de la franja de 15 minutos y no
+del día completo. ``ventas_por_franja(desde, hasta)`` cuenta ventas e ingresos
+por día de la semana × franja × punto de venta con una sola consulta agrupada
+sobre la hora local de ``fecha_venta`` (``TIME_ZONE``, America/Asuncion).
+
+El mapa se arma por semanas (lunes a domingo). Una semana cerrada ya no
+cambia, así que su resultado se guarda en el caché (``ventas_semana_cerrada``)
+y analizar varias semanas solo consulta la base por la semana en curso.
+"""
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Sum, Count, IntegerField, ExpressionWrapper
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, ExtractMinute, Floor
+from django.utils import timezone
+
+from cantina_tita.cache import cacheado
+from ventas.models import Venta
+
+FRANJA_MINUTOS = 15
+FRANJAS_POR_HORA = 60 // FRANJA_MINUTOS
+
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+# Niveles de intensidad de las celdas (0 = sin ventas)
+NIVELES = 4
+
+# Segundos que se conserva en caché una semana cerrada
+DURACION_SEMANA_CERRADA = 7 * 24 * 60 * 60
+
+
+def etiqueta_franja(franja):
+    """'HH:MM' de inicio de la franja (0 = 00:00, 1 = 00:15...)"""
+    hora, cuarto = divmod(franja, FRANJAS_POR_HORA)
+    return f'{hora:02d}:{cuarto * FRANJA_MINUTOS:02d}'
+
+
+def ventas_por_franja(desde, hasta):
+    """
+    Ventas pagadas entre dos fechas locales (inclusive) agrupadas por día de
+    la semana (1 = lunes), franja de 15 minutos y punto de venta.
+
+    Returns:
+        Lista de dicts con dia, franja, punto_venta (código), ventas e ingresos
+    """
+    zona = timezone.get_current_timezone()
+    franja = ExpressionWrapper(
+        ExtractHour('fecha_venta', tzinfo=zona) * FRANJAS_POR_HORA
+        + Floor(ExtractMinute('fecha_venta', tzinfo=zona) / FRANJA_MINUTOS),
+        output_field=IntegerField()
+    )
+    filas = Venta.objects.filter(
+        estado='pagada', fecha_local__gte=desde, fecha_local__lte=hasta
+    ).annotate(
+        dia=ExtractIsoWeekDay('fecha_local'),
+        franja=franja,
+    ).values('dia', 'franja', 'punto_venta__codigo').annotate(
+        ventas=Count('id'),
+        ingresos=Sum('total'),
+    ).order_by('dia', 'franja', 'punto_venta__codigo')
+    return [
+        {
+            'dia': fila['dia'],
+            'franja': int(fila['franja']),
+            'punto_venta': fila['punto_venta__codigo'],
+            'ventas': fila['ventas'],
+            'ingresos': fila['ingresos'],
+        }
+        for fila in filas
+    ]
+
+
+# Una semana cerrada no cambia: no depende de la versión de ningún modelo
+ventas_semana_cerrada = cacheado(
+    'reportes.mapa_calor_semana', [], timeout=DURACION_SEMANA_CERRADA
+)(ventas_por_franja)
+
+
+def inicio_semana(fecha):
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def ventas_semanas(hasta, semanas=1):
+    """
+    Filas de ``ventas_por_franja`` de las ``semanas`` semanas que terminan en
+    la que contiene ``hasta``; las semanas cerradas salen del caché.
+    """
+    lunes_actual = inicio_semana(timezone.localdate())
+    filas = []
+    lunes = inicio_semana(hasta) - timedelta(weeks=semanas - 1)
+    for _ in range(semanas):
+        domingo = lunes + timedelta(days=6)
+        calcular = ventas_semana_cerrada if lunes < lunes_actual else ventas_por_franja
+        filas.extend(calcular(lunes, domingo))
+        lunes += timedelta(weeks=1)
+    return filas
+
+
+def mapa_calor(filas, punto_venta=None):
+    """
+    Arma la matriz día × franja desde las filas (de uno o todos los puntos de
+    venta). Solo incluye las franjas entre la primera y la última con ventas.
+
+    Returns:
+        dict con 'franjas' (etiquetas), 'dias' (nombre y celdas con ventas,
+        ingresos y nivel de 0 a NIVELES por franja), 'maximo' (ventas de la
+        celda más cargada) y 'puntos_venta' (códigos presentes en las filas)
+    """
+    puntos_venta = sorted({fila['punto_venta'] for fila in filas if fila['punto_venta']})
+    if punto_venta:
+        filas = [fila for fila in filas if fila['punto_venta'] == punto_venta]
+
+    celdas = {}
+    for fila in filas:
+        total = celdas.setdefault((fila['dia'], fila['franja']), {'ventas': 0, 'ingresos': Decimal('0.00')})
+        total['ventas'] += fila['ventas']
+        total['ingresos'] += fila['ingresos']
+
+    if not celdas:
+        return {'franjas': [], 'dias': [], 'maximo': 0, 'puntos_venta': puntos_venta}
+
+    franjas = range(
+        min(franja for _, franja in celdas),
+        max(franja for _, franja in celdas) + 1
+    )
+    maximo = max(total['ventas'] for total in celdas.values())
+
+    def celda(dia, franja):
+        valores = celdas.get((dia, franja), {'ventas': 0, 'ingresos': Decimal('0.00')})
+        return dict(valores, nivel=math.ceil(valores['ventas'] * NIVELES / maximo))
+
+    return {
+        'franjas': [etiqueta_franja(franja) for franja in franjas],
+        'dias': [
+            {
+                'nombre': nombre,
+                'celdas': [celda(numero, franja) for franja in franjas],
+            }
+            for numero, nombre in enumerate(DIAS_SEMANA, start=1)
+        ],
+        'maximo': maximo,
+        'puntos_venta': puntos_venta,
+    }
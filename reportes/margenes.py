@@ -0,0 +1,87 @@
+"""
+Reporte de rentabilidad con el costo al momento de la venta
+
+``DetalleVenta.costo_unitario`` guarda el costo del producto cuando se vende,
+así que el margen de ventas viejas no cambia al actualizar ``precio_costo``.
+Unidades, ingresos, costo y ganancia se calculan en la base con una consulta
+agrupada por producto, categoría, mes o día; en Python solo se calcula el
+porcentaje de margen de cada grupo ya agregado.
+
+Los detalles sin costo (ventas anteriores al campo que todavía no pasaron por
+``rellenar_costo_unitario``) no entran en el margen: se cuentan aparte en
+``sin_costo`` para que el reporte no muestre una ganancia inflada.
+"""
+from decimal import Decimal
+
+from django.db.models import Sum, Count, Q, F, DecimalField, ExpressionWrapper
+from django.db.models.functions import TruncMonth
+
+from ventas.models import DetalleVenta
+
+# agrupación -> (campos del grupo, encabezado)
+AGRUPACIONES = {
+    'producto': (['producto__codigo', 'producto__nombre'], 'Producto'),
+    'categoria': (['producto__categoria__nombre'], 'Categoría'),
+    'mes': (['mes'], 'Mes'),
+    'dia': (['venta__fecha_local'], 'Día'),
+}
+
+CERO = Decimal('0.00')
+
+
+def _margen(ganancia, ingresos):
+    """Ganancia como porcentaje de los ingresos (None sin ingresos)"""
+    if not ingresos:
+        return None
+    return round(ganancia * 100 / ingresos, 2)
+
+
+def margenes(desde, hasta, agrupar='producto'):
+    """
+    Rentabilidad de las ventas pagadas entre dos fechas locales (inclusive).
+
+    Returns:
+        Lista de dicts con los campos del grupo, unidades, ingresos, costo,
+        ganancia, margen (% sobre ingresos) y sin_costo, ordenada por ganancia.
+    """
+    if agrupar not in AGRUPACIONES:
+        raise ValueError(f'Agrupación inválida: {agrupar}')
+    campos = AGRUPACIONES[agrupar][0]
+
+    detalles = DetalleVenta.objects.filter(
+        venta__estado='pagada',
+        venta__fecha_local__gte=desde,
+        venta__fecha_local__lte=hasta
+    )
+    if agrupar == 'mes':
+        detalles = detalles.annotate(mes=TruncMonth('venta__fecha_local'))
+
+    dinero = DecimalField(max_digits=14, decimal_places=2)
+    con_costo = Q(costo_unitario__isnull=False)
+    filas = list(detalles.values(*campos).annotate(
+        unidades=Sum('cantidad', filter=con_costo),
+        ingresos=Sum('subtotal', filter=con_costo),
+        costo=Sum(
+            ExpressionWrapper(F('cantidad') * F('costo_unitario'), output_field=dinero),
+            filter=con_costo
+        ),
+        sin_costo=Count('id', filter=~con_costo),
+    ).annotate(
+        ganancia=ExpressionWrapper(F('ingresos') - F('costo'), output_field=dinero),
+    ).order_by(F('ganancia').desc(nulls_last=True), *campos))
+    for fila in filas:
+        fila['margen'] = _margen(fila['ganancia'], fila['ingresos'])
+    return filas
+
+
+def totales(filas):
+    """Totales del reporte sumando los grupos"""
+    resultado = {
+        'unidades': sum(fila['unidades'] or 0 for fila in filas),
+        'ingresos': sum((fila['ingresos'] or CERO for fila in filas), CERO),
+        'costo': sum((fila['costo'] or CERO for fila in filas), CERO),
+        'sin_costo': sum(fila['sin_costo'] for fila in filas),
+    }
+    resultado['ganancia'] = resultado['ingresos'] - resultado['costo']
+    resultado['margen'] = _margen(resultado['ganancia'], resultado['ingresos'])
+    return resultado
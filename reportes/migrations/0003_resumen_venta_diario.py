@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0003_claveidempotencia'),
+        ('productos', '0003_indices_busqueda_texto'),
+        ('reportes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoResumenVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signo', models.SmallIntegerField()),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('venta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos_resumen', to='ventas.venta')),
+            ],
+            options={
+                'verbose_name': 'Evento de Resumen de Ventas',
+                'verbose_name_plural': 'Eventos de Resumen de Ventas',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenVentaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad', models.IntegerField(default=0, help_text='Ventas (total y producto) o pagos (método de pago)')),
+                ('unidades', models.IntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('metodo_pago', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='ventas.metodopago')),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='productos.producto')),
+                ('punto_venta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='ventas.puntoventa')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Ventas',
+                'verbose_name_plural': 'Resúmenes Diarios de Ventas',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha', 'punto_venta'], name='resumen_diario_fecha_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumenventadiario',
+            constraint=models.UniqueConstraint(condition=models.Q(('metodo_pago__isnull', True), ('producto__isnull', False)), fields=('fecha', 'punto_venta', 'producto'), name='resumen_diario_producto_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumenventadiario',
+            constraint=models.UniqueConstraint(condition=models.Q(('metodo_pago__isnull', False), ('producto__isnull', True)), fields=('fecha', 'punto_venta', 'metodo_pago'), name='resumen_diario_metodo_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumenventadiario',
+            constraint=models.UniqueConstraint(condition=models.Q(('metodo_pago__isnull', True), ('producto__isnull', True)), fields=('fecha', 'punto_venta'), name='resumen_diario_total_unico'),
+        ),
+    ]
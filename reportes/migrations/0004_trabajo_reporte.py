@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reportes', '0003_resumen_venta_diario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_reporte', models.CharField(choices=[('consumo_estudiante', 'Consumo por Estudiante'), ('productos_mas_vendidos', 'Productos Más Vendidos'), ('ingresos_metodo_pago', 'Ingresos por Método de Pago'), ('ventas_diarias', 'Ventas Diarias'), ('stock_productos', 'Estado de Stock'), ('comisiones_pagos', 'Comisiones de Pagos')], max_length=30)),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('destinatarios', models.TextField(blank=True, help_text='Emails separados por comas a los que se envía el reporte')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En Proceso'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=15)),
+                ('programado_para', models.DateTimeField(default=django.utils.timezone.now)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('archivo_excel', models.FileField(blank=True, null=True, upload_to='reportes/')),
+                ('archivo_pdf', models.FileField(blank=True, null=True, upload_to='reportes/')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio_proceso', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin_proceso', models.DateTimeField(blank=True, null=True)),
+                ('configuracion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trabajos', to='reportes.configuracionreporte')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trabajos_reportes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Reporte',
+                'verbose_name_plural': 'Trabajos de Reportes',
+                'ordering': ['-programado_para'],
+                'indexes': [models.Index(fields=['estado', 'programado_para'], name='trabajo_reporte_estado_idx')],
+            },
+        ),
+    ]
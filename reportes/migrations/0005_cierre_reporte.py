@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0004_trabajo_reporte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_reporte', models.CharField(choices=[('consumo_estudiante', 'Consumo por Estudiante'), ('productos_mas_vendidos', 'Productos Más Vendidos'), ('ingresos_metodo_pago', 'Ingresos por Método de Pago'), ('ventas_diarias', 'Ventas Diarias'), ('stock_productos', 'Estado de Stock'), ('comisiones_pagos', 'Comisiones de Pagos')], max_length=30)),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('fecha_generacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Cierre de Reporte',
+                'verbose_name_plural': 'Cierres de Reportes',
+                'ordering': ['-fecha_generacion'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cierrereporte',
+            constraint=models.UniqueConstraint(fields=('tipo_reporte', 'fecha_inicio', 'fecha_fin'), name='cierre_reporte_periodo_unico'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:05
+
+from django.db import migrations
+from django.db.models import Sum, Count, F
+
+
+# Filas del resumen por INSERT
+TAMANO_LOTE = 1000
+
+
+def rellenar_resumen(apps, schema_editor):
+    """
+    Arma el resumen diario con las ventas pagadas existentes (una consulta
+    agrupada por tipo de fila) y descarta los eventos pendientes, que ya
+    quedan contados. Sin esto el historial se vería en cero y los cierres de
+    meses pasados guardarían el resumen vacío.
+    """
+    Venta = apps.get_model('ventas', 'Venta')
+    DetalleVenta = apps.get_model('ventas', 'DetalleVenta')
+    PagoVenta = apps.get_model('ventas', 'PagoVenta')
+    ResumenVentaDiario = apps.get_model('reportes', 'ResumenVentaDiario')
+    EventoResumenVenta = apps.get_model('reportes', 'EventoResumenVenta')
+
+    if schema_editor.connection.vendor == 'postgresql':
+        # Las ventas que se cobren durante la migración encolan su evento después
+        schema_editor.execute(f'LOCK TABLE {EventoResumenVenta._meta.db_table} IN EXCLUSIVE MODE')
+
+    EventoResumenVenta.objects.all().delete()
+    ResumenVentaDiario.objects.all().delete()
+
+    filas = []
+    totales = Venta.objects.filter(estado='pagada').values(
+        fecha=F('fecha_local'), pv=F('punto_venta_id')
+    ).annotate(ventas=Count('id'), total=Sum('total')).order_by()
+    for fila in totales:
+        filas.append(ResumenVentaDiario(
+            fecha=fila['fecha'], punto_venta_id=fila['pv'], cantidad=fila['ventas'], monto=fila['total']
+        ))
+
+    productos = DetalleVenta.objects.filter(venta__estado='pagada').values(
+        fecha=F('venta__fecha_local'), pv=F('venta__punto_venta_id'), prod=F('producto_id')
+    ).annotate(
+        ventas=Count('venta_id', distinct=True), total_unidades=Sum('cantidad'), total=Sum('subtotal')
+    ).order_by()
+    for fila in productos:
+        filas.append(ResumenVentaDiario(
+            fecha=fila['fecha'], punto_venta_id=fila['pv'], producto_id=fila['prod'],
+            cantidad=fila['ventas'], unidades=fila['total_unidades'], monto=fila['total']
+        ))
+
+    metodos = PagoVenta.objects.filter(venta__estado='pagada').values(
+        fecha=F('venta__fecha_local'), pv=F('venta__punto_venta_id'), metodo=F('metodo_pago_id')
+    ).annotate(pagos=Count('id'), total=Sum('monto')).order_by()
+    for fila in metodos:
+        filas.append(ResumenVentaDiario(
+            fecha=fila['fecha'], punto_venta_id=fila['pv'], metodo_pago_id=fila['metodo'],
+            cantidad=fila['pagos'], monto=fila['total']
+        ))
+
+    ResumenVentaDiario.objects.bulk_create(filas, batch_size=TAMANO_LOTE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0004_fecha_local'),
+        ('reportes', '0005_cierre_reporte'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_resumen, migrations.RunPython.noop),
+    ]
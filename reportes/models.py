@@ -258,3 +258,188 @@ class ConfiguracionReporte(models.Model):
     class Meta:
         verbose_name = "Configuración de Reporte"
         verbose_name_plural = "Configuraciones de Reportes"
+
+
+class ResumenVentaDiario(models.Model):
+    """
+    Totales diarios de las ventas pagadas, mantenidos de forma incremental
+    (ver reportes/resumen.py). Hay tres tipos de fila por día y punto de venta:
+
+    - por producto (sin método de pago): unidades, ingresos y ventas que lo incluyen
+    - por método de pago (sin producto): monto cobrado y cantidad de pagos
+    - total del día (sin producto ni método): cantidad de ventas y monto total
+    """
+    fecha = models.DateField()
+    punto_venta = models.ForeignKey(
+        'ventas.PuntoVenta',
+        on_delete=models.CASCADE,
+        related_name='resumenes_diarios'
+    )
+    producto = models.ForeignKey(
+        'productos.Producto',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='resumenes_diarios'
+    )
+    metodo_pago = models.ForeignKey(
+        'ventas.MetodoPago',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='resumenes_diarios'
+    )
+    
+    cantidad = models.IntegerField(
+        default=0,
+        help_text="Ventas (total y producto) o pagos (método de pago)"
+    )
+    unidades = models.IntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.fecha} - {self.punto_venta_id} - {self.producto_id or self.metodo_pago_id or 'total'}"
+    
+    class Meta:
+        verbose_name = "Resumen Diario de Ventas"
+        verbose_name_plural = "Resúmenes Diarios de Ventas"
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'punto_venta', 'producto'],
+                condition=models.Q(producto__isnull=False, metodo_pago__isnull=True),
+                name='resumen_diario_producto_unico'
+            ),
+            models.UniqueConstraint(
+                fields=['fecha', 'punto_venta', 'metodo_pago'],
+                condition=models.Q(producto__isnull=True, metodo_pago__isnull=False),
+                name='resumen_diario_metodo_unico'
+            ),
+            models.UniqueConstraint(
+                fields=['fecha', 'punto_venta'],
+                condition=models.Q(producto__isnull=True, metodo_pago__isnull=True),
+                name='resumen_diario_total_unico'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['fecha', 'punto_venta'], name='resumen_diario_fecha_idx'),
+        ]
+
+
+class EventoResumenVenta(models.Model):
+    """
+    Cambio de una venta pendiente de aplicar al resumen diario (outbox).
+    Se crea en la misma transacción que la venta: +1 al pagarse, -1 al
+    cancelarse o devolverse una venta pagada.
+    """
+    venta = models.ForeignKey(
+        'ventas.Venta',
+        on_delete=models.CASCADE,
+        related_name='eventos_resumen'
+    )
+    signo = models.SmallIntegerField()
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Venta {self.venta_id} ({self.signo:+d})"
+    
+    class Meta:
+        verbose_name = "Evento de Resumen de Ventas"
+        verbose_name_plural = "Eventos de Resumen de Ventas"
+        ordering = ['id']
+
+
+class TrabajoReporte(models.Model):
+    """
+    Generación de un reporte en segundo plano (ver reportes/trabajos.py y el
+    comando procesar_reportes). Se crea al vencer una ConfiguracionReporte o
+    a pedido desde la configuración de reportes.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En Proceso'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+    
+    tipo_reporte = models.CharField(
+        max_length=30,
+        choices=ReporteBase.TIPO_REPORTE_CHOICES
+    )
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+    
+    configuracion = models.ForeignKey(
+        ConfiguracionReporte,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='trabajos'
+    )
+    solicitado_por = models.ForeignKey(
+        'usuarios.Usuario',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='trabajos_reportes'
+    )
+    destinatarios = models.TextField(
+        blank=True,
+        help_text="Emails separados por comas a los que se envía el reporte"
+    )
+    
+    estado = models.CharField(
+        max_length=15,
+        choices=ESTADO_CHOICES,
+        default='pendiente'
+    )
+    programado_para = models.DateTimeField(default=timezone.now)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    
+    archivo_excel = models.FileField(upload_to='reportes/', blank=True, null=True)
+    archivo_pdf = models.FileField(upload_to='reportes/', blank=True, null=True)
+    
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio_proceso = models.DateTimeField(null=True, blank=True)
+    fecha_fin_proceso = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_tipo_reporte_display()} {self.fecha_inicio} a {self.fecha_fin} ({self.get_estado_display()})"
+    
+    class Meta:
+        verbose_name = "Trabajo de Reporte"
+        verbose_name_plural = "Trabajos de Reportes"
+        ordering = ['-programado_para']
+        indexes = [
+            models.Index(fields=['estado', 'programado_para'], name='trabajo_reporte_estado_idx'),
+        ]
+
+
+class CierreReporte(models.Model):
+    """
+    Generación de un reporte de período cerrado (ver cierres.py). Marca que
+    el período ya se generó aunque no haya dado filas (p. ej. consumo de un
+    mes sin ventas). Borrarlo hace que el período se vuelva a generar.
+    """
+    tipo_reporte = models.CharField(
+        max_length=30,
+        choices=ReporteBase.TIPO_REPORTE_CHOICES
+    )
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+    fecha_generacion = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.get_tipo_reporte_display()} {self.fecha_inicio} a {self.fecha_fin}"
+    
+    class Meta:
+        verbose_name = "Cierre de Reporte"
+        verbose_name_plural = "Cierres de Reportes"
+        ordering = ['-fecha_generacion']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tipo_reporte', 'fecha_inicio', 'fecha_fin'],
+                name='cierre_reporte_periodo_unico'
+            ),
+        ]
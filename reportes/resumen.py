@@ -0,0 +1,207 @@
+"""
+Resumen diario de ventas mantenido de forma incremental
+
+Los reportes y dashboards leen ``ResumenVentaDiario`` (una fila por día, punto
+de venta y producto o método de pago) en lugar de agregar todas las ventas en
+cada carga, por lo que su costo depende de la cantidad de días y no de la de
+ventas.
+
+Cada vez que una venta pasa a pagada, o deja de estarlo (cancelada, devuelta),
+se registra un ``EventoResumenVenta`` en la misma transacción (outbox). Los
+eventos pendientes se aplican en lote con ``aplicar_eventos()``, que los
+reportes llaman antes de leer. ``reconstruir()`` (y el comando
+``reconstruir_resumen_ventas``) rehace el resumen desde el historial con la
+tabla de eventos bloqueada, para que ninguna venta se cuente dos veces.
+"""
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Sum, Count, F
+
+from ventas.models import Venta, DetalleVenta, PagoVenta
+from .models import ResumenVentaDiario, EventoResumenVenta
+
+# Eventos que se aplican por transacción
+TAMANO_LOTE = 1000
+
+
+def registrar_ventas_pagadas(ventas):
+    """Encola el alta en el resumen de ventas creadas sin señales (bulk_create)"""
+    EventoResumenVenta.objects.bulk_create([EventoResumenVenta(venta=venta, signo=1) for venta in ventas])
+
+
+def _deltas(signos):
+    """
+    Calcula lo que hay que sumar a cada fila del resumen.
+
+    Args:
+        signos: dict {venta_id: +1/-1}
+
+    Returns:
+        dict {(fecha, punto_venta_id, producto_id, metodo_pago_id): [cantidad, unidades, monto]}
+    """
+    signos = {venta_id: signo for venta_id, signo in signos.items() if signo}
+    deltas = {}
+
+    def sumar(clave, cantidad, unidades, monto):
+        fila = deltas.setdefault(clave, [0, 0, 0])
+        fila[0] += cantidad
+        fila[1] += unidades
+        fila[2] += monto
+
+    ventas = {}
+    filas = Venta.objects.filter(id__in=signos).values_list('id', 'fecha_local', 'punto_venta_id', 'total')
+    for venta_id, fecha, punto_venta_id, total in filas:
+        ventas[venta_id] = (fecha, punto_venta_id)
+        signo = signos[venta_id]
+        sumar((fecha, punto_venta_id, None, None), signo, 0, signo * total)
+
+    detalles = DetalleVenta.objects.filter(venta_id__in=ventas).values(
+        'venta_id', 'producto_id'
+    ).annotate(unidades=Sum('cantidad'), monto=Sum('subtotal'))
+    for detalle in detalles:
+        fecha, punto_venta_id = ventas[detalle['venta_id']]
+        signo = signos[detalle['venta_id']]
+        sumar((fecha, punto_venta_id, detalle['producto_id'], None),
+              signo, signo * detalle['unidades'], signo * detalle['monto'])
+
+    pagos = PagoVenta.objects.filter(venta_id__in=ventas).values(
+        'venta_id', 'metodo_pago_id'
+    ).annotate(pagos=Count('id'), monto=Sum('monto'))
+    for pago in pagos:
+        fecha, punto_venta_id = ventas[pago['venta_id']]
+        signo = signos[pago['venta_id']]
+        sumar((fecha, punto_venta_id, None, pago['metodo_pago_id']),
+              signo * pago['pagos'], 0, signo * pago['monto'])
+
+    return deltas
+
+
+def _orden(item):
+    fecha, punto_venta_id, producto_id, metodo_pago_id = item[0]
+    return fecha, punto_venta_id, producto_id or 0, metodo_pago_id or 0
+
+
+def _aplicar_deltas(deltas):
+    """
+    Suma los deltas a las filas del resumen (UPDATE y, si no existe, INSERT).
+    Las filas se bloquean siempre en el mismo orden: dos procesos aplicando
+    eventos a la vez se esperan en lugar de trabarse (deadlock).
+    """
+    for (fecha, punto_venta_id, producto_id, metodo_pago_id), (cantidad, unidades, monto) in sorted(
+        deltas.items(), key=_orden
+    ):
+        filtro = {
+            'fecha': fecha,
+            'punto_venta_id': punto_venta_id,
+            'producto_id': producto_id,
+            'metodo_pago_id': metodo_pago_id,
+        }
+        cambios = {
+            'cantidad': F('cantidad') + cantidad,
+            'unidades': F('unidades') + unidades,
+            'monto': F('monto') + monto,
+        }
+        if ResumenVentaDiario.objects.filter(**filtro).update(**cambios):
+            continue
+        try:
+            with transaction.atomic():
+                ResumenVentaDiario.objects.create(cantidad=cantidad, unidades=unidades, monto=monto, **filtro)
+        except IntegrityError:
+            # Otro proceso creó la fila al mismo tiempo
+            ResumenVentaDiario.objects.filter(**filtro).update(**cambios)
+
+
+def aplicar_eventos():
+    """
+    Aplica los eventos pendientes al resumen. Retorna cuántos se aplicaron.
+    Varios procesos pueden llamarla a la vez: cada evento lo toma uno solo.
+    """
+    aplicados = 0
+    while True:
+        with transaction.atomic():
+            eventos = list(
+                EventoResumenVenta.objects.select_for_update(skip_locked=True)
+                .order_by('id').values_list('id', 'venta_id', 'signo')[:TAMANO_LOTE]
+            )
+            if not eventos:
+                return aplicados
+
+            signos = {}
+            for _, venta_id, signo in eventos:
+                signos[venta_id] = signos.get(venta_id, 0) + signo
+            _aplicar_deltas(_deltas(signos))
+            EventoResumenVenta.objects.filter(id__in=[evento_id for evento_id, _, _ in eventos]).delete()
+
+        aplicados += len(eventos)
+        if len(eventos) < TAMANO_LOTE:
+            return aplicados
+
+
+def _bloquear_eventos():
+    """
+    Bloquea la tabla de eventos hasta el fin de la transacción: espera a los
+    procesos que están aplicando eventos y a las ventas que ya encolaron el
+    suyo, y frena las nuevas hasta terminar. En SQLite las escrituras ya se
+    hacen de a una.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {EventoResumenVenta._meta.db_table} IN EXCLUSIVE MODE')
+
+
+def reconstruir(desde=None, hasta=None):
+    """
+    Rehace el resumen desde las ventas pagadas (opcionalmente entre dos fechas
+    locales, inclusive). Retorna la cantidad de ventas procesadas.
+
+    Mientras dura, las ventas que cambian de estado esperan para encolar su
+    evento: así el evento se aplica después y no se suma a una venta que la
+    reconstrucción ya contó (ni se lo lleva otro proceso a mitad de camino).
+    """
+    ventas = Venta.objects.filter(estado='pagada')
+    resumen = ResumenVentaDiario.objects.all()
+    if desde:
+        ventas = ventas.filter(fecha_local__gte=desde)
+        resumen = resumen.filter(fecha__gte=desde)
+    if hasta:
+        ventas = ventas.filter(fecha_local__lte=hasta)
+        resumen = resumen.filter(fecha__lte=hasta)
+
+    procesadas = 0
+    with transaction.atomic():
+        _bloquear_eventos()
+        # Los pendientes de ventas fuera del rango deben conservarse
+        aplicar_eventos()
+        resumen.delete()
+        ids = list(ventas.values_list('id', flat=True))
+        for inicio in range(0, len(ids), TAMANO_LOTE):
+            lote = ids[inicio:inicio + TAMANO_LOTE]
+            _aplicar_deltas(_deltas({venta_id: 1 for venta_id in lote}))
+            procesadas += len(lote)
+    return procesadas
+
+
+def resumen_ventas(desde=None, hasta=None):
+    """
+    Filas del resumen entre dos fechas (inclusive), con los eventos
+    pendientes ya aplicados
+    """
+    aplicar_eventos()
+    filas = ResumenVentaDiario.objects.all()
+    if desde:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta:
+        filas = filas.filter(fecha__lte=hasta)
+    return filas
+
+
+def totales_diarios(filas):
+    return filas.filter(producto__isnull=True, metodo_pago__isnull=True)
+
+
+def por_producto(filas):
+    return filas.filter(producto__isnull=False)
+
+
+def por_metodo_pago(filas):
+    return filas.filter(metodo_pago__isnull=False)
@@ -0,0 +1,169 @@
+"""
+Series de tiempo de ventas para los reportes y gráficos
+
+``serie_ventas(desde, hasta, intervalo)`` devuelve ventas, ítems vendidos e
+ingresos agrupados por hora, día, semana o mes en la hora local del negocio
+(``TIME_ZONE``, America/Asuncion), con una sola consulta agrupada sin
+importar la longitud del rango:
+
+- día, semana y mes salen del resumen diario (``ResumenVentaDiario``);
+- hora sale de las ventas, truncando ``fecha_venta`` en hora local.
+
+La serie es continua (los intervalos sin ventas van en cero) y, si se pasa
+``max_puntos``, los rangos largos se reducen sumando intervalos consecutivos
+para que el gráfico no tenga más puntos que pixeles.
+"""
+import math
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Sum, Count, Q, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce, TruncDay, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from ventas.models import Venta, DetalleVenta
+from .models import ResumenVentaDiario
+from .resumen import aplicar_eventos
+
+INTERVALOS = ('hora', 'dia', 'semana', 'mes')
+
+# Días que puede abarcar una serie pedida por la API según el intervalo
+MAX_DIAS = {
+    'hora': 31,
+    'dia': 2 * 366,
+    'semana': 5 * 366,
+    'mes': 10 * 366,
+}
+
+_TRUNCAR_FECHA = {
+    'dia': TruncDay,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+}
+
+
+def _inicio_intervalo(fecha, intervalo):
+    """Primer instante del intervalo que contiene ``fecha``"""
+    if intervalo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if intervalo == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def _siguiente(inicio, intervalo):
+    if intervalo == 'hora':
+        return inicio + timedelta(hours=1)
+    if intervalo == 'dia':
+        return inicio + timedelta(days=1)
+    if intervalo == 'semana':
+        return inicio + timedelta(weeks=1)
+    if inicio.month == 12:
+        return inicio.replace(year=inicio.year + 1, month=1)
+    return inicio.replace(month=inicio.month + 1)
+
+
+def _agrupar_por_fecha(desde, hasta, intervalo, punto_venta):
+    """Totales por día/semana/mes desde el resumen diario (una consulta)"""
+    aplicar_eventos()
+    filas = ResumenVentaDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+    if punto_venta is not None:
+        filas = filas.filter(punto_venta=punto_venta)
+
+    total_dia = Q(producto__isnull=True, metodo_pago__isnull=True)
+    filas = filas.annotate(
+        inicio=_TRUNCAR_FECHA[intervalo]('fecha')
+    ).values('inicio').annotate(
+        ventas=Sum('cantidad', filter=total_dia),
+        items=Sum('unidades', filter=Q(producto__isnull=False)),
+        ingresos=Sum('monto', filter=total_dia),
+    )
+    return {fila['inicio']: fila for fila in filas}
+
+
+def _agrupar_por_hora(desde, hasta, punto_venta):
+    """Totales por hora local desde las ventas (una consulta)"""
+    zona = timezone.get_current_timezone()
+    ventas = Venta.objects.filter(estado='pagada', fecha_local__gte=desde, fecha_local__lte=hasta)
+    if punto_venta is not None:
+        ventas = ventas.filter(punto_venta=punto_venta)
+
+    # Ítems por venta como subconsulta: un JOIN a los detalles duplicaría los totales
+    items_venta = DetalleVenta.objects.filter(
+        venta=OuterRef('pk')
+    ).values('venta').annotate(total=Sum('cantidad')).values('total')
+
+    filas = ventas.annotate(
+        inicio=TruncHour('fecha_venta', tzinfo=zona),
+        items_venta=Coalesce(Subquery(items_venta, output_field=IntegerField()), 0),
+    ).values('inicio').annotate(
+        ventas=Count('id'),
+        items=Sum('items_venta'),
+        ingresos=Sum('total'),
+    ).order_by('inicio')
+    return {timezone.localtime(fila['inicio'], zona).replace(tzinfo=None): fila for fila in filas}
+
+
+def _reducir(serie, max_puntos):
+    """Suma intervalos consecutivos hasta que la serie tenga a lo sumo ``max_puntos``"""
+    if not max_puntos or len(serie) <= max_puntos:
+        return serie
+    tamano = math.ceil(len(serie) / max_puntos)
+    reducida = []
+    for posicion in range(0, len(serie), tamano):
+        grupo = serie[posicion:posicion + tamano]
+        reducida.append({
+            'inicio': grupo[0]['inicio'],
+            'fin': grupo[-1]['fin'],
+            'ventas': sum(punto['ventas'] for punto in grupo),
+            'items': sum(punto['items'] for punto in grupo),
+            'ingresos': sum((punto['ingresos'] for punto in grupo), Decimal('0.00')),
+        })
+    return reducida
+
+
+def serie_ventas(desde, hasta, intervalo='dia', max_puntos=None, punto_venta=None):
+    """
+    Ventas pagadas entre dos fechas locales (inclusive) agrupadas por intervalo.
+
+    Args:
+        desde, hasta: fechas (date) del rango
+        intervalo: 'hora', 'dia', 'semana' o 'mes'
+        max_puntos: cantidad máxima de puntos a devolver (None: sin reducir)
+        punto_venta: PuntoVenta o id para filtrar (None: todos)
+
+    Returns:
+        Lista ordenada de dicts con inicio, fin (exclusivo), ventas, items e
+        ingresos. ``inicio`` es date, o datetime local sin zona para 'hora'.
+    """
+    if intervalo not in INTERVALOS:
+        raise ValueError(f'Intervalo inválido: {intervalo}')
+    if hasta < desde:
+        return []
+
+    if intervalo == 'hora':
+        totales = _agrupar_por_hora(desde, hasta, punto_venta)
+        actual = datetime.combine(desde, time.min)
+        limite = datetime.combine(hasta + timedelta(days=1), time.min)
+    else:
+        totales = {
+            # TruncDay/TruncWeek/TruncMonth sobre un DateField devuelven date
+            (inicio.date() if isinstance(inicio, datetime) else inicio): fila
+            for inicio, fila in _agrupar_por_fecha(desde, hasta, intervalo, punto_venta).items()
+        }
+        actual = _inicio_intervalo(desde, intervalo)
+        limite = hasta + timedelta(days=1)
+
+    serie = []
+    while actual < limite:
+        siguiente = _siguiente(actual, intervalo)
+        fila = totales.get(actual, {})
+        serie.append({
+            'inicio': actual,
+            'fin': siguiente,
+            'ventas': fila.get('ventas') or 0,
+            'items': fila.get('items') or 0,
+            'ingresos': fila.get('ingresos') or Decimal('0.00'),
+        })
+        actual = siguiente
+    return _reducir(serie, max_puntos)
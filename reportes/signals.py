@@ -0,0 +1,29 @@
+"""
+Señales de reportes: registran en el outbox del resumen diario los cambios de
+estado de las ventas (ver resumen.py)
+"""
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from ventas.models import Venta
+from .models import EventoResumenVenta
+
+
+@receiver(post_init, sender=Venta, dispatch_uid='resumen_venta_estado_inicial')
+def recordar_estado(sender, instance, **kwargs):
+    # Sin acceder al atributo: si el campo fue diferido no se consulta
+    instance._estado_resumen = instance.__dict__.get('estado')
+
+
+@receiver(post_save, sender=Venta, dispatch_uid='resumen_venta_guardada')
+def registrar_cambio_de_estado(sender, instance, created, **kwargs):
+    anterior = None if created else instance._estado_resumen
+    if anterior is None and not created:
+        # Estado previo desconocido (campo diferido)
+        return
+
+    pagada_antes = anterior == 'pagada'
+    pagada_ahora = instance.estado == 'pagada'
+    if pagada_antes != pagada_ahora:
+        EventoResumenVenta.objects.create(venta=instance, signo=1 if pagada_ahora else -1)
+    instance._estado_resumen = instance.estado
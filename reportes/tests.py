@@ -1,3 +1,727 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, transaction, OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import date, datetime, timedelta, timezone as datetime_timezone
+from django.urls import reverse
+
+from openpyxl import load_workbook
+
+from cantina_tita.cache import cacheado, estadisticas
+from productos.models import Categoria, Producto
+from productos.stock import descontar_stock
+from usuarios.models import Usuario, PerfilHijo
+from ventas.models import Venta, DetalleVenta, PagoVenta, MetodoPago
+from ventas.tests import POSTestMixin
+from .models import (
+    ResumenVentaDiario, EventoResumenVenta, ConfiguracionReporte, TrabajoReporte,
+    ReporteConsumoEstudiante, ReporteProductosMasVendidos, ReporteIngresosPorMetodo, CierreReporte
+)
+from . import generadores, trabajos
+from .cierres import periodo_cerrado
+from .series import serie_ventas
+from .comisiones import CERO, comisiones, comisiones_cerradas
+from .margenes import margenes
+from .mapa_calor import ventas_por_franja, ventas_semanas, mapa_calor
+from .views import _estadisticas_generales
+from . import resumen
+from .resumen import aplicar_eventos, reconstruir, resumen_ventas, totales_diarios, por_producto
+
+
+@cacheado('tests.stock_total', ['productos.Producto'])
+def stock_total():
+    return sum(Producto.objects.values_list('stock_actual', flat=True))
+
+
+class CacheCalculosTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre='Bebidas')
+        self.producto = self.crear_producto('B001')
+
+    def crear_producto(self, codigo):
+        return Producto.objects.create(
+            categoria=self.categoria, codigo=codigo, nombre=f'Producto {codigo}',
+            precio_costo=Decimal('1000'), precio_venta=Decimal('2000'), stock_actual=10
+        )
+
+    def test_segunda_llamada_no_consulta(self):
+        self.assertEqual(stock_total(), 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(stock_total(), 10)
+        self.assertEqual(estadisticas()['tests.stock_total'], {'aciertos': 1, 'fallos': 1, 'tasa_aciertos': 0.5})
+
+    def test_guardar_invalida(self):
+        stock_total()
+        self.crear_producto('B002')
+        self.assertEqual(stock_total(), 20)
+
+    def test_update_de_stock_invalida(self):
+        stock_total()
+        descontar_stock({self.producto.id: 3})
+        self.assertEqual(stock_total(), 7)
+
+    def test_dashboard_de_reportes_y_estadisticas(self):
+        admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(reverse('reportes:lista_reportes')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('reportes:lista_reportes')).status_code, 200)
+
+        response = self.client.get(reverse('reportes:estadisticas_cache'))
+        calculo = response.json()['calculos']['reportes.lista_reportes']
+        self.assertEqual((calculo['aciertos'], calculo['fallos']), (1, 1))
+
+
+class ResumenVentaDiarioTest(POSTestMixin, TestCase):
+
+    def setUp(self):
+        self.crear_datos_pos()
+
+    def vender(self, lineas):
+        response = self.post_json(
+            'ventas:api_procesar_venta_efectivo',
+            {'hijo_id': self.hijo.id, 'items': self.items(lineas), 'monto_efectivo_recibido': 100000}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return Venta.objects.get(pk=response.json()['venta_id'])
+
+    def filas(self):
+        return sorted(ResumenVentaDiario.objects.values_list(
+            'fecha', 'punto_venta_id', 'producto_id', 'metodo_pago_id', 'cantidad', 'unidades', 'monto'
+        ), key=str)
+
+    def test_venta_pagada_suma_al_resumen(self):
+        self.vender(2)
+        self.vender(1)
+        filas = resumen_ventas()
+
+        total = totales_diarios(filas).get()
+        self.assertEqual((total.cantidad, total.monto), (2, Decimal('18000')))
+        producto = por_producto(filas).get(producto=self.productos[0])
+        self.assertEqual((producto.cantidad, producto.unidades, producto.monto), (2, 4, Decimal('12000')))
+        self.assertFalse(EventoResumenVenta.objects.exists())
+
+    def test_cancelar_resta_del_resumen(self):
+        venta = self.vender(2)
+        aplicar_eventos()
+        venta.estado = 'cancelada'
+        venta.save()
+
+        total = totales_diarios(resumen_ventas()).get()
+        self.assertEqual((total.cantidad, total.monto), (0, Decimal('0')))
+
+    def test_reconstruir_coincide_con_el_incremental(self):
+        self.vender(3)
+        self.vender(1)
+        aplicar_eventos()
+        incremental = self.filas()
+
+        self.assertEqual(reconstruir(), 2)
+        self.assertEqual(self.filas(), incremental)
+
+    def test_filas_en_orden_fijo(self):
+        hoy = timezone.localdate()
+        pv = self.punto_venta.id
+        deltas = {
+            (hoy, pv, self.productos[1].id, None): [1, 1, 10],
+            (hoy, pv, None, None): [1, 0, 10],
+            (hoy, pv, self.productos[0].id, None): [1, 1, 10],
+            (hoy - timedelta(days=1), pv, None, None): [1, 0, 10],
+        }
+        filas = ResumenVentaDiario.objects
+        with mock.patch.object(filas, 'filter', wraps=filas.filter) as filtro:
+            resumen._aplicar_deltas(deltas)
+        self.assertEqual(
+            [(llamada.kwargs['fecha'], llamada.kwargs['producto_id']) for llamada in filtro.call_args_list],
+            [(hoy - timedelta(days=1), None), (hoy, None), (hoy, self.productos[0].id), (hoy, self.productos[1].id)]
+        )
+
+    def test_migracion_rellena_el_historial(self):
+        self.vender(3)
+        cancelada = self.vender(1)
+        cancelada.estado = 'cancelada'
+        cancelada.save()
+        self.vender(2)
+        aplicar_eventos()
+        incremental = self.filas()
+        ResumenVentaDiario.objects.all().delete()
+
+        migracion = import_module('reportes.migrations.0006_rellenar_resumen_venta_diario')
+        migracion.rellenar_resumen(apps, mock.Mock(connection=connection))
+        self.assertEqual(self.filas(), incremental)
+        self.assertFalse(EventoResumenVenta.objects.exists())
+
+    def test_reporte_lee_el_resumen(self):
+        self.vender(2)
+        admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('reportes:lista_reportes'))
+        self.assertEqual(response.context['stats']['ventas_hoy'], 1)
+        self.assertEqual(response.context['stats']['ingresos_hoy'], Decimal('12000'))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'LOCK TABLE requiere PostgreSQL')
+class ReconstruirConcurrenteTest(POSTestMixin, TransactionTestCase):
+    """Las ventas no encolan eventos mientras se reconstruye el resumen"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+
+    def encolar(self, venta, errores):
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL lock_timeout = '200ms'")
+                EventoResumenVenta.objects.create(venta=venta, signo=1)
+        except OperationalError as e:
+            errores.append(e)
+        finally:
+            connection.close()
+
+    def test_eventos_esperan_al_bloqueo(self):
+        response = self.post_json('ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(1)})
+        self.assertEqual(response.status_code, 200, response.content)
+        venta = Venta.objects.get()
+        errores = []
+        with transaction.atomic():
+            resumen._bloquear_eventos()
+            hilo = threading.Thread(target=self.encolar, args=(venta, errores))
+            hilo.start()
+            hilo.join()
+        self.assertEqual(len(errores), 1)
+
+
+class EstadisticasDashboardTest(POSTestMixin, TestCase):
+    """Las estadísticas del dashboard usan una cantidad fija de consultas"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+
+    def vender(self):
+        response = self.post_json(
+            'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(2)}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_consultas_no_dependen_de_las_ventas(self):
+        hoy = timezone.localdate()
+        self.vender()
+        _estadisticas_generales.sin_cache(hoy)
+
+        # Eventos pendientes (con su savepoint), totales, hijos, stock, productos y métodos
+        with self.assertNumQueries(8):
+            _estadisticas_generales.sin_cache(hoy)
+
+        for _ in range(5):
+            self.vender()
+        _estadisticas_generales.sin_cache(hoy)
+        with self.assertNumQueries(8):
+            stats = _estadisticas_generales.sin_cache(hoy)['stats']
+        self.assertEqual(stats['ventas_hoy'], 6)
+
+    def test_venta_nueva_invalida_el_cache(self):
+        hoy = timezone.localdate()
+        self.assertEqual(_estadisticas_generales(hoy)['stats']['ventas_hoy'], 0)
+        with self.assertNumQueries(0):
+            _estadisticas_generales(hoy)
+
+        self.vender()
+        self.assertEqual(_estadisticas_generales(hoy)['stats']['ventas_hoy'], 1)
+
+    def test_dashboard_usa_el_dia_local(self):
+        # 22:30 en Asunción: en UTC ya es el día siguiente
+        noche = datetime(2026, 3, 10, 1, 30, tzinfo=datetime_timezone.utc)
+        admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+        with mock.patch('django.utils.timezone.now', return_value=noche):
+            self.vender()
+            self.client.force_login(admin)
+            response = self.client.get(reverse('reportes:lista_reportes'))
+        self.assertEqual(Venta.objects.get().fecha_local, noche.date() - timedelta(days=1))
+        self.assertEqual(response.context['stats']['ventas_hoy'], 1)
+
+
+class ConsumoHijoTest(POSTestMixin, TestCase):
+    """El reporte de consumo no hace consultas por cada hijo"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+        self.admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+
+    def agregar_hijo(self, numero):
+        hijo = PerfilHijo.objects.create(
+            padre=self.padre, nombre_completo=f'Hijo {numero}',
+            numero_tarjeta=f'55550000000001{numero:02d}', tarjeta_activa=True,
+            saldo_virtual=Decimal('1000000'),
+        )
+        self.client.force_login(self.cajero)
+        items = [{'producto_id': producto.id, 'cantidad': i + 1} for i, producto in enumerate(self.productos[:4])]
+        response = self.post_json('ventas:api_procesar_venta_saldo', {'hijo_id': hijo.id, 'items': items})
+        self.assertEqual(response.status_code, 200, response.content)
+        return hijo
+
+    def consultar(self, **parametros):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('reportes:reporte_consumo_hijo'), parametros)
+        self.assertEqual(response.status_code, 200)
+        return response, len(consultas)
+
+    def test_consultas_no_dependen_de_los_hijos(self):
+        self.agregar_hijo(1)
+        _, con_dos = self.consultar()
+        for numero in range(2, 6):
+            self.agregar_hijo(numero)
+        response, con_seis = self.consultar()
+        self.assertEqual(con_dos, con_seis)
+        self.assertEqual(len(response.context['consumo_data']), 6)
+
+    def test_top_3_de_productos_por_hijo(self):
+        hijo = self.agregar_hijo(1)
+        response, _ = self.consultar()
+        fila = next(fila for fila in response.context['consumo_data'] if fila['hijo'] == hijo)
+        self.assertEqual(
+            [(favorito['producto__nombre'], favorito['cantidad_total']) for favorito in fila['productos_favoritos']],
+            [('Producto 3', 4), ('Producto 2', 3), ('Producto 1', 2)]
+        )
+        self.assertEqual((fila['num_compras'], fila['total_gastado']), (1, Decimal('30000')))
+
+    def test_filtro_por_hijo(self):
+        hijo = self.agregar_hijo(1)
+        self.agregar_hijo(2)
+        response, _ = self.consultar(hijo_id=hijo.id)
+        self.assertEqual([fila['hijo'] for fila in response.context['consumo_data']], [hijo])
+        self.assertContains(response, f'<option value="{hijo.id}" selected>', html=False)
+        self.assertEqual(response.context['totales']['total_gastado'], Decimal('30000'))
+
+    def test_paginacion_y_csv(self):
+        for numero in range(1, 4):
+            self.agregar_hijo(numero)
+        with mock.patch('reportes.views.HIJOS_POR_PAGINA', 2):
+            response, _ = self.consultar(page=2)
+            self.assertEqual(len(response.context['consumo_data']), 2)
+            self.assertContains(response, 'Mostrando 3 - 4 de 4 hijos')
+            self.assertContains(response, '?page=1&')
+            self.assertContains(response, 'Hijo 3')
+            self.assertContains(response, 'Producto 3 (4)')
+
+            response, _ = self.consultar(formato='csv')
+        filas = response.content.decode().strip().splitlines()
+        self.assertEqual(len(filas), 5)
+        self.assertIn('Producto 3, Producto 2, Producto 1', filas[1] + filas[2])
+
+
+class SerieVentasTest(POSTestMixin, TestCase):
+
+    def setUp(self):
+        self.crear_datos_pos()
+        self.hoy = timezone.localdate()
+        for _ in range(2):
+            response = self.post_json(
+                'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(2)}
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+
+    def test_serie_diaria_continua(self):
+        serie = serie_ventas(self.hoy - timedelta(days=6), self.hoy, 'dia')
+        self.assertEqual(len(serie), 7)
+        self.assertEqual([punto['ventas'] for punto in serie], [0] * 6 + [2])
+        self.assertEqual((serie[-1]['items'], serie[-1]['ingresos']), (8, Decimal('24000')))
+
+    def test_serie_por_hora_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            serie = serie_ventas(self.hoy, self.hoy, 'hora')
+        self.assertEqual(len(serie), 24)
+        punto = serie[timezone.localtime().hour]
+        self.assertEqual((punto['ventas'], punto['items']), (2, 8))
+
+    def test_rango_largo_se_reduce(self):
+        serie = serie_ventas(self.hoy - timedelta(days=364), self.hoy, 'dia', max_puntos=50)
+        self.assertLessEqual(len(serie), 50)
+        self.assertEqual(sum(punto['ventas'] for punto in serie), 2)
+        self.assertEqual(serie[-1]['fin'], self.hoy + timedelta(days=1))
+
+    def test_serie_mensual(self):
+        serie = serie_ventas(self.hoy - timedelta(days=364), self.hoy, 'mes')
+        self.assertEqual(serie[-1]['inicio'], self.hoy.replace(day=1))
+        self.assertEqual(serie[-1]['ventas'], 2)
+
+    def test_api(self):
+        url = reverse('reportes:serie_ventas')
+        self.assertEqual(self.client.get(url, {'intervalo': 'anio'}).status_code, 400)
+        admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+        self.client.force_login(admin)
+        datos = self.client.get(url, {'intervalo': 'semana'}).json()
+        self.assertEqual(sum(punto['ventas'] for punto in datos['serie']), 2)
+
+    def test_api_limita_el_rango(self):
+        url = reverse('reportes:serie_ventas')
+        admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+        self.client.force_login(admin)
+        mes = {'desde': str(self.hoy - timedelta(days=30)), 'hasta': str(self.hoy), 'intervalo': 'hora'}
+        self.assertEqual(self.client.get(url, mes).status_code, 200)
+        anio = dict(mes, desde=str(self.hoy - timedelta(days=365)))
+        self.assertEqual(self.client.get(url, anio).status_code, 400)
+        self.assertEqual(self.client.get(url, dict(anio, intervalo='dia')).status_code, 200)
+        self.assertEqual(self.client.get(url, dict(mes, desde=mes['hasta'], hasta=mes['desde'])).status_code, 400)
+
+
+class ExportacionTest(POSTestMixin, TestCase):
+
+    def setUp(self):
+        self.crear_datos_pos()
+        for _ in range(2):
+            response = self.post_json(
+                'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(3)}
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+        self.admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+
+    def exportar(self, nombre, **parametros):
+        return self.client.get(reverse('reportes:exportar_datos', args=[nombre]), parametros)
+
+    def test_solo_administradores(self):
+        self.assertEqual(self.exportar('ventas').status_code, 403)
+
+    def test_csv_en_streaming(self):
+        self.client.force_login(self.admin)
+        response = self.exportar('detalles')
+        self.assertTrue(response.streaming)
+        lineas = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lineas[0].split(',')[:2], ['Venta', 'Día'])
+        self.assertEqual(len(lineas), 1 + 6)
+
+    def test_xlsx(self):
+        self.client.force_login(self.admin)
+        response = self.exportar('transacciones', formato='xlsx')
+        libro = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        filas = list(libro.active.values)
+        self.assertEqual(len(filas), 1 + 2)
+        self.assertEqual(filas[1][2], 'Juan Pérez')
+
+    def test_xlsx_continua_en_otra_hoja(self):
+        self.client.force_login(self.admin)
+        with mock.patch('reportes.exportacion.FILAS_POR_HOJA', 4):
+            response = self.exportar('detalles', formato='xlsx')
+            contenido = b''.join(response.streaming_content)
+        libro = load_workbook(io.BytesIO(contenido), read_only=True)
+        self.assertEqual(libro.sheetnames, ['Detalle de ventas', 'Detalle de ventas (2)'])
+        hojas = [list(hoja.values) for hoja in libro.worksheets]
+        self.assertEqual([len(filas) for filas in hojas], [1 + 4, 1 + 2])
+        self.assertEqual(hojas[1][0], hojas[0][0])
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            salida = os.path.join(directorio, 'ventas.xlsx')
+            call_command('exportar_datos', 'ventas', formato='xlsx', salida=salida, stdout=io.StringIO())
+            filas = list(load_workbook(salida, read_only=True).active.values)
+        self.assertEqual(len(filas), 1 + 2)
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+)
+class TrabajosReporteTest(POSTestMixin, TestCase):
+
+    def setUp(self):
+        self.crear_datos_pos()
+        self.admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+        response = self.post_json(
+            'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(3)}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.hoy = timezone.localdate()
+
+    def test_genera_reportes_y_envia_un_lote_de_emails(self):
+        trabajos.encolar('productos_mas_vendidos', self.hoy, self.hoy, destinatarios='a@tita.com')
+        trabajos.encolar('consumo_estudiante', self.hoy, self.hoy, destinatarios='b@tita.com, c@tita.com')
+
+        with mock.patch('reportes.trabajos.get_connection', wraps=trabajos.get_connection) as conexion:
+            self.assertEqual(trabajos.procesar_pendientes(), 2)
+        conexion.assert_called_once()
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(len(mail.outbox[1].attachments), 2)
+        reporte = ReporteProductosMasVendidos.objects.get()
+        self.assertEqual(reporte.detalles_productos.count(), 3)
+        self.assertTrue(reporte.archivo_excel.name.endswith('.xlsx'))
+        consumo = ReporteConsumoEstudiante.objects.get()
+        self.assertEqual((consumo.estudiante, consumo.total_compras), (self.hijo, Decimal('18000')))
+        self.assertEqual(consumo.generado_por, self.admin)
+        self.assertEqual(set(TrabajoReporte.objects.values_list('estado', flat=True)), {'completado'})
+
+    def test_programa_configuraciones_vencidas(self):
+        ConfiguracionReporte.objects.create(
+            tipo_reporte='ingresos_metodo_pago', frecuencia='semanal',
+            hora_generacion='00:00', destinatarios='admin@tita.com'
+        )
+        self.assertEqual(trabajos.programar_vencidos(), 1)
+        # Ya generado: no vuelve a programarse hasta la semana siguiente
+        self.assertEqual(trabajos.programar_vencidos(), 0)
+
+        trabajo = TrabajoReporte.objects.get()
+        self.assertEqual((trabajo.fecha_inicio, trabajo.fecha_fin), (self.hoy - timedelta(days=7), self.hoy - timedelta(days=1)))
+
+    def test_tipo_sin_generador_queda_en_error(self):
+        trabajos.encolar('stock_productos', self.hoy, self.hoy)
+        trabajos.procesar_pendientes()
+        trabajo = TrabajoReporte.objects.get()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('error', 1))
+
+    def test_pedido_desde_la_configuracion(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('reportes:configuracion_reportes'), {
+            'tipo_reporte': 'ingresos_metodo_pago', 'fecha_inicio': str(self.hoy), 'fecha_fin': str(self.hoy)
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(TrabajoReporte.objects.get().solicitado_por, self.admin)
+        self.assertEqual(self.client.get(reverse('reportes:configuracion_reportes')).status_code, 200)
+
+
+class ReportesGuardadosTest(POSTestMixin, TestCase):
+    """Los períodos cerrados se sirven desde los reportes guardados"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+        self.admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+        self.fin = timezone.localdate().replace(day=1) - timedelta(days=1)
+        self.inicio = self.fin.replace(day=1)
+        self.vender_mes_pasado()
+
+    def vender_mes_pasado(self):
+        self.client.force_login(self.cajero)
+        response = self.post_json(
+            'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(2)}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        Venta.objects.update(fecha_local=self.fin)
+        PagoVenta.objects.update(fecha_local=self.fin)
+        reconstruir()
+
+    def consultar(self, nombre, **parametros):
+        self.client.force_login(self.admin)
+        parametros.setdefault('fecha_desde', str(self.inicio))
+        parametros.setdefault('fecha_hasta', str(self.fin))
+        response = self.client.get(reverse(f'reportes:{nombre}'), parametros)
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_mes_cerrado_se_calcula_una_sola_vez(self):
+        context = self.consultar('reporte_productos_mas_vendidos')
+        self.assertEqual([p['cantidad_vendida'] for p in context['productos_vendidos']], [2, 2])
+        self.assertEqual(context['categorias_analysis'][0]['total_ingresos'], Decimal('12000'))
+        context = self.consultar('reporte_ingresos_metodo_pago')
+        self.assertEqual(context['metodos_analysis'][0]['total_monto'], Decimal('12000'))
+        context = self.consultar('reporte_consumo_hijo')
+        self.assertEqual(context['consumo_data'][0]['total_gastado'], Decimal('12000'))
+
+        # Las ventas nuevas del período cerrado no cambian lo guardado
+        self.vender_mes_pasado()
+        context = self.consultar('reporte_productos_mas_vendidos')
+        self.assertEqual([p['cantidad_vendida'] for p in context['productos_vendidos']], [2, 2])
+        context = self.consultar('reporte_consumo_hijo')
+        self.assertEqual(context['consumo_data'][0]['num_compras'], 1)
+        self.assertEqual(ReporteProductosMasVendidos.objects.count(), 1)
+        self.assertEqual(ReporteIngresosPorMetodo.objects.count(), 1)
+
+    def test_ignora_reportes_guardados_antes_del_cierre(self):
+        # Reporte programado que corrió el último día del período
+        generadores.productos_mas_vendidos(self.inicio, self.fin, self.admin)
+        ReporteProductosMasVendidos.objects.update(
+            fecha_generacion=timezone.make_aware(datetime.combine(self.fin, datetime.min.time()))
+        )
+        self.vender_mes_pasado()
+
+        context = self.consultar('reporte_productos_mas_vendidos')
+        self.assertEqual([p['cantidad_vendida'] for p in context['productos_vendidos']], [4, 4])
+        self.assertEqual(ReporteProductosMasVendidos.objects.count(), 2)
+
+    def test_periodo_vacio_se_genera_una_sola_vez(self):
+        fin = self.inicio - timedelta(days=1)
+        parametros = {'fecha_desde': str(fin.replace(day=1)), 'fecha_hasta': str(fin)}
+        context = self.consultar('reporte_consumo_hijo', **parametros)
+        self.assertEqual(context['consumo_data'][0]['total_gastado'], 0)
+
+        generar = mock.Mock()
+        with mock.patch.dict(generadores.GENERADORES, consumo_estudiante=generar):
+            self.consultar('reporte_consumo_hijo', **parametros)
+        generar.assert_not_called()
+        self.assertEqual(CierreReporte.objects.filter(tipo_reporte='consumo_estudiante').count(), 1)
+        self.assertFalse(ReporteConsumoEstudiante.objects.exists())
+
+    def test_solo_meses_y_anios_completos(self):
+        self.assertTrue(periodo_cerrado(self.inicio, self.fin))
+        self.assertTrue(periodo_cerrado(date(2020, 1, 1), date(2020, 12, 31)))
+        self.assertFalse(periodo_cerrado(date(2020, 1, 1), date(2020, 3, 31)))
+        self.assertFalse(periodo_cerrado(date(2020, 1, 2), date(2020, 1, 31)))
+        self.assertFalse(periodo_cerrado(date(2020, 12, 1), date(2021, 1, 31)))
+
+        # Cualquier otro rango se calcula en vivo y no guarda nada
+        context = self.consultar('reporte_consumo_hijo', fecha_desde=str(self.inicio + timedelta(days=-3)))
+        self.assertEqual(context['consumo_data'][0]['total_gastado'], Decimal('12000'))
+        self.assertFalse(CierreReporte.objects.exists())
+        self.assertFalse(ReporteConsumoEstudiante.objects.exists())
+
+    def test_periodo_abierto_se_calcula_en_vivo(self):
+        context = self.consultar('reporte_productos_mas_vendidos', fecha_hasta=str(timezone.localdate()))
+        self.assertEqual([p['cantidad_vendida'] for p in context['productos_vendidos']], [2, 2])
+        self.assertFalse(ReporteProductosMasVendidos.objects.exists())
+
+
+class ComisionesTest(POSTestMixin, TestCase):
+    """Comisiones agrupadas en una consulta, comparadas con el período anterior"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+        self.admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+        MetodoPago.objects.filter(codigo='saldo_virtual').update(tiene_comision=True, porcentaje_comision=Decimal('10'))
+        self.hoy = timezone.localdate()
+        self.vender()
+        PagoVenta.objects.update(fecha_local=self.hoy - timedelta(days=1))
+        self.vender()
+        self.vender()
+
+    def vender(self):
+        response = self.post_json(
+            'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(2)}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_una_consulta_con_el_periodo_anterior(self):
+        with self.assertNumQueries(1):
+            resultado = comisiones(self.hoy, self.hoy, 'metodo')
+        fila, = resultado['filas']
+        self.assertEqual(fila['grupo'], 'Saldo Virtual')
+        self.assertEqual((fila['pagos'], fila['monto'], fila['comision']), (2, Decimal('24000'), Decimal('2400')))
+        self.assertEqual((fila['neto'], fila['comision_anterior'], fila['variacion']), (Decimal('21600'), Decimal('1200'), 100))
+
+        resultado = comisiones(self.hoy, self.hoy, 'cajero')
+        self.assertEqual([fila['grupo'] for fila in resultado['filas']], ['cajero'])
+
+    def test_por_dia_compara_el_dia_en_la_misma_posicion(self):
+        ayer = self.hoy - timedelta(days=1)
+        # Hace tres días: primer día del período anterior a [ayer, hoy]
+        PagoVenta.objects.filter(pk=PagoVenta.objects.order_by('id').last().pk).update(
+            fecha_local=self.hoy - timedelta(days=3)
+        )
+        with self.assertNumQueries(1):
+            resultado = comisiones(ayer, self.hoy, 'dia')
+        self.assertEqual([fila['grupo'] for fila in resultado['filas']], [ayer, self.hoy])
+        primero, segundo = resultado['filas']
+        self.assertEqual((primero['comision'], primero['comision_anterior']), (Decimal('1200'), Decimal('1200')))
+        self.assertEqual((segundo['comision'], segundo['comision_anterior']), (Decimal('1200'), CERO))
+        self.assertEqual(resultado['totales']['comision_anterior'], Decimal('1200'))
+
+    def test_cierre_de_periodo_cerrado_en_cache(self):
+        ayer = self.hoy - timedelta(days=1)
+        comisiones_cerradas(ayer, ayer, 'dia')
+        with self.assertNumQueries(0):
+            resultado = comisiones_cerradas(ayer, ayer, 'dia')
+        self.assertEqual(resultado['totales']['comision'], Decimal('1200'))
+
+    def test_exportar_xlsx(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('reportes:reporte_comisiones'), {
+            'fecha_desde': str(self.hoy), 'fecha_hasta': str(self.hoy), 'agrupar': 'punto_venta', 'formato': 'xlsx'
+        })
+        self.assertEqual(response.status_code, 200)
+        hoja = load_workbook(io.BytesIO(response.content)).active
+        filas = list(hoja.values)
+        self.assertEqual(filas[0][0], 'Punto de venta')
+        self.assertEqual((filas[1][0], filas[-1][0], filas[-1][3]), ('CAJA1', 'Total', 2400))
+
+        response = self.client.get(reverse('reportes:reporte_comisiones'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['fecha_desde'], str(self.hoy.replace(day=1)))
+
+
+class MargenesTest(POSTestMixin, TestCase):
+    """El margen usa el costo guardado en cada venta, no el costo actual"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+        self.admin = Usuario.objects.create_user(username='admin', tipo_usuario='administrador')
+        response = self.post_json(
+            'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(2)}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.hoy = timezone.localdate()
+
+    def test_margen_con_el_costo_de_la_venta(self):
+        Producto.objects.update(precio_costo=Decimal('2900'))
+        with self.assertNumQueries(1):
+            filas = margenes(self.hoy, self.hoy, 'categoria')
+        fila, = filas
+        self.assertEqual(fila['producto__categoria__nombre'], 'Snacks')
+        self.assertEqual((fila['unidades'], fila['ingresos'], fila['costo']), (4, Decimal('12000'), Decimal('8000')))
+        self.assertEqual((fila['ganancia'], fila['margen']), (Decimal('4000'), Decimal('33.33')))
+
+    def test_detalles_sin_costo_no_entran_en_el_margen(self):
+        DetalleVenta.objects.filter(producto=self.productos[0]).update(costo_unitario=None)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('reportes:reporte_margenes'), {'agrupar': 'mes'})
+        self.assertEqual(response.status_code, 200)
+        totales = response.context['totales']
+        self.assertEqual((totales['sin_costo'], totales['ingresos'], totales['ganancia']), (1, Decimal('6000'), Decimal('2000')))
+        self.assertEqual(response.context['filas'][0]['grupo'], self.hoy.strftime('%m/%Y'))
+
+
+class MapaCalorTest(POSTestMixin, TestCase):
+    """Ventas por día de la semana y franja de 15 minutos en hora local"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+        hoy = timezone.localdate()
+        self.lunes = hoy - timedelta(days=hoy.weekday() + 7)
+        for hora, minuto in [(10, 20), (10, 29), (10, 31)]:
+            response = self.post_json(
+                'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(1)}
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+            Venta.objects.filter(pk=response.json()['venta_id']).update(
+                fecha_venta=timezone.make_aware(datetime.combine(self.lunes, datetime.min.time()).replace(hour=hora, minute=minuto)),
+                fecha_local=self.lunes,
+            )
+
+    def test_franjas_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            filas = ventas_por_franja(self.lunes, self.lunes + timedelta(days=6))
+        self.assertEqual(
+            [(fila['dia'], fila['franja'], fila['ventas']) for fila in filas],
+            [(1, 41, 2), (1, 42, 1)]
+        )
+
+        mapa = mapa_calor(filas)
+        self.assertEqual(mapa['franjas'], ['10:15', '10:30'])
+        lunes = mapa['dias'][0]['celdas']
+        self.assertEqual([(celda['ventas'], celda['nivel']) for celda in lunes], [(2, 4), (1, 2)])
+        self.assertEqual(lunes[0]['ingresos'], Decimal('12000'))
+        self.assertEqual(mapa['puntos_venta'], ['CAJA1'])
+        self.assertEqual(mapa_calor(filas, 'CAJA2')['franjas'], [])
+
+    def test_semana_cerrada_en_cache(self):
+        ventas_semanas(self.lunes, 1)
+        with self.assertNumQueries(0):
+            filas = ventas_semanas(self.lunes, 1)
+        self.assertEqual(sum(fila['ventas'] for fila in filas), 3)
+
+    def test_api_y_reporte(self):
+        datos = self.client.get(reverse('reportes:mapa_calor'), {'hasta': str(self.lunes), 'semanas': 2}).json()
+        self.assertEqual(datos['dias'][0]['ventas'], [2, 1])
+        self.assertEqual(datos['dias'][1]['ventas'], [0, 0])
+        response = self.client.get(reverse('reportes:reporte_mapa_calor'), {'semanas': 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['semanas'], 4)
@@ -0,0 +1,275 @@
+"""
+Generación de reportes en segundo plano
+
+Los reportes pesados no se calculan durante un pedido web: se encolan como
+``TrabajoReporte`` en la base y los procesa el comando ``procesar_reportes``,
+que corre aparte (p. ej. como servicio de systemd o en un contenedor propio):
+
+1. ``programar_vencidos()`` crea un trabajo por cada ConfiguracionReporte
+   activa cuya hora de generación llegó (diaria, semanal o mensual).
+2. ``procesar_pendientes()`` toma los trabajos pendientes uno por uno
+   (``select_for_update(skip_locked=True)``, así que pueden correr varios
+   procesos), guarda el reporte con su generador (ver generadores.py),
+   escribe el Excel y el PDF y, al final, envía todos los emails del lote
+   por una sola conexión SMTP.
+
+Un trabajo que falla se reintenta más tarde hasta ``MAXIMO_INTENTOS`` veces.
+"""
+import logging
+import re
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from openpyxl import Workbook
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+from usuarios.models import Usuario
+from .generadores import GENERADORES
+from .models import ConfiguracionReporte, TrabajoReporte
+
+logger = logging.getLogger(__name__)
+
+MAXIMO_INTENTOS = 3
+
+# Minutos de espera antes de reintentar, multiplicados por el número de intento
+ESPERA_REINTENTO = 5
+
+# Un trabajo en proceso por más tiempo se considera abandonado (el proceso murió)
+LIMITE_EN_PROCESO = timedelta(hours=1)
+
+MIME_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class ReporteNoDisponible(Exception):
+    """El trabajo no puede generarse y no tiene sentido reintentarlo"""
+    pass
+
+
+def _sumar_mes(fecha):
+    if fecha.month == 12:
+        return fecha.replace(year=fecha.year + 1, month=1, day=1)
+    return fecha.replace(month=fecha.month + 1, day=1)
+
+
+def periodo(frecuencia, dia):
+    """Período que cubre un reporte generado el ``dia``: el día, la semana o el mes anteriores"""
+    ayer = dia - timedelta(days=1)
+    if frecuencia == 'diario':
+        return ayer, ayer
+    if frecuencia == 'semanal':
+        return dia - timedelta(days=7), ayer
+    fin = dia.replace(day=1) - timedelta(days=1)
+    return fin.replace(day=1), fin
+
+
+def proxima_ejecucion(configuracion):
+    """Fecha y hora local en que corresponde generar la configuración"""
+    if configuracion.fecha_ultimo_reporte is None:
+        dia = timezone.localdate()
+    else:
+        ultima = timezone.localdate(configuracion.fecha_ultimo_reporte)
+        if configuracion.frecuencia == 'diario':
+            dia = ultima + timedelta(days=1)
+        elif configuracion.frecuencia == 'semanal':
+            dia = ultima + timedelta(days=7)
+        else:
+            dia = _sumar_mes(ultima)
+    return timezone.make_aware(datetime.combine(dia, configuracion.hora_generacion))
+
+
+def encolar(tipo_reporte, fecha_inicio, fecha_fin, solicitado_por=None, destinatarios='', configuracion=None):
+    """Crea un trabajo pendiente para generar el reporte lo antes posible"""
+    return TrabajoReporte.objects.create(
+        tipo_reporte=tipo_reporte,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        solicitado_por=solicitado_por,
+        destinatarios=destinatarios,
+        configuracion=configuracion,
+    )
+
+
+def programar_vencidos(ahora=None):
+    """Encola las configuraciones activas cuya hora llegó. Retorna cuántas se encolaron."""
+    ahora = ahora or timezone.now()
+    encolados = 0
+    with transaction.atomic():
+        configuraciones = ConfiguracionReporte.objects.filter(activo=True).select_for_update(skip_locked=True)
+        for configuracion in configuraciones:
+            if proxima_ejecucion(configuracion) > ahora:
+                continue
+            inicio, fin = periodo(configuracion.frecuencia, timezone.localdate(ahora))
+            encolar(
+                configuracion.tipo_reporte, inicio, fin,
+                destinatarios=configuracion.destinatarios, configuracion=configuracion
+            )
+            configuracion.fecha_ultimo_reporte = ahora
+            configuracion.save(update_fields=['fecha_ultimo_reporte'])
+            encolados += 1
+    return encolados
+
+
+def rescatar_abandonados():
+    """Vuelve a pendientes los trabajos de un proceso que murió a mitad de camino"""
+    return TrabajoReporte.objects.filter(
+        estado='en_proceso',
+        fecha_inicio_proceso__lt=timezone.now() - LIMITE_EN_PROCESO
+    ).update(estado='pendiente')
+
+
+def tomar_trabajo():
+    """Marca como en proceso el próximo trabajo pendiente (o retorna None)"""
+    with transaction.atomic():
+        trabajo = TrabajoReporte.objects.select_for_update(skip_locked=True).filter(
+            estado='pendiente',
+            programado_para__lte=timezone.now()
+        ).order_by('programado_para', 'id').first()
+        if trabajo is None:
+            return None
+        trabajo.estado = 'en_proceso'
+        trabajo.intentos += 1
+        trabajo.fecha_inicio_proceso = timezone.now()
+        trabajo.save(update_fields=['estado', 'intentos', 'fecha_inicio_proceso'])
+    return trabajo
+
+
+def _usuario_sistema():
+    usuario = Usuario.objects.filter(tipo_usuario='administrador', is_active=True).order_by('id').first()
+    if usuario is None:
+        raise ReporteNoDisponible('No hay un administrador activo al que atribuir el reporte')
+    return usuario
+
+
+def _excel(tabla):
+    libro = Workbook(write_only=True)
+    # Excel no admite []:*?/\ en el nombre de la hoja (máximo 31 caracteres)
+    hoja = libro.create_sheet(re.sub(r'[\[\]:*?/\\]', '-', tabla['titulo'])[:31])
+    hoja.append(tabla['encabezados'])
+    for fila in tabla['filas']:
+        hoja.append(fila)
+    buffer = BytesIO()
+    libro.save(buffer)
+    return buffer.getvalue()
+
+
+def _pdf(tabla):
+    buffer = BytesIO()
+    documento = SimpleDocTemplate(buffer, pagesize=landscape(A4))
+    estilos = getSampleStyleSheet()
+    datos = [tabla['encabezados']] + [['' if valor is None else str(valor) for valor in fila] for fila in tabla['filas']]
+    contenido = Table(datos, repeatRows=1)
+    contenido.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ]))
+    documento.build([Paragraph(tabla['titulo'], estilos['Title']), Spacer(1, 12), contenido])
+    return buffer.getvalue()
+
+
+def _guardar_archivos(trabajo, tabla):
+    """Escribe el Excel y el PDF, los adjunta al trabajo y a los reportes. Retorna los adjuntos."""
+    base = f'{trabajo.tipo_reporte}_{trabajo.fecha_inicio:%Y%m%d}_{trabajo.fecha_fin:%Y%m%d}_{trabajo.pk}'
+    adjuntos = [(f'{base}.xlsx', _excel(tabla), MIME_EXCEL)]
+    trabajo.archivo_excel.save(adjuntos[0][0], ContentFile(adjuntos[0][1]), save=False)
+    if REPORTLAB_AVAILABLE:
+        adjuntos.append((f'{base}.pdf', _pdf(tabla), 'application/pdf'))
+        trabajo.archivo_pdf.save(adjuntos[1][0], ContentFile(adjuntos[1][1]), save=False)
+
+    # Los reportes del lote comparten los archivos (un UPDATE por tipo de reporte)
+    reportes = tabla['reportes']
+    if reportes:
+        type(reportes[0]).objects.filter(pk__in=[reporte.pk for reporte in reportes]).update(
+            archivo_excel=trabajo.archivo_excel.name,
+            archivo_pdf=trabajo.archivo_pdf.name or None,
+        )
+    return adjuntos
+
+
+def _mensaje(trabajo, titulo, adjuntos):
+    destinatarios = [email.strip() for email in trabajo.destinatarios.split(',') if email.strip()]
+    if not destinatarios:
+        return None
+    mensaje = EmailMessage(
+        subject=f'[Cantina Tita] {titulo}',
+        body=f'Se adjunta el reporte "{titulo}" generado el {timezone.localtime():%d/%m/%Y %H:%M}.',
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=destinatarios,
+    )
+    for nombre, contenido, tipo in adjuntos:
+        mensaje.attach(nombre, contenido, tipo)
+    return mensaje
+
+
+def ejecutar(trabajo):
+    """
+    Genera el reporte de un trabajo tomado con ``tomar_trabajo``.
+    Retorna el email a enviar (o None si no hay destinatarios o falló).
+    """
+    try:
+        generador = GENERADORES.get(trabajo.tipo_reporte)
+        if generador is None:
+            raise ReporteNoDisponible(f'El reporte "{trabajo.get_tipo_reporte_display()}" no se genera automáticamente')
+        usuario = trabajo.solicitado_por or _usuario_sistema()
+
+        with transaction.atomic():
+            tabla = generador(trabajo.fecha_inicio, trabajo.fecha_fin, usuario)
+            adjuntos = _guardar_archivos(trabajo, tabla)
+            trabajo.estado = 'completado'
+            trabajo.error = ''
+            trabajo.fecha_fin_proceso = timezone.now()
+            trabajo.save()
+    except Exception as error:
+        logger.exception('Error generando el trabajo de reporte %s', trabajo.pk)
+        definitivo = isinstance(error, ReporteNoDisponible) or trabajo.intentos >= MAXIMO_INTENTOS
+        trabajo.estado = 'error' if definitivo else 'pendiente'
+        trabajo.programado_para = timezone.now() + timedelta(minutes=ESPERA_REINTENTO * trabajo.intentos)
+        trabajo.error = str(error)
+        trabajo.save(update_fields=['estado', 'programado_para', 'error'])
+        return None
+
+    return _mensaje(trabajo, tabla['titulo'], adjuntos)
+
+
+def enviar(mensajes):
+    """Envía los emails del lote por una sola conexión SMTP. Retorna cuántos se enviaron."""
+    if not mensajes:
+        return 0
+    try:
+        with get_connection() as conexion:
+            return conexion.send_messages(mensajes)
+    except Exception:
+        logger.exception('Error enviando %s emails de reportes', len(mensajes))
+        return 0
+
+
+def procesar_pendientes():
+    """Procesa todos los trabajos pendientes y envía sus emails. Retorna cuántos procesó."""
+    rescatar_abandonados()
+    mensajes = []
+    procesados = 0
+    while True:
+        trabajo = tomar_trabajo()
+        if trabajo is None:
+            break
+        mensaje = ejecutar(trabajo)
+        if mensaje is not None:
+            mensajes.append(mensaje)
+        procesados += 1
+    enviar(mensajes)
+    return procesados
@@ -8,8 +8,15 @@ urlpatterns = [
     path('consumo-hijo/', views.reporte_consumo_hijo, name='reporte_consumo_hijo'),
     path('productos-vendidos/', views.reporte_productos_mas_vendidos, name='reporte_productos_mas_vendidos'),
     path('ingresos-metodo-pago/', views.reporte_ingresos_metodo_pago, name='reporte_ingresos_metodo_pago'),
+    path('comisiones/', views.reporte_comisiones, name='reporte_comisiones'),
+    path('margenes/', views.reporte_margenes, name='reporte_margenes'),
+    path('mapa-calor/', views.reporte_mapa_calor, name='reporte_mapa_calor'),
     path('ventas-diarias/', views.reporte_ventas_diarias, name='reporte_ventas_diarias'),
     path('stock-productos/', views.reporte_stock_productos, name='reporte_stock_productos'),
     path('alertas-stock/', views.alertas_stock, name='alertas_stock'),
     path('configuracion/', views.configuracion_reportes, name='configuracion_reportes'),
+    path('api/serie-ventas/', views.serie_ventas_api, name='serie_ventas'),
+    path('api/mapa-calor/', views.mapa_calor_api, name='mapa_calor'),
+    path('exportar/<str:nombre>/', views.exportar_datos, name='exportar_datos'),
+    path('estadisticas-cache/', views.estadisticas_cache, name='estadisticas_cache'),
 ]
\ No newline at end of file
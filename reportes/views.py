@@ -1,88 +1,249 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.db.models import Sum, Count, Avg, Q, F, Case, When
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.db.models import Sum, Count, Avg, Q, F, Case, When, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+import csv
 import json
+from io import BytesIO
+from openpyxl import Workbook
 
 from ventas.models import Venta, DetalleVenta, MetodoPago, PagoVenta
 from productos.models import Producto, Categoria
 from usuarios.models import PerfilHijo, TransaccionTarjeta, RecargaSaldo
+from cantina_tita.cache import cacheado, estadisticas
+from .resumen import resumen_ventas, totales_diarios, por_producto, por_metodo_pago
+from .series import serie_ventas, INTERVALOS, MAX_DIAS
+from .exportacion import EXPORTACIONES, iterar_csv, iterar_xlsx
+from .generadores import GENERADORES
+from .models import ReporteBase, ConfiguracionReporte, TrabajoReporte
+from .trabajos import encolar
+from .cierres import periodo_cerrado, reportes_guardados
+from .comisiones import AGRUPACIONES, comisiones, comisiones_cerradas, tabla as tabla_comisiones
+from . import margenes
+from .mapa_calor import ventas_semanas, mapa_calor, FRANJA_MINUTOS
 
-@login_required
-def lista_reportes(request):
-    """Dashboard de reportes con estadísticas generales"""
-    # Verificar permisos
-    if request.user.tipo_usuario not in ['administrador', 'cajero']:
-        messages.error(request, 'No tienes permisos para ver los reportes')
-        return redirect('usuarios:dashboard')
-    
-    hoy = timezone.now().date()
+# Puntos por defecto de las series para gráficos
+MAX_PUNTOS_GRAFICO = 120
+
+# Segundos que se conservan las estadísticas del dashboard (además se
+# invalidan con cada venta nueva)
+DURACION_ESTADISTICAS = 60
+
+@cacheado(
+    'reportes.lista_reportes',
+    ['ventas.Venta', 'productos.Producto', 'usuarios.PerfilHijo'],
+    timeout=DURACION_ESTADISTICAS
+)
+def _estadisticas_generales(hoy):
+    """
+    Estadísticas del dashboard de reportes (se recalculan al cambiar ventas,
+    productos o hijos). Cada tabla se recorre una sola vez: los períodos son
+    agregados filtrados sobre rangos semiabiertos [desde, mañana).
+    """
+    manana = hoy + timedelta(days=1)
     hace_7_dias = hoy - timedelta(days=7)
     hace_30_dias = hoy - timedelta(days=30)
     
+    # Ventas: del resumen diario, no de la tabla de ventas
+    filas = resumen_ventas(hace_30_dias, hoy)
+    totales = totales_diarios(filas).aggregate(
+        ventas_hoy=Sum('cantidad', filter=Q(fecha__gte=hoy, fecha__lt=manana)),
+        ingresos_hoy=Sum('monto', filter=Q(fecha__gte=hoy, fecha__lt=manana)),
+        ventas_semana=Sum('cantidad', filter=Q(fecha__gte=hace_7_dias, fecha__lt=manana)),
+        ingresos_semana=Sum('monto', filter=Q(fecha__gte=hace_7_dias, fecha__lt=manana)),
+        ventas_mes=Sum('cantidad', filter=Q(fecha__gte=hace_30_dias, fecha__lt=manana)),
+        ingresos_mes=Sum('monto', filter=Q(fecha__gte=hace_30_dias, fecha__lt=manana)),
+    )
+    hijos = PerfilHijo.objects.filter(activo=True).aggregate(
+        activos=Count('id', filter=Q(tarjeta_activa=True)),
+        saldo_total=Sum('saldo_virtual'),
+    )
+    
     # Estadísticas generales
     stats = {
-        'ventas_hoy': Venta.objects.filter(fecha_venta__date=hoy, estado='pagada').count(),
-        'ingresos_hoy': Venta.objects.filter(fecha_venta__date=hoy, estado='pagada').aggregate(
-            total=Sum('total')
-        )['total'] or Decimal('0.00'),
+        'ventas_hoy': totales['ventas_hoy'] or 0,
+        'ingresos_hoy': totales['ingresos_hoy'] or Decimal('0.00'),
         
-        'ventas_semana': Venta.objects.filter(fecha_venta__date__gte=hace_7_dias, estado='pagada').count(),
-        'ingresos_semana': Venta.objects.filter(fecha_venta__date__gte=hace_7_dias, estado='pagada').aggregate(
-            total=Sum('total')
-        )['total'] or Decimal('0.00'),
+        'ventas_semana': totales['ventas_semana'] or 0,
+        'ingresos_semana': totales['ingresos_semana'] or Decimal('0.00'),
         
-        'ventas_mes': Venta.objects.filter(fecha_venta__date__gte=hace_30_dias, estado='pagada').count(),
-        'ingresos_mes': Venta.objects.filter(fecha_venta__date__gte=hace_30_dias, estado='pagada').aggregate(
-            total=Sum('total')
-        )['total'] or Decimal('0.00'),
+        'ventas_mes': totales['ventas_mes'] or 0,
+        'ingresos_mes': totales['ingresos_mes'] or Decimal('0.00'),
         
-        'hijos_activos': PerfilHijo.objects.filter(activo=True, tarjeta_activa=True).count(),
+        'hijos_activos': hijos['activos'],
         'productos_stock_bajo': Producto.objects.filter(stock_actual__lte=F('stock_minimo'), disponible=True).count(),
-        'saldo_total_tarjetas': PerfilHijo.objects.filter(activo=True).aggregate(
-            total=Sum('saldo_virtual')
-        )['total'] or Decimal('0.00'),
+        'saldo_total_tarjetas': hijos['saldo_total'] or Decimal('0.00'),
     }
     
     # Productos más vendidos (últimos 30 días)
-    productos_top = DetalleVenta.objects.filter(
-        venta__fecha_venta__date__gte=hace_30_dias,
-        venta__estado='pagada'
-    ).values(
+    productos_top = por_producto(filas).values(
         'producto__nombre',
         'producto__categoria__nombre'
     ).annotate(
-        total_vendido=Sum('cantidad'),
-        ingresos=Sum(F('cantidad') * F('precio_unitario'))
+        total_vendido=Sum('unidades'),
+        ingresos=Sum('monto')
     ).order_by('-total_vendido')[:5]
     
     # Métodos de pago más usados
-    metodos_pago = PagoVenta.objects.filter(
-        venta__fecha_venta__date__gte=hace_30_dias,
-        venta__estado='pagada'
-    ).values(
+    metodos_pago = por_metodo_pago(filas).values(
         'metodo_pago__nombre'
     ).annotate(
-        total_transacciones=Count('id'),
+        total_transacciones=Sum('cantidad'),
         total_monto=Sum('monto')
     ).order_by('-total_transacciones')
     
+    return {
+        'stats': stats,
+        'productos_top': list(productos_top),
+        'metodos_pago': list(metodos_pago),
+    }
+
+@login_required
+def lista_reportes(request):
+    """Dashboard de reportes con estadísticas generales"""
+    # Verificar permisos
+    if request.user.tipo_usuario not in ['administrador', 'cajero']:
+        messages.error(request, 'No tienes permisos para ver los reportes')
+        return redirect('usuarios:dashboard')
+    
     context = {
         'titulo': 'Dashboard de Reportes',
-        'stats': stats,
-        'productos_top': productos_top,
-        'metodos_pago': metodos_pago,
+        **_estadisticas_generales(timezone.localdate()),
     }
     
     return render(request, 'reportes/lista_reportes.html', context)
 
+# Hijos por página del reporte de consumo (y por lote en la exportación CSV)
+HIJOS_POR_PAGINA = 50
+
+def _consumo_guardado(ids, guardados):
+    """Gasto y producto favorito de cada hijo desde los reportes guardados del período"""
+    gastos = {}
+    favoritos = {}
+    for reporte in guardados.filter(estudiante_id__in=ids):
+        # Del más reciente al más antiguo: vale el primero de cada hijo
+        if reporte.estudiante_id in gastos:
+            continue
+        gastos[reporte.estudiante_id] = {
+            'total_gastado': reporte.total_compras,
+            'num_compras': reporte.cantidad_transacciones,
+        }
+        if reporte.producto_mas_comprado:
+            favoritos[reporte.estudiante_id] = [
+                {'producto__nombre': reporte.producto_mas_comprado, 'cantidad_total': None}
+            ]
+    return gastos, favoritos
+
+def _consumo_ventas(ventas_query):
+    """Gasto y top 3 de productos de cada hijo desde las ventas"""
+    # Gasto y cantidad de compras
+    gastos = {
+        fila['hijo_id']: fila
+        for fila in ventas_query.values('hijo_id').annotate(
+            total_gastado=Sum('total'),
+            num_compras=Count('id')
+        )
+    }
+    
+    # Top 3 de productos de cada hijo (función de ventana por hijo)
+    favoritos = {}
+    filas_favoritos = DetalleVenta.objects.filter(
+        venta__in=ventas_query
+    ).values(
+        'venta__hijo_id',
+        'producto__nombre'
+    ).annotate(
+        cantidad_total=Sum('cantidad')
+    ).annotate(
+        posicion=Window(
+            RowNumber(),
+            partition_by=[F('venta__hijo_id')],
+            order_by=[F('cantidad_total').desc(), F('producto__nombre').asc()]
+        )
+    ).filter(posicion__lte=3).order_by('venta__hijo_id', 'posicion')
+    for fila in filas_favoritos:
+        favoritos.setdefault(fila['venta__hijo_id'], []).append({
+            'producto__nombre': fila['producto__nombre'],
+            'cantidad_total': fila['cantidad_total'],
+        })
+    return gastos, favoritos
+
+def _consumo_por_hijo(hijos, ventas_query, fecha_desde=None, fecha_hasta=None, guardados=None):
+    """
+    Datos de consumo de una lista de hijos con una consulta agrupada por dato
+    (gasto, favoritos y transacciones), sin importar cuántos hijos sean.
+    Con ``guardados`` (período cerrado) el gasto y el producto favorito salen
+    de los ReporteConsumoEstudiante en lugar de las ventas.
+    """
+    ids = [hijo.id for hijo in hijos]
+    
+    if guardados is not None:
+        gastos, favoritos = _consumo_guardado(ids, guardados)
+    else:
+        gastos, favoritos = _consumo_ventas(ventas_query.filter(hijo_id__in=ids))
+    
+    # Transacciones de tarjeta
+    transacciones = TransaccionTarjeta.objects.filter(
+        hijo_id__in=ids,
+        tipo_transaccion='compra'
+    )
+    if fecha_desde:
+        transacciones = transacciones.filter(fecha_local__gte=fecha_desde)
+    if fecha_hasta:
+        transacciones = transacciones.filter(fecha_local__lte=fecha_hasta)
+    transacciones = dict(
+        transacciones.values('hijo_id').annotate(cantidad=Count('id')).values_list('hijo_id', 'cantidad')
+    )
+    
+    consumo_data = []
+    for hijo in hijos:
+        gasto = gastos.get(hijo.id, {})
+        total_gastado = gasto.get('total_gastado') or Decimal('0.00')
+        num_compras = gasto.get('num_compras', 0)
+        consumo_data.append({
+            'hijo': hijo,
+            'total_gastado': total_gastado,
+            'num_compras': num_compras,
+            'promedio_por_compra': total_gastado / num_compras if num_compras > 0 else Decimal('0.00'),
+            'productos_favoritos': favoritos.get(hijo.id, []),
+            'saldo_actual': hijo.saldo_virtual,
+            'transacciones_tarjeta': transacciones.get(hijo.id, 0)
+        })
+    return consumo_data
+
+def _consumo_csv(paginator, ventas_query, fecha_desde, fecha_hasta, guardados=None):
+    """Exporta el reporte de consumo completo, procesando los hijos por lotes"""
+    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="consumo_por_hijo.csv"'
+    writer = csv.writer(response)
+    writer.writerow([
+        'Hijo', 'Tarjeta', 'Compras', 'Total gastado', 'Promedio por compra',
+        'Transacciones de tarjeta', 'Saldo actual', 'Productos favoritos'
+    ])
+    for numero in paginator.page_range:
+        hijos = list(paginator.page(numero).object_list)
+        for fila in _consumo_por_hijo(hijos, ventas_query, fecha_desde, fecha_hasta, guardados):
+            writer.writerow([
+                fila['hijo'].nombre_completo,
+                fila['hijo'].numero_tarjeta,
+                fila['num_compras'],
+                fila['total_gastado'],
+                round(fila['promedio_por_compra'], 2),
+                fila['transacciones_tarjeta'],
+                fila['saldo_actual'],
+                ', '.join(favorito['producto__nombre'] for favorito in fila['productos_favoritos']),
+            ])
+    return response
+
 @login_required
 def reporte_consumo_hijo(request):
-    """Reporte detallado de consumo por hijo"""
+    """Reporte detallado de consumo por hijo (paginado, o completo en CSV con ?formato=csv)"""
     if request.user.tipo_usuario not in ['administrador', 'cajero', 'padre']:
         messages.error(request, 'No tienes permisos para ver este reporte')
         return redirect('usuarios:dashboard')
@@ -90,71 +251,93 @@ def reporte_consumo_hijo(request):
     # Filtros
     fecha_desde = request.GET.get('fecha_desde')
     fecha_hasta = request.GET.get('fecha_hasta')
-    hijo_id = request.GET.get('hijo_id')
+    hijo_id = request.GET.get('hijo_id', '')
+    hijo_id = int(hijo_id) if hijo_id.isdigit() else None
     
     # Queryset base según tipo de usuario
     if request.user.tipo_usuario == 'padre':
         hijos = PerfilHijo.objects.filter(padre=request.user, activo=True)
     else:
         hijos = PerfilHijo.objects.filter(activo=True)
+    hijos = hijos.order_by('nombre_completo', 'id')
+    hijos_filtrados = hijos.filter(id=hijo_id) if hijo_id else hijos
     
     # Aplicar filtros de fecha
     ventas_query = Venta.objects.filter(estado='pagada')
     if fecha_desde:
-        ventas_query = ventas_query.filter(fecha_venta__date__gte=fecha_desde)
+        ventas_query = ventas_query.filter(fecha_local__gte=fecha_desde)
     if fecha_hasta:
-        ventas_query = ventas_query.filter(fecha_venta__date__lte=fecha_hasta)
+        ventas_query = ventas_query.filter(fecha_local__lte=fecha_hasta)
     if hijo_id:
         ventas_query = ventas_query.filter(hijo_id=hijo_id)
     
-    # Datos de consumo
-    consumo_data = []
-    for hijo in hijos:
-        ventas_hijo = ventas_query.filter(hijo=hijo)
-        
-        total_gastado = ventas_hijo.aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-        num_compras = ventas_hijo.count()
-        
-        # Productos favoritos
-        productos_favoritos = DetalleVenta.objects.filter(
-            venta__in=ventas_hijo
-        ).values(
-            'producto__nombre'
-        ).annotate(
-            cantidad_total=Sum('cantidad')
-        ).order_by('-cantidad_total')[:3]
-        
-        # Transacciones de tarjeta
-        transacciones = TransaccionTarjeta.objects.filter(
-            hijo=hijo,
-            tipo_transaccion='compra'
-        )
-        if fecha_desde:
-            transacciones = transacciones.filter(fecha_transaccion__date__gte=fecha_desde)
-        if fecha_hasta:
-            transacciones = transacciones.filter(fecha_transaccion__date__lte=fecha_hasta)
-        
-        consumo_data.append({
-            'hijo': hijo,
-            'total_gastado': total_gastado,
-            'num_compras': num_compras,
-            'promedio_por_compra': total_gastado / num_compras if num_compras > 0 else Decimal('0.00'),
-            'productos_favoritos': productos_favoritos,
-            'saldo_actual': hijo.saldo_virtual,
-            'transacciones_tarjeta': transacciones.count()
-        })
+    # Período cerrado: se lee el reporte guardado en lugar de las ventas
+    guardados = None
+    desde = _fecha_parametro(fecha_desde, None)
+    hasta = _fecha_parametro(fecha_hasta, None)
+    if periodo_cerrado(desde, hasta):
+        guardados = reportes_guardados('consumo_estudiante', desde, hasta, request.user)
+        if hijo_id:
+            guardados = guardados.filter(estudiante_id=hijo_id)
+    
+    paginator = Paginator(hijos_filtrados, HIJOS_POR_PAGINA)
+    if request.GET.get('formato') == 'csv':
+        return _consumo_csv(paginator, ventas_query, fecha_desde, fecha_hasta, guardados)
+    
+    # Datos de consumo de la página actual
+    page_obj = paginator.get_page(request.GET.get('page'))
+    consumo_data = _consumo_por_hijo(list(page_obj.object_list), ventas_query, fecha_desde, fecha_hasta, guardados)
+    totales = {
+        'num_compras': sum(fila['num_compras'] for fila in consumo_data),
+        'total_gastado': sum((fila['total_gastado'] for fila in consumo_data), Decimal('0.00')),
+    }
+    totales['promedio_por_compra'] = (
+        totales['total_gastado'] / totales['num_compras'] if totales['num_compras'] else Decimal('0.00')
+    )
     
     context = {
         'titulo': 'Reporte de Consumo por Hijo',
         'consumo_data': consumo_data,
+        'totales': totales,
+        'page_obj': page_obj,
         'hijos': hijos,
         'fecha_desde': fecha_desde,
         'fecha_hasta': fecha_hasta,
-        'hijo_id': int(hijo_id) if hijo_id else None,
+        'hijo_id': hijo_id,
     }
     
     return render(request, 'reportes/reporte_consumo_hijo.html', context)
 
+def _productos_guardados(reporte, categoria_id=None):
+    """Productos y análisis por categoría desde un ReporteProductosMasVendidos guardado"""
+    detalles = reporte.detalles_productos.all()
+    if categoria_id:
+        detalles = detalles.filter(producto__categoria_id=categoria_id)
+    productos_vendidos = list(detalles.values(
+        'producto__id',
+        'producto__nombre',
+        'producto__categoria__nombre',
+        'producto__precio_venta',
+        'cantidad_vendida',
+        total_ingresos=F('monto_total_vendido'),
+        num_transacciones=F('numero_transacciones')
+    ).order_by('-cantidad_vendida'))
+    
+    # Un detalle por producto: las categorías se suman sobre la lista
+    categorias = {}
+    for producto in productos_vendidos:
+        categoria = categorias.setdefault(producto['producto__categoria__nombre'], {
+            'producto__categoria__nombre': producto['producto__categoria__nombre'],
+            'total_productos': 0,
+            'cantidad_vendida': 0,
+            'total_ingresos': Decimal('0.00'),
+        })
+        categoria['total_productos'] += 1
+        categoria['cantidad_vendida'] += producto['cantidad_vendida']
+        categoria['total_ingresos'] += producto['total_ingresos']
+    categorias_analysis = sorted(categorias.values(), key=lambda c: c['total_ingresos'], reverse=True)
+    return productos_vendidos, categorias_analysis
+
 @login_required
 def reporte_productos_mas_vendidos(request):
     """Reporte de productos más vendidos con análisis detallado"""
@@ -167,56 +350,52 @@ def reporte_productos_mas_vendidos(request):
     fecha_hasta = request.GET.get('fecha_hasta')
     categoria_id = request.GET.get('categoria_id')
     
-    # Queryset base
-    detalles_query = DetalleVenta.objects.filter(venta__estado='pagada')
-    
-    # Aplicar filtros
-    if fecha_desde:
-        detalles_query = detalles_query.filter(venta__fecha_venta__date__gte=fecha_desde)
-    if fecha_hasta:
-        detalles_query = detalles_query.filter(venta__fecha_venta__date__lte=fecha_hasta)
-    if categoria_id:
-        detalles_query = detalles_query.filter(producto__categoria_id=categoria_id)
-    
-    # Productos más vendidos
-    productos_vendidos = detalles_query.values(
-        'producto__id',
-        'producto__nombre',
-        'producto__categoria__nombre',
-        'producto__precio_venta'
-    ).annotate(
-        cantidad_vendida=Sum('cantidad'),
-        total_ingresos=Sum(F('cantidad') * F('precio_unitario')),
-        num_transacciones=Count('venta', distinct=True)
-    ).order_by('-cantidad_vendida')
-    
-    # Análisis por categorías
-    categorias_analysis = detalles_query.values(
-        'producto__categoria__nombre'
-    ).annotate(
-        total_productos=Count('producto', distinct=True),
-        cantidad_vendida=Sum('cantidad'),
-        total_ingresos=Sum(F('cantidad') * F('precio_unitario'))
-    ).order_by('-total_ingresos')
-    
-    # Tendencias de venta (últimos 7 días)
-    hace_7_dias = timezone.now().date() - timedelta(days=7)
-    tendencias = []
-    for i in range(7):
-        fecha = hace_7_dias + timedelta(days=i)
-        ventas_dia = DetalleVenta.objects.filter(
-            venta__fecha_venta__date=fecha,
-            venta__estado='pagada'
-        ).aggregate(
-            total_items=Sum('cantidad'),
-            total_ingresos=Sum(F('cantidad') * F('precio_unitario'))
+    desde = _fecha_parametro(fecha_desde, None)
+    hasta = _fecha_parametro(fecha_hasta, None)
+    if periodo_cerrado(desde, hasta):
+        productos_vendidos, categorias_analysis = _productos_guardados(
+            reportes_guardados('productos_mas_vendidos', desde, hasta, request.user).first(),
+            categoria_id
         )
+    else:
+        # Queryset base (resumen diario por producto)
+        filas_query = por_producto(resumen_ventas(fecha_desde or None, fecha_hasta or None))
         
-        tendencias.append({
-            'fecha': fecha,
-            'total_items': ventas_dia['total_items'] or 0,
-            'total_ingresos': ventas_dia['total_ingresos'] or Decimal('0.00')
-        })
+        # Aplicar filtros
+        if categoria_id:
+            filas_query = filas_query.filter(producto__categoria_id=categoria_id)
+        
+        # Productos más vendidos
+        productos_vendidos = filas_query.values(
+            'producto__id',
+            'producto__nombre',
+            'producto__categoria__nombre',
+            'producto__precio_venta'
+        ).annotate(
+            cantidad_vendida=Sum('unidades'),
+            total_ingresos=Sum('monto'),
+            num_transacciones=Sum('cantidad')
+        ).order_by('-cantidad_vendida')
+        
+        # Análisis por categorías
+        categorias_analysis = filas_query.values(
+            'producto__categoria__nombre'
+        ).annotate(
+            total_productos=Count('producto', distinct=True),
+            cantidad_vendida=Sum('unidades'),
+            total_ingresos=Sum('monto')
+        ).order_by('-total_ingresos')
+    
+    # Tendencias de venta (últimos 7 días)
+    hace_7_dias = timezone.localdate() - timedelta(days=7)
+    tendencias = [
+        {
+            'fecha': punto['inicio'],
+            'total_items': punto['items'],
+            'total_ingresos': punto['ingresos'],
+        }
+        for punto in serie_ventas(hace_7_dias, hace_7_dias + timedelta(days=6), 'dia')
+    ]
     
     context = {
         'titulo': 'Reporte de Productos Más Vendidos',
@@ -242,24 +421,40 @@ def reporte_ingresos_metodo_pago(request):
     fecha_desde = request.GET.get('fecha_desde')
     fecha_hasta = request.GET.get('fecha_hasta')
     
-    # Queryset base
-    pagos_query = PagoVenta.objects.filter(venta__estado='pagada')
-    
-    # Aplicar filtros
-    if fecha_desde:
-        pagos_query = pagos_query.filter(venta__fecha_venta__date__gte=fecha_desde)
-    if fecha_hasta:
-        pagos_query = pagos_query.filter(venta__fecha_venta__date__lte=fecha_hasta)
-    
-    # Análisis por método de pago
-    metodos_analysis = pagos_query.values(
-        'metodo_pago__nombre',
-        'metodo_pago__codigo'
-    ).annotate(
-        total_transacciones=Count('id'),
-        total_monto=Sum('monto'),
-        promedio_transaccion=Avg('monto')
-    ).order_by('-total_monto')
+    desde = _fecha_parametro(fecha_desde, None)
+    hasta = _fecha_parametro(fecha_hasta, None)
+    if periodo_cerrado(desde, hasta):
+        reporte = reportes_guardados('ingresos_metodo_pago', desde, hasta, request.user).first()
+        metodos_analysis = [
+            {
+                'metodo_pago__nombre': detalle.metodo_pago.nombre,
+                'metodo_pago__codigo': detalle.metodo_pago.codigo,
+                'total_transacciones': detalle.cantidad_transacciones,
+                'total_monto': detalle.monto_total,
+                'promedio_transaccion': detalle.monto_total / detalle.cantidad_transacciones,
+            }
+            for detalle in reporte.detalles_metodos.select_related('metodo_pago')
+            if detalle.cantidad_transacciones
+        ]
+    else:
+        # Queryset base
+        pagos_query = PagoVenta.objects.filter(venta__estado='pagada')
+        
+        # Aplicar filtros
+        if fecha_desde:
+            pagos_query = pagos_query.filter(fecha_local__gte=fecha_desde)
+        if fecha_hasta:
+            pagos_query = pagos_query.filter(fecha_local__lte=fecha_hasta)
+        
+        # Análisis por método de pago
+        metodos_analysis = pagos_query.values(
+            'metodo_pago__nombre',
+            'metodo_pago__codigo'
+        ).annotate(
+            total_transacciones=Count('id'),
+            total_monto=Sum('monto'),
+            promedio_transaccion=Avg('monto')
+        ).order_by('-total_monto')
     
     # Análisis de uso de tarjetas exclusivas
     transacciones_tarjeta = TransaccionTarjeta.objects.filter(
@@ -267,9 +462,9 @@ def reporte_ingresos_metodo_pago(request):
         estado='exitosa'
     )
     if fecha_desde:
-        transacciones_tarjeta = transacciones_tarjeta.filter(fecha_transaccion__date__gte=fecha_desde)
+        transacciones_tarjeta = transacciones_tarjeta.filter(fecha_local__gte=fecha_desde)
     if fecha_hasta:
-        transacciones_tarjeta = transacciones_tarjeta.filter(fecha_transaccion__date__lte=fecha_hasta)
+        transacciones_tarjeta = transacciones_tarjeta.filter(fecha_local__lte=fecha_hasta)
     
     tarjeta_stats = {
         'total_transacciones': transacciones_tarjeta.count(),
@@ -284,19 +479,19 @@ def reporte_ingresos_metodo_pago(request):
         tarjeta_stats['promedio_por_hijo'] = abs(tarjeta_stats['total_monto']) / tarjeta_stats['hijos_activos']
     
     # Comparación semanal
-    hace_14_dias = timezone.now().date() - timedelta(days=14)
-    hace_7_dias = timezone.now().date() - timedelta(days=7)
-    hoy = timezone.now().date()
+    hace_14_dias = timezone.localdate() - timedelta(days=14)
+    hace_7_dias = timezone.localdate() - timedelta(days=7)
+    hoy = timezone.localdate()
     
     semana_pasada = PagoVenta.objects.filter(
-        venta__fecha_venta__date__gte=hace_14_dias,
-        venta__fecha_venta__date__lt=hace_7_dias,
+        fecha_local__gte=hace_14_dias,
+        fecha_local__lt=hace_7_dias,
         venta__estado='pagada'
     ).aggregate(total=Sum('monto'))['total'] or Decimal('0.00')
     
     semana_actual = PagoVenta.objects.filter(
-        venta__fecha_venta__date__gte=hace_7_dias,
-        venta__fecha_venta__date__lte=hoy,
+        fecha_local__gte=hace_7_dias,
+        fecha_local__lte=hoy,
         venta__estado='pagada'
     ).aggregate(total=Sum('monto'))['total'] or Decimal('0.00')
     
@@ -317,6 +512,57 @@ def reporte_ingresos_metodo_pago(request):
     
     return render(request, 'reportes/reporte_ingresos_metodo_pago.html', context)
 
+def _fecha_parametro(valor, defecto):
+    """Fecha AAAA-MM-DD de un parámetro GET, o ``defecto`` si falta o es inválida"""
+    try:
+        return date.fromisoformat(valor) if valor else defecto
+    except ValueError:
+        return defecto
+
+@login_required
+def serie_ventas_api(request):
+    """
+    Serie de ventas para gráficos: ?desde=&hasta=&intervalo=hora|dia|semana|mes&max_puntos=
+    El rango se limita según el intervalo (ver series.MAX_DIAS).
+    """
+    if request.user.tipo_usuario not in ['administrador', 'cajero']:
+        return JsonResponse({'error': 'No tienes permisos para ver este reporte'}, status=403)
+    
+    hoy = timezone.localdate()
+    desde = _fecha_parametro(request.GET.get('desde'), hoy - timedelta(days=30))
+    hasta = _fecha_parametro(request.GET.get('hasta'), hoy)
+    intervalo = request.GET.get('intervalo', 'dia')
+    if intervalo not in INTERVALOS:
+        return JsonResponse({'error': f'Intervalo inválido. Opciones: {", ".join(INTERVALOS)}'}, status=400)
+    if hasta < desde:
+        return JsonResponse({'error': 'La fecha "desde" debe ser anterior a "hasta"'}, status=400)
+    if (hasta - desde).days + 1 > MAX_DIAS[intervalo]:
+        return JsonResponse({
+            'error': f'El rango para el intervalo "{intervalo}" no puede superar {MAX_DIAS[intervalo]} días'
+        }, status=400)
+    try:
+        max_puntos = int(request.GET.get('max_puntos', MAX_PUNTOS_GRAFICO))
+    except ValueError:
+        return JsonResponse({'error': 'max_puntos debe ser un número'}, status=400)
+    
+    serie = serie_ventas(desde, hasta, intervalo, max_puntos=max(max_puntos, 1))
+    return JsonResponse({
+        'success': True,
+        'intervalo': intervalo,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'serie': [
+            {
+                'inicio': punto['inicio'].isoformat(),
+                'fin': punto['fin'].isoformat(),
+                'ventas': punto['ventas'],
+                'items': punto['items'],
+                'ingresos': float(punto['ingresos']),
+            }
+            for punto in serie
+        ],
+    })
+
 @login_required
 def reporte_ventas_diarias(request):
     """Reporte de ventas diarias con tendencias"""
@@ -324,28 +570,23 @@ def reporte_ventas_diarias(request):
         messages.error(request, 'No tienes permisos para ver este reporte')
         return redirect('usuarios:dashboard')
     
-    # Filtros
-    fecha_desde = request.GET.get('fecha_desde')
-    fecha_hasta = request.GET.get('fecha_hasta')
-    
-    # Fechas por defecto (últimos 30 días)
-    if not fecha_desde:
-        fecha_desde = (timezone.now().date() - timedelta(days=30)).strftime('%Y-%m-%d')
-    if not fecha_hasta:
-        fecha_hasta = timezone.now().date().strftime('%Y-%m-%d')
-    
-    # Ventas por día
-    ventas_diarias = Venta.objects.filter(
-        fecha_venta__date__gte=fecha_desde,
-        fecha_venta__date__lte=fecha_hasta,
-        estado='pagada'
-    ).extra(
-        select={'fecha': 'DATE(fecha_venta)'}
-    ).values('fecha').annotate(
-        num_ventas=Count('id'),
-        total_ingresos=Sum('total'),
-        num_items=Sum('detalleventa__cantidad')
-    ).order_by('fecha')
+    # Filtros (por defecto los últimos 30 días)
+    hoy = timezone.localdate()
+    desde = _fecha_parametro(request.GET.get('fecha_desde'), hoy - timedelta(days=30))
+    hasta = _fecha_parametro(request.GET.get('fecha_hasta'), hoy)
+    fecha_desde = desde.strftime('%Y-%m-%d')
+    fecha_hasta = hasta.strftime('%Y-%m-%d')
+    
+    # Ventas por día (sólo los días con ventas)
+    ventas_diarias = [
+        {
+            'fecha': punto['inicio'],
+            'num_ventas': punto['ventas'],
+            'total_ingresos': punto['ingresos'],
+            'num_items': punto['items'],
+        }
+        for punto in serie_ventas(desde, hasta, 'dia') if punto['ventas']
+    ]
     
     # Estadísticas del período
     total_ventas = sum(dia['num_ventas'] for dia in ventas_diarias)
@@ -375,6 +616,157 @@ def reporte_ventas_diarias(request):
     
     return render(request, 'reportes/reporte_ventas_diarias.html', context)
 
+@login_required
+def reporte_comisiones(request):
+    """Comisiones de pagos por método, punto de venta, cajero o día, comparadas con el período anterior"""
+    if request.user.tipo_usuario != 'administrador':
+        messages.error(request, 'No tienes permisos para ver este reporte')
+        return redirect('usuarios:dashboard')
+    
+    # Filtros (por defecto el mes en curso)
+    hoy = timezone.localdate()
+    desde = _fecha_parametro(request.GET.get('fecha_desde'), hoy.replace(day=1))
+    hasta = _fecha_parametro(request.GET.get('fecha_hasta'), hoy)
+    agrupar = request.GET.get('agrupar', 'metodo')
+    if agrupar not in AGRUPACIONES:
+        agrupar = 'metodo'
+    
+    # Un período cerrado se lee del caché del cierre
+    calcular = comisiones_cerradas if periodo_cerrado(desde, hasta) else comisiones
+    resultado = calcular(desde, hasta, agrupar)
+    
+    if request.GET.get('formato') == 'xlsx':
+        encabezados, filas = tabla_comisiones(resultado, agrupar)
+        libro = Workbook(write_only=True)
+        hoja = libro.create_sheet('Comisiones')
+        hoja.append(encabezados)
+        for fila in filas:
+            hoja.append(fila)
+        buffer = BytesIO()
+        libro.save(buffer)
+        response = HttpResponse(
+            buffer.getvalue(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        response['Content-Disposition'] = f'attachment; filename="comisiones_{agrupar}_{desde}_{hasta}.xlsx"'
+        return response
+    
+    context = {
+        'titulo': 'Reporte de Comisiones de Pagos',
+        'filas': resultado['filas'],
+        'totales': resultado['totales'],
+        'anterior_desde': resultado['anterior_desde'],
+        'anterior_hasta': resultado['anterior_hasta'],
+        'agrupar': agrupar,
+        'agrupaciones': [(clave, encabezado) for clave, (_, encabezado) in AGRUPACIONES.items()],
+        'encabezado_grupo': AGRUPACIONES[agrupar][1],
+        'fecha_desde': desde.strftime('%Y-%m-%d'),
+        'fecha_hasta': hasta.strftime('%Y-%m-%d'),
+    }
+    
+    return render(request, 'reportes/reporte_comisiones.html', context)
+
+@login_required
+def reporte_margenes(request):
+    """Rentabilidad por producto, categoría, mes o día con el costo al momento de la venta"""
+    if request.user.tipo_usuario != 'administrador':
+        messages.error(request, 'No tienes permisos para ver este reporte')
+        return redirect('usuarios:dashboard')
+    
+    # Filtros (por defecto el mes en curso)
+    hoy = timezone.localdate()
+    desde = _fecha_parametro(request.GET.get('fecha_desde'), hoy.replace(day=1))
+    hasta = _fecha_parametro(request.GET.get('fecha_hasta'), hoy)
+    agrupar = request.GET.get('agrupar', 'producto')
+    if agrupar not in margenes.AGRUPACIONES:
+        agrupar = 'producto'
+    
+    filas = margenes.margenes(desde, hasta, agrupar)
+    for fila in filas:
+        if agrupar == 'producto':
+            fila['grupo'] = f"{fila['producto__codigo']} - {fila['producto__nombre']}"
+        elif agrupar == 'categoria':
+            fila['grupo'] = fila['producto__categoria__nombre']
+        elif agrupar == 'mes':
+            fila['grupo'] = fila['mes'].strftime('%m/%Y')
+        else:
+            fila['grupo'] = fila['venta__fecha_local'].strftime('%d/%m/%Y')
+    
+    context = {
+        'titulo': 'Reporte de Rentabilidad',
+        'filas': filas,
+        'totales': margenes.totales(filas),
+        'agrupar': agrupar,
+        'agrupaciones': [(clave, encabezado) for clave, (_, encabezado) in margenes.AGRUPACIONES.items()],
+        'encabezado_grupo': margenes.AGRUPACIONES[agrupar][1],
+        'fecha_desde': desde.strftime('%Y-%m-%d'),
+        'fecha_hasta': hasta.strftime('%Y-%m-%d'),
+    }
+    
+    return render(request, 'reportes/reporte_margenes.html', context)
+
+# Semanas máximas del mapa de calor
+MAX_SEMANAS_MAPA = 52
+
+def _parametros_mapa_calor(request):
+    """Semana final, cantidad de semanas y punto de venta del mapa de calor"""
+    hasta = _fecha_parametro(request.GET.get('hasta'), timezone.localdate())
+    try:
+        semanas = min(max(int(request.GET.get('semanas', 4)), 1), MAX_SEMANAS_MAPA)
+    except ValueError:
+        semanas = 4
+    return hasta, semanas, request.GET.get('punto_venta') or None
+
+@login_required
+def reporte_mapa_calor(request):
+    """Mapa de calor de ventas por día de la semana y franja de 15 minutos"""
+    if request.user.tipo_usuario not in ['administrador', 'cajero']:
+        messages.error(request, 'No tienes permisos para ver este reporte')
+        return redirect('usuarios:dashboard')
+    
+    hasta, semanas, punto_venta = _parametros_mapa_calor(request)
+    mapa = mapa_calor(ventas_semanas(hasta, semanas), punto_venta)
+    
+    context = {
+        'titulo': 'Mapa de Calor de Ventas',
+        'mapa': mapa,
+        'franja_minutos': FRANJA_MINUTOS,
+        'hasta': hasta.strftime('%Y-%m-%d'),
+        'semanas': semanas,
+        'punto_venta': punto_venta,
+    }
+    
+    return render(request, 'reportes/reporte_mapa_calor.html', context)
+
+@login_required
+def mapa_calor_api(request):
+    """
+    Mapa de calor para gráficos: ?hasta=&semanas=&punto_venta=
+    """
+    if request.user.tipo_usuario not in ['administrador', 'cajero']:
+        return JsonResponse({'error': 'No tienes permisos para ver este reporte'}, status=403)
+    
+    hasta, semanas, punto_venta = _parametros_mapa_calor(request)
+    mapa = mapa_calor(ventas_semanas(hasta, semanas), punto_venta)
+    return JsonResponse({
+        'success': True,
+        'hasta': hasta.isoformat(),
+        'semanas': semanas,
+        'punto_venta': punto_venta,
+        'franja_minutos': FRANJA_MINUTOS,
+        'franjas': mapa['franjas'],
+        'puntos_venta': mapa['puntos_venta'],
+        'maximo': mapa['maximo'],
+        'dias': [
+            {
+                'nombre': dia['nombre'],
+                'ventas': [celda['ventas'] for celda in dia['celdas']],
+                'ingresos': [float(celda['ingresos']) for celda in dia['celdas']],
+            }
+            for dia in mapa['dias']
+        ],
+    })
+
 @login_required
 def reporte_stock_productos(request):
     """Reporte completo de inventario y stock"""
@@ -482,11 +874,71 @@ def configuracion_reportes(request):
         messages.error(request, 'No tienes permisos para configurar reportes')
         return redirect('usuarios:dashboard')
     
-    # Aquí se implementaría la configuración de reportes automáticos
-    # Por ahora, solo mostramos la interfaz
+    # Generar un reporte ahora: se encola y lo procesa el comando procesar_reportes
+    if request.method == 'POST':
+        tipo_reporte = request.POST.get('tipo_reporte')
+        hoy = timezone.localdate()
+        fecha_inicio = _fecha_parametro(request.POST.get('fecha_inicio'), hoy - timedelta(days=30))
+        fecha_fin = _fecha_parametro(request.POST.get('fecha_fin'), hoy)
+        if tipo_reporte not in GENERADORES:
+            messages.error(request, 'Tipo de reporte inválido')
+        elif fecha_fin < fecha_inicio:
+            messages.error(request, 'La fecha final no puede ser anterior a la inicial')
+        else:
+            encolar(
+                tipo_reporte, fecha_inicio, fecha_fin,
+                solicitado_por=request.user,
+                destinatarios=request.POST.get('destinatarios', request.user.email or '')
+            )
+            messages.success(request, 'El reporte se está generando; aparecerá en el historial al terminar')
+        return redirect('reportes:configuracion_reportes')
     
     context = {
         'titulo': 'Configuración de Reportes',
+        'configuraciones': ConfiguracionReporte.objects.all(),
+        'trabajos': TrabajoReporte.objects.select_related('configuracion', 'solicitado_por')[:20],
+        'tipos_reporte': [
+            (codigo, nombre) for codigo, nombre in ReporteBase.TIPO_REPORTE_CHOICES if codigo in GENERADORES
+        ],
     }
     
     return render(request, 'reportes/configuracion_reportes.html', context)
+
+@login_required
+def estadisticas_cache(request):
+    """Aciertos y fallos del caché por cálculo (para medir si ayuda)"""
+    if request.user.tipo_usuario != 'administrador':
+        return JsonResponse({'error': 'No tienes permisos para ver estas estadísticas'}, status=403)
+    
+    return JsonResponse({'success': True, 'calculos': estadisticas()})
+
+@login_required
+def exportar_datos(request, nombre):
+    """
+    Descarga ventas, detalles, pagos o transacciones de un rango de fechas
+    (?desde=&hasta=&formato=csv|xlsx) sin cargar las filas en memoria
+    """
+    if request.user.tipo_usuario != 'administrador':
+        return JsonResponse({'error': 'No tienes permisos para exportar datos'}, status=403)
+    if nombre not in EXPORTACIONES:
+        return JsonResponse({'error': f'Exportación desconocida. Opciones: {", ".join(EXPORTACIONES)}'}, status=404)
+    
+    formato = request.GET.get('formato', 'csv')
+    if formato not in ('csv', 'xlsx'):
+        return JsonResponse({'error': 'Formato inválido. Opciones: csv, xlsx'}, status=400)
+    
+    hoy = timezone.localdate()
+    desde = _fecha_parametro(request.GET.get('desde'), hoy - timedelta(days=30))
+    hasta = _fecha_parametro(request.GET.get('hasta'), hoy)
+    
+    if formato == 'csv':
+        response = StreamingHttpResponse(
+            iterar_csv(nombre, desde, hasta), content_type='text/csv; charset=utf-8'
+        )
+    else:
+        response = StreamingHttpResponse(
+            iterar_xlsx(nombre, desde, hasta),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    response['Content-Disposition'] = f'attachment; filename="{nombre}_{desde}_{hasta}.{formato}"'
+    return response
@@ -1,7 +1,9 @@
 from django import forms
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from .models import PerfilHijo, RecargaSaldo
+from .saldo import acreditar_saldo
 
 
 class RecargaSaldoForm(forms.ModelForm):
@@ -48,10 +50,15 @@ class RecargaSaldoForm(forms.ModelForm):
         recarga.realizada_por = realizada_por
         
         if commit:
-            recarga.save()
-            # Actualizar saldo del hijo
-            self.hijo.saldo_virtual += recarga.monto
-            self.hijo.save()
+            with transaction.atomic():
+                recarga.save()
+                # Actualizar saldo del hijo
+                acreditar_saldo(
+                    self.hijo,
+                    recarga.monto,
+                    realizada_por=realizada_por,
+                    observaciones=recarga.observaciones or 'Recarga de saldo'
+                )
             
         return recarga
 
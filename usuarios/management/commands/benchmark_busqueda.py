@@ -0,0 +1,74 @@
+"""
+Compara la búsqueda de tarjetas por nombre con y sin los índices de trigramas
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from cantina_tita.busqueda import filtro_texto, usa_indices_trigramas
+from usuarios.models import Usuario, PerfilHijo
+
+NOMBRES = ['José', 'María', 'Juan', 'Ana', 'Luis', 'Sofía', 'Matías', 'Lucía', 'Ramón', 'Belén']
+APELLIDOS = ['González', 'Benítez', 'Martínez', 'Giménez', 'Ramírez', 'Núñez', 'Acuña', 'Ortiz', 'Peña', 'Duarte']
+
+
+class _Revertir(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide la búsqueda de tarjetas sobre datos de prueba (no deja datos en la base)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--estudiantes', type=int, default=20000)
+        parser.add_argument('--repeticiones', type=int, default=50)
+
+    def medir(self, consulta, terminos, repeticiones):
+        inicio = time.perf_counter()
+        for i in range(repeticiones):
+            list(consulta(terminos[i % len(terminos)])[:10])
+        return (time.perf_counter() - inicio) * 1000 / repeticiones
+
+    def handle(self, *args, **options):
+        estudiantes = options['estudiantes']
+        repeticiones = options['repeticiones']
+        terminos = ['jose', 'gimenez', 'nunez', 'pena', 'belen']
+
+        try:
+            with transaction.atomic():
+                padre = Usuario.objects.create_user(username='benchmark_busqueda', tipo_usuario='padre')
+                PerfilHijo.objects.bulk_create([
+                    PerfilHijo(
+                        padre=padre,
+                        nombre_completo=f'{random.choice(NOMBRES)} {random.choice(APELLIDOS)} {random.choice(APELLIDOS)}',
+                        numero_tarjeta=f'9{i:015d}',
+                    )
+                    for i in range(estudiantes)
+                ], batch_size=2000)
+                if connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE usuarios_perfilhijo')
+
+                self.stdout.write(f'{estudiantes} estudiantes de prueba, {repeticiones} búsquedas por método')
+
+                sin_indice = self.medir(
+                    lambda t: PerfilHijo.objects.filter(nombre_completo__icontains=t), terminos, repeticiones
+                )
+                self.stdout.write(f'icontains:            {sin_indice:8.2f} ms por búsqueda')
+
+                if usa_indices_trigramas():
+                    consulta = lambda t: PerfilHijo.objects.filter(filtro_texto(['nombre_completo'], t))
+                    con_indice = self.medir(consulta, terminos, repeticiones)
+                    self.stdout.write(f'trigramas + unaccent: {con_indice:8.2f} ms por búsqueda')
+                    self.stdout.write(consulta('jose').explain().splitlines()[0])
+                    self.stdout.write(self.style.SUCCESS(f'Mejora: {sin_indice / con_indice:.1f}x'))
+                else:
+                    self.stdout.write(self.style.WARNING(
+                        'La base no es PostgreSQL: no hay índices de trigramas para comparar'
+                    ))
+
+                raise _Revertir
+        except _Revertir:
+            pass
@@ -0,0 +1,25 @@
+# Índices de trigramas para las búsquedas de tarjetas y usuarios (sólo PostgreSQL)
+
+from django.db import migrations
+
+from cantina_tita.busqueda import crear_indices_trigramas
+
+crear, eliminar = crear_indices_trigramas([
+    ('usuarios_perfilhijo', 'nombre_completo'),
+    ('usuarios_perfilhijo', 'numero_tarjeta'),
+    ('usuarios_usuario', 'username'),
+    ('usuarios_usuario', 'first_name'),
+    ('usuarios_usuario', 'last_name'),
+    ('usuarios_usuario', 'email'),
+])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear, eliminar),
+    ]
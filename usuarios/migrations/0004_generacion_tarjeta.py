@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0003_indices_busqueda_texto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilhijo',
+            name='generacion_tarjeta',
+            field=models.PositiveIntegerField(default=1, help_text='Aumenta al regenerar la tarjeta; invalida los códigos QR/NFC anteriores'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:27
+
+import zoneinfo
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+import django.utils.timezone
+
+
+# (modelo, campo de fecha y hora) a partir del cual se calcula fecha_local
+MODELOS = [
+    ('usuarios.TransaccionTarjeta', 'fecha_transaccion'),
+]
+
+
+def rellenar_fecha_local(apps, schema_editor):
+    """Calcula fecha_local de las filas existentes (un UPDATE por tabla)"""
+    zona = zoneinfo.ZoneInfo(settings.TIME_ZONE)
+    for nombre, campo in MODELOS:
+        apps.get_model(nombre).objects.update(fecha_local=TruncDate(campo, tzinfo=zona))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0004_generacion_tarjeta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transacciontarjeta',
+            name='fecha_local',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False, help_text='Fecha local (America/Asuncion) del día escolar, para filtrar por índice'),
+        ),
+        migrations.RunPython(rellenar_fecha_local, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transacciontarjeta',
+            index=models.Index(fields=['hijo', 'tipo_transaccion', 'fecha_local'], name='transaccion_hijo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacciontarjeta',
+            index=models.Index(fields=['tipo_transaccion', 'fecha_local'], name='transaccion_tipo_fecha_idx'),
+        ),
+    ]
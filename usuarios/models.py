@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
+from django.utils import timezone
 
 class Usuario(AbstractUser):
     """
@@ -77,6 +78,10 @@ class PerfilHijo(models.Model):
         blank=True,
         help_text="Fecha en que se asignó la tarjeta al hijo"
     )
+    generacion_tarjeta = models.PositiveIntegerField(
+        default=1,
+        help_text="Aumenta al regenerar la tarjeta; invalida los códigos QR/NFC anteriores"
+    )
     
     # Saldo virtual de la tarjeta exclusiva
     saldo_virtual = models.DecimalField(
@@ -165,6 +170,24 @@ class PerfilHijo(models.Model):
         if save:
             self.save()
     
+    def regenerar_tarjeta(self, save=True):
+        """
+        Asigna un número y código nuevos y aumenta la generación de la
+        tarjeta, con lo que los tokens QR/NFC emitidos antes quedan revocados
+        """
+        self.numero_tarjeta = None
+        self.codigo_tarjeta = None
+        self.generacion_tarjeta += 1
+        self.asignar_tarjeta(save=save)
+    
+    @property
+    def token_tarjeta(self):
+        """Token firmado de la tarjeta para imprimir como QR o grabar en NFC"""
+        from .tarjetas import generar_token
+        if not self.pk or not self.numero_tarjeta:
+            return None
+        return generar_token(self.pk, self.generacion_tarjeta)
+    
     def validar_numero_tarjeta(self, numero):
         """Valida que el número de tarjeta tenga el formato correcto"""
         import re
@@ -300,6 +323,11 @@ class TransaccionTarjeta(models.Model):
         default='exitosa'
     )
     fecha_transaccion = models.DateTimeField(auto_now_add=True)
+    fecha_local = models.DateField(
+        default=timezone.localdate,
+        editable=False,
+        help_text="Fecha local (America/Asuncion) del día escolar, para filtrar por índice"
+    )
     realizada_por = models.ForeignKey(
         Usuario,
         on_delete=models.SET_NULL,
@@ -330,3 +358,7 @@ class TransaccionTarjeta(models.Model):
         verbose_name = "Transacción de Tarjeta"
         verbose_name_plural = "Transacciones de Tarjetas"
         ordering = ['-fecha_transaccion']
+        indexes = [
+            models.Index(fields=['hijo', 'tipo_transaccion', 'fecha_local'], name='transaccion_hijo_fecha_idx'),
+            models.Index(fields=['tipo_transaccion', 'fecha_local'], name='transaccion_tipo_fecha_idx'),
+        ]
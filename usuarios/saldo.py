@@ -0,0 +1,193 @@
+"""
+Movimientos de saldo virtual de las tarjetas exclusivas
+
+Todo débito o crédito de ``PerfilHijo.saldo_virtual`` pasa por este módulo.
+El saldo nunca se lee, se modifica en Python y se guarda: se aplica con un
+único UPDATE condicionado, por lo que dos cajas cobrando la misma tarjeta al
+mismo tiempo no pueden gastar dos veces el mismo saldo. El movimiento queda
+registrado en ``TransaccionTarjeta`` dentro de la misma transacción.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When, F, Q
+from django.utils import timezone
+
+from cantina_tita.cache import invalidar_modelo
+from .models import PerfilHijo, TransaccionTarjeta
+
+
+class SaldoInsuficiente(Exception):
+    """El saldo (más el límite negativo autorizado) no cubre el débito"""
+
+    def __init__(self, hijo, monto):
+        self.hijo = hijo
+        self.monto = monto
+        super().__init__(
+            f'Saldo insuficiente. Disponible: {hijo.saldo_disponible}, Requerido: {monto}'
+        )
+
+
+class _GuardaIncumplida(Exception):
+    pass
+
+
+def _aplicar_movimiento(hijo, delta, guarda, tipo_transaccion, realizada_por=None,
+                        punto_venta='', venta=None, observaciones=''):
+    """Aplica ``delta`` al saldo si se cumple ``guarda`` y registra la transacción"""
+    with transaction.atomic():
+        actualizados = PerfilHijo.objects.filter(guarda, pk=hijo.pk).update(
+            saldo_virtual=F('saldo_virtual') + delta
+        )
+        if not actualizados:
+            hijo.refresh_from_db(fields=['saldo_virtual', 'puede_saldo_negativo', 'limite_saldo_negativo'])
+            raise SaldoInsuficiente(hijo, -delta)
+        # El UPDATE no dispara señales
+        invalidar_modelo(PerfilHijo, [hijo.pk])
+
+        saldo_posterior = PerfilHijo.objects.filter(pk=hijo.pk).values_list(
+            'saldo_virtual', flat=True
+        ).get()
+        hijo.saldo_virtual = saldo_posterior
+
+        return TransaccionTarjeta.objects.create(
+            hijo=hijo,
+            numero_tarjeta_utilizada=hijo.numero_tarjeta or 'N/A',
+            tipo_transaccion=tipo_transaccion,
+            monto=delta,
+            saldo_anterior=saldo_posterior - delta,
+            saldo_posterior=saldo_posterior,
+            estado='exitosa',
+            realizada_por=realizada_por,
+            punto_venta=punto_venta,
+            observaciones=observaciones,
+            venta_relacionada=venta
+        )
+
+
+def debitar_saldo(hijo, monto, tipo_transaccion='compra', **kwargs):
+    """
+    Descuenta ``monto`` del saldo virtual del hijo.
+
+    El débito se aplica sólo si el saldo resultante no baja de cero, o del
+    límite negativo autorizado cuando ``puede_saldo_negativo`` está activo.
+
+    Args:
+        hijo: PerfilHijo a debitar (su ``saldo_virtual`` se actualiza en memoria)
+        monto: monto positivo a descontar
+        tipo_transaccion: tipo de la TransaccionTarjeta registrada
+        **kwargs: realizada_por, punto_venta, venta, observaciones
+
+    Returns:
+        TransaccionTarjeta registrada
+
+    Raises:
+        SaldoInsuficiente: si el saldo no alcanza (no se descuenta nada)
+    """
+    monto = Decimal(monto)
+    if monto <= 0:
+        raise ValueError('El monto a debitar debe ser positivo')
+
+    guarda = (
+        Q(saldo_virtual__gte=monto) |
+        Q(puede_saldo_negativo=True, saldo_virtual__gte=monto - F('limite_saldo_negativo'))
+    )
+    return _aplicar_movimiento(hijo, -monto, guarda, tipo_transaccion, **kwargs)
+
+
+def acreditar_saldo(hijo, monto, tipo_transaccion='recarga', **kwargs):
+    """
+    Suma ``monto`` al saldo virtual del hijo y registra la transacción.
+
+    Args:
+        hijo: PerfilHijo a acreditar (su ``saldo_virtual`` se actualiza en memoria)
+        monto: monto positivo a acreditar
+        tipo_transaccion: tipo de la TransaccionTarjeta registrada
+        **kwargs: realizada_por, punto_venta, venta, observaciones
+
+    Returns:
+        TransaccionTarjeta registrada
+    """
+    monto = Decimal(monto)
+    if monto <= 0:
+        raise ValueError('El monto a acreditar debe ser positivo')
+
+    return _aplicar_movimiento(hijo, monto, Q(), tipo_transaccion, **kwargs)
+
+
+def debitar_saldos_en_lote(debitos, realizada_por=None, punto_venta=''):
+    """
+    Aplica varios débitos (de una o varias tarjetas) con un único UPDATE
+    condicionado y registra sus transacciones con un único INSERT.
+    Se aplican todos o ninguno.
+
+    Args:
+        debitos: lista ordenada de tuplas (hijo, monto, venta, observaciones)
+        realizada_por: usuario que registra los débitos
+        punto_venta: código del punto de venta
+
+    Returns:
+        Lista de TransaccionTarjeta registradas, en el orden de ``debitos``
+
+    Raises:
+        SaldoInsuficiente: si alguna tarjeta no cubre la suma de sus débitos
+    """
+    totales = {}
+    hijos = {}
+    for hijo, monto, _, _ in debitos:
+        if monto <= 0:
+            raise ValueError('El monto a debitar debe ser positivo')
+        totales[hijo.pk] = totales.get(hijo.pk, Decimal('0')) + Decimal(monto)
+        hijos[hijo.pk] = hijo
+    if not totales:
+        return []
+
+    guardas = Q()
+    for hijo_id, total in totales.items():
+        guardas |= Q(pk=hijo_id, saldo_virtual__gte=total)
+        guardas |= Q(pk=hijo_id, puede_saldo_negativo=True, saldo_virtual__gte=total - F('limite_saldo_negativo'))
+
+    try:
+        with transaction.atomic():
+            actualizados = PerfilHijo.objects.filter(guardas).update(
+                saldo_virtual=Case(
+                    *[When(pk=hijo_id, then=F('saldo_virtual') - total) for hijo_id, total in totales.items()],
+                    default=F('saldo_virtual')
+                )
+            )
+            if actualizados != len(totales):
+                raise _GuardaIncumplida
+            invalidar_modelo(PerfilHijo, list(totales))
+
+            saldo_actual = {
+                hijo_id: saldo + totales[hijo_id]
+                for hijo_id, saldo in PerfilHijo.objects.filter(pk__in=totales).values_list('pk', 'saldo_virtual')
+            }
+            transacciones = []
+            for hijo, monto, venta, observaciones in debitos:
+                saldo_anterior = saldo_actual[hijo.pk]
+                saldo_actual[hijo.pk] = saldo_anterior - monto
+                hijo.saldo_virtual = saldo_actual[hijo.pk]
+                transacciones.append(TransaccionTarjeta(
+                    hijo=hijo,
+                    numero_tarjeta_utilizada=hijo.numero_tarjeta or 'N/A',
+                    tipo_transaccion='compra',
+                    monto=-monto,
+                    saldo_anterior=saldo_anterior,
+                    saldo_posterior=saldo_actual[hijo.pk],
+                    estado='exitosa',
+                    realizada_por=realizada_por,
+                    punto_venta=punto_venta,
+                    observaciones=observaciones,
+                    venta_relacionada=venta,
+                    # El día de la venta (puede ser anterior si se hizo sin conexión)
+                    fecha_local=venta.fecha_local if venta else timezone.localdate()
+                ))
+            return TransaccionTarjeta.objects.bulk_create(transacciones)
+    except _GuardaIncumplida:
+        for hijo_id in sorted(totales):
+            hijo = hijos[hijo_id]
+            hijo.refresh_from_db(fields=['saldo_virtual', 'puede_saldo_negativo', 'limite_saldo_negativo'])
+            if hijo.saldo_disponible < totales[hijo_id]:
+                raise SaldoInsuficiente(hijo, totales[hijo_id])
+        raise SaldoInsuficiente(hijos[min(totales)], totales[min(totales)])
@@ -0,0 +1,111 @@
+"""
+Tokens firmados de las tarjetas para QR y NFC
+
+El token identifica la tarjeta sin buscarla: lleva el id del hijo y el número
+de generación de la tarjeta, firmados con HMAC (``SECRET_KEY``). El POS lo lee
+con el escáner o el lector NFC, el servidor verifica la firma sin tocar la base
+y trae al hijo por clave primaria.
+
+Formato: ``CT-<id>-<generación>-<firma>``, en base 36 y mayúsculas para que
+entre en el modo alfanumérico de los códigos QR (más compacto).
+
+Al regenerar la tarjeta la generación aumenta y los tokens impresos o
+grabados antes dejan de ser válidos.
+"""
+import base64
+
+from django.utils.crypto import salted_hmac, constant_time_compare
+
+PREFIJO = 'CT'
+SAL = 'usuarios.tarjetas.token'
+
+# Bytes de la firma que se conservan (80 bits)
+LARGO_FIRMA = 10
+
+
+class TokenInvalido(Exception):
+    """El token está mal formado o su firma no es válida"""
+
+
+class TarjetaRevocada(Exception):
+    """El token es de una generación anterior de la tarjeta"""
+
+
+def _base36(numero):
+    digitos = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    texto = ''
+    while True:
+        numero, resto = divmod(numero, 36)
+        texto = digitos[resto] + texto
+        if not numero:
+            return texto
+
+
+def _firma(hijo_id, generacion):
+    resumen = salted_hmac(SAL, f'{hijo_id}:{generacion}', algorithm='sha256').digest()
+    return base64.b32encode(resumen[:LARGO_FIRMA]).decode().rstrip('=')
+
+
+def generar_token(hijo_id, generacion):
+    """Token firmado para el hijo y la generación de tarjeta dados"""
+    return f'{PREFIJO}-{_base36(hijo_id)}-{_base36(generacion)}-{_firma(hijo_id, generacion)}'
+
+
+def es_token(texto):
+    """Indica si el texto leído tiene forma de token (sin verificarlo)"""
+    return str(texto or '').strip().upper().startswith(f'{PREFIJO}-')
+
+
+def verificar_token(token):
+    """
+    Verifica la firma del token sin consultar la base.
+
+    Returns:
+        tupla (hijo_id, generacion)
+
+    Raises:
+        TokenInvalido: si el formato o la firma no son válidos
+    """
+    partes = str(token or '').strip().upper().split('-')
+    if len(partes) != 4 or partes[0] != PREFIJO:
+        raise TokenInvalido('Token de tarjeta inválido')
+    try:
+        hijo_id = int(partes[1], 36)
+        generacion = int(partes[2], 36)
+    except ValueError:
+        raise TokenInvalido('Token de tarjeta inválido')
+    if not constant_time_compare(partes[3], _firma(hijo_id, generacion)):
+        raise TokenInvalido('Token de tarjeta inválido')
+    return hijo_id, generacion
+
+
+def resolver_token(token, queryset=None):
+    """
+    Hijo al que pertenece el token (una consulta por clave primaria).
+
+    Raises:
+        TokenInvalido: si la firma no es válida
+        TarjetaRevocada: si la tarjeta se regeneró después de emitir el token
+        PerfilHijo.DoesNotExist: si el hijo no existe o la tarjeta no está activa
+    """
+    from .models import PerfilHijo
+
+    hijo_id, generacion = verificar_token(token)
+    queryset = queryset if queryset is not None else PerfilHijo.objects.all()
+    hijo = queryset.get(pk=hijo_id, tarjeta_activa=True, numero_tarjeta__isnull=False)
+    if hijo.generacion_tarjeta != generacion:
+        raise TarjetaRevocada('La tarjeta fue regenerada; el código ya no es válido')
+    return hijo
+
+
+def qr_svg(token, tamano=200):
+    """Código QR del token en SVG (usa reportlab)"""
+    from reportlab.graphics import renderSVG
+    from reportlab.graphics.barcode.qr import QrCodeWidget
+    from reportlab.graphics.shapes import Drawing
+
+    widget = QrCodeWidget(token, barLevel='M')
+    x1, y1, x2, y2 = widget.getBounds()
+    dibujo = Drawing(tamano, tamano, transform=[tamano / (x2 - x1), 0, 0, tamano / (y2 - y1), 0, 0])
+    dibujo.add(widget)
+    return renderSVG.drawToString(dibujo)
@@ -1,3 +1,165 @@
-from django.test import TestCase
+import threading
+import time
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.db import connection, transaction, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from cantina_tita.busqueda import filtro_texto
+from .forms import RecargaSaldoForm
+from .models import Usuario, PerfilHijo, TransaccionTarjeta, RecargaSaldo
+from .saldo import debitar_saldo, acreditar_saldo, SaldoInsuficiente
+from .tarjetas import generar_token, verificar_token, TokenInvalido
+
+
+def crear_hijo(saldo, **kwargs):
+    padre = Usuario.objects.create_user(username=f'padre{Usuario.objects.count()}', tipo_usuario='padre')
+    return PerfilHijo.objects.create(
+        padre=padre,
+        nombre_completo='Ana Gómez',
+        numero_tarjeta=f'55550000000000{PerfilHijo.objects.count():02d}',
+        tarjeta_activa=True,
+        saldo_virtual=Decimal(saldo),
+        **kwargs
+    )
+
+
+class MovimientoSaldoTest(TestCase):
+
+    def saldo(self, hijo):
+        return PerfilHijo.objects.get(pk=hijo.pk).saldo_virtual
+
+    def test_debito_registra_transaccion(self):
+        hijo = crear_hijo('10000')
+        transaccion = debitar_saldo(hijo, Decimal('4000'), observaciones='Compra')
+
+        self.assertEqual(self.saldo(hijo), Decimal('6000'))
+        self.assertEqual(hijo.saldo_virtual, Decimal('6000'))
+        self.assertEqual(transaccion.tipo_transaccion, 'compra')
+        self.assertEqual(transaccion.monto, Decimal('-4000'))
+        self.assertEqual(transaccion.saldo_anterior, Decimal('10000'))
+        self.assertEqual(transaccion.saldo_posterior, Decimal('6000'))
+
+    def test_debito_sin_saldo_no_modifica_nada(self):
+        hijo = crear_hijo('3000')
+        with self.assertRaises(SaldoInsuficiente):
+            debitar_saldo(hijo, Decimal('4000'))
+        self.assertEqual(self.saldo(hijo), Decimal('3000'))
+        self.assertFalse(TransaccionTarjeta.objects.exists())
+
+    def test_debito_respeta_limite_negativo(self):
+        hijo = crear_hijo('3000', puede_saldo_negativo=True, limite_saldo_negativo=Decimal('2000'))
+        debitar_saldo(hijo, Decimal('5000'))
+        self.assertEqual(self.saldo(hijo), Decimal('-2000'))
+        with self.assertRaises(SaldoInsuficiente):
+            debitar_saldo(hijo, Decimal('1'))
+
+    def test_credito(self):
+        hijo = crear_hijo('0')
+        transaccion = acreditar_saldo(hijo, Decimal('15000'))
+        self.assertEqual(self.saldo(hijo), Decimal('15000'))
+        self.assertEqual(transaccion.tipo_transaccion, 'recarga')
+        self.assertEqual(transaccion.monto, Decimal('15000'))
+
+    def test_monto_invalido(self):
+        hijo = crear_hijo('1000')
+        with self.assertRaises(ValueError):
+            debitar_saldo(hijo, Decimal('0'))
+        with self.assertRaises(ValueError):
+            acreditar_saldo(hijo, Decimal('-5'))
+
+    def test_recarga_desde_formulario(self):
+        hijo = crear_hijo('1000')
+        form = RecargaSaldoForm({'monto': '5000', 'observaciones': 'Recarga semanal'}, hijo=hijo)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        self.assertEqual(self.saldo(hijo), Decimal('6000'))
+        self.assertEqual(RecargaSaldo.objects.count(), 1)
+        self.assertEqual(TransaccionTarjeta.objects.get().saldo_posterior, Decimal('6000'))
+
+
+class DebitoConcurrenteTest(TransactionTestCase):
+    """Varias cajas cobrando la misma tarjeta al mismo tiempo"""
+
+    def cobrar(self, hijo_id, resultados):
+        try:
+            while True:
+                try:
+                    with transaction.atomic():
+                        debitar_saldo(PerfilHijo(pk=hijo_id), Decimal('1000'))
+                    resultados.append(True)
+                    return
+                except SaldoInsuficiente:
+                    resultados.append(False)
+                    return
+                except OperationalError:
+                    # SQLite no soporta escrituras concurrentes: reintentar
+                    time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def test_no_hay_doble_gasto(self):
+        hijo = crear_hijo('5000')
+        resultados = []
+        cajas = [threading.Thread(target=self.cobrar, args=(hijo.pk, resultados)) for _ in range(12)]
+        for caja in cajas:
+            caja.start()
+        for caja in cajas:
+            caja.join()
+
+        self.assertEqual(resultados.count(True), 5)
+        self.assertEqual(PerfilHijo.objects.get(pk=hijo.pk).saldo_virtual, Decimal('0'))
+        self.assertEqual(TransaccionTarjeta.objects.filter(hijo=hijo).count(), 5)
+
+
+class BusquedaTextoTest(TestCase):
+
+    def setUp(self):
+        crear_hijo('0')  # Ana Gómez
+        padre = Usuario.objects.create_user(username='padre_jose', tipo_usuario='padre')
+        PerfilHijo.objects.create(padre=padre, nombre_completo='José Benítez', numero_tarjeta='5555000000009999')
+
+    def buscar(self, termino):
+        return list(
+            PerfilHijo.objects.filter(filtro_texto(['nombre_completo', 'numero_tarjeta'], termino))
+            .values_list('nombre_completo', flat=True)
+        )
+
+    def test_busca_en_cualquiera_de_los_campos(self):
+        self.assertEqual(self.buscar('benítez'), ['José Benítez'])
+        self.assertEqual(self.buscar('9999'), ['José Benítez'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Búsqueda sin acentos sólo en PostgreSQL')
+    def test_ignora_acentos(self):
+        self.assertEqual(self.buscar('jose benitez'), ['José Benítez'])
+
+
+class TokenTarjetaTest(TestCase):
+
+    def test_ida_y_vuelta(self):
+        token = generar_token(12345, 3)
+        self.assertRegex(token, r'^CT-[0-9A-Z]+-[0-9A-Z]+-[0-9A-Z]+$')
+        self.assertEqual(verificar_token(token), (12345, 3))
+
+    def test_no_se_puede_cambiar_el_id(self):
+        _, _, generacion, firma = generar_token(7, 1).split('-')
+        with self.assertRaises(TokenInvalido):
+            verificar_token(f'CT-8-{generacion}-{firma}')
+        with self.assertRaises(TokenInvalido):
+            verificar_token('5555000000000001')
+
+    def test_qr_solo_para_administradores(self):
+        hijo = crear_hijo('0')
+        admin = Usuario.objects.create_user(username='admin_qr', tipo_usuario='administrador')
+        url = reverse('usuarios:tarjeta_qr', args=[hijo.pk])
+
+        self.client.force_login(hijo.padre)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
@@ -13,6 +13,7 @@ urlpatterns = [
     path('hijos/<int:pk>/asignar-tarjeta/', views.asignar_tarjeta, name='asignar_tarjeta'),
     path('hijos/<int:pk>/tarjeta-estado/', views.activar_desactivar_tarjeta, name='activar_desactivar_tarjeta'),
     path('hijos/<int:pk>/regenerar-tarjeta/', views.regenerar_tarjeta, name='regenerar_tarjeta'),
+    path('hijos/<int:pk>/tarjeta-qr/', views.tarjeta_qr, name='tarjeta_qr'),
     path('hijos/<int:pk>/gestionar-tarjeta/', views.gestionar_tarjeta_manual, name='gestionar_tarjeta_manual'),
     path('hijos/<int:pk>/editar/', views.editar_hijo, name='editar_hijo'),
     path('hijos/<int:pk>/eliminar/', views.eliminar_hijo, name='eliminar_hijo'),
@@ -1,21 +1,68 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, Http404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 from django.contrib import messages
-from django.db.models import Sum, Count, F, Q
+from django.db.models import Sum, F, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 from .models import Usuario, PerfilHijo, RecargaSaldo
 from .forms import RecargaSaldoForm, PerfilHijoForm, TarjetaManualForm
+from .tarjetas import qr_svg
 from ventas.models import Venta, DetalleVenta
 from productos.models import Producto
+from cantina_tita.busqueda import filtro_texto
+from cantina_tita.cache import cacheado
+from reportes.resumen import resumen_ventas, totales_diarios
+
+@cacheado('usuarios.dashboard', ['ventas.Venta', 'productos.Producto', 'usuarios.PerfilHijo'])
+def _resumen_administrador(hoy):
+    """Estadísticas del dashboard del administrador"""
+    hace_una_semana = hoy - timedelta(days=7)
+    totales = totales_diarios(resumen_ventas(hace_una_semana, hoy)).aggregate(
+        total=Sum('monto', filter=Q(fecha=hoy)),
+        cantidad=Sum('cantidad', filter=Q(fecha=hoy)),
+        semana_pasada=Sum('monto', filter=Q(fecha=hace_una_semana)),
+    )
+    total_ventas = totales['total'] or 0
+    total_transacciones_hoy = totales['cantidad'] or 0
+    
+    # Calcular promedio de venta
+    promedio_venta_hoy = 0
+    if total_transacciones_hoy > 0:
+        promedio_venta_hoy = total_ventas / total_transacciones_hoy
+    
+    # Comparativa con la semana anterior
+    ventas_semana_pasada = totales['semana_pasada'] or 0
+    
+    # Cálculo de crecimiento
+    if ventas_semana_pasada > 0:
+        crecimiento = ((total_ventas - ventas_semana_pasada) / ventas_semana_pasada) * 100
+    else:
+        crecimiento = 100 if total_ventas > 0 else 0
+    
+    return {
+        'total_ventas_hoy': total_ventas,
+        'total_transacciones_hoy': total_transacciones_hoy,
+        'promedio_venta_hoy': promedio_venta_hoy,
+        'total_hijos': PerfilHijo.objects.filter(activo=True).count(),
+        'productos_stock_bajo': Producto.objects.filter(
+            stock_actual__lte=F('stock_minimo'),
+            requiere_stock=True
+        ).count(),
+        'ventas_semana_pasada': ventas_semana_pasada,
+        'crecimiento_ventas': crecimiento,
+        'productos_populares': list(Producto.objects.annotate(
+            total_vendido=Sum('resumenes_diarios__cantidad')
+        ).filter(total_vendido__gt=0).order_by('-total_vendido')[:4]),
+    }
 
 @login_required
 def dashboard(request):
     """
     Vista principal del dashboard según el tipo de usuario
     """
-    hoy = timezone.now().date()
+    hoy = timezone.localdate()
     
     context = {
         'usuario': request.user,
@@ -23,67 +70,23 @@ def dashboard(request):
     }
     
     if request.user.tipo_usuario == 'administrador':
-        # Dashboard para administrador
-        ventas_hoy = Venta.objects.filter(fecha_venta__date=hoy, estado='pagada')
-        total_ventas = ventas_hoy.aggregate(total=Sum('total'))['total'] or 0
-        
-                # Estadísticas generales para administrador
-        ventas_hoy = Venta.objects.filter(fecha_venta__date=hoy, estado='pagada')
-        total_ventas_hoy = ventas_hoy.aggregate(total=Sum('total'))['total'] or 0
-        total_transacciones_hoy = ventas_hoy.count()
-        
-        # Calcular promedio de venta
-        promedio_venta_hoy = 0
-        if total_transacciones_hoy > 0:
-            promedio_venta_hoy = total_ventas_hoy / total_transacciones_hoy
-        
-        # Comparativa con la semana anterior
-        hace_una_semana = hoy - timedelta(days=7)
-        ventas_semana_pasada = Venta.objects.filter(
-            fecha_venta__date=hace_una_semana,
-            estado='pagada'
-        ).aggregate(total=Sum('total'))['total'] or 0
-        
-        # Cálculo de crecimiento
-        if ventas_semana_pasada > 0:
-            crecimiento = ((total_ventas - ventas_semana_pasada) / ventas_semana_pasada) * 100
-        else:
-            crecimiento = 100 if total_ventas > 0 else 0
-        
-        # Calcular promedio de venta
-        total_transacciones_hoy = ventas_hoy.count()
-        promedio_venta_hoy = 0
-        if total_transacciones_hoy > 0:
-            promedio_venta_hoy = total_ventas / total_transacciones_hoy
-
+        # Dashboard para administrador (estadísticas cacheadas)
+        context.update(_resumen_administrador(hoy))
         context.update({
-            'total_ventas_hoy': total_ventas,
-            'total_transacciones_hoy': total_transacciones_hoy,
-            'promedio_venta_hoy': promedio_venta_hoy,
             'total_usuarios': Usuario.objects.filter(activo=True).count(),
-            'total_hijos': PerfilHijo.objects.filter(activo=True).count(),
-            'productos_stock_bajo': Producto.objects.filter(
-                stock_actual__lte=F('stock_minimo'),
-                requiere_stock=True
-            ).count(),
-            'ventas_semana_pasada': ventas_semana_pasada,
-            'crecimiento_ventas': crecimiento,
             
             # Últimas actividades
             'ultimas_ventas': Venta.objects.filter(
                 estado='pagada', 
-                fecha_venta__date=hoy
+                fecha_local=hoy
             ).select_related('cajero').order_by('-fecha_venta')[:8],
-            'productos_populares': Producto.objects.annotate(
-                total_vendido=Count('ventas_detalle')
-            ).filter(total_vendido__gt=0).order_by('-total_vendido')[:4],
         })
         
     elif request.user.tipo_usuario == 'cajero':
         # Dashboard para cajero
         mis_ventas_hoy = Venta.objects.filter(
             cajero=request.user,
-            fecha_venta__date=hoy,
+            fecha_local=hoy,
             estado='pagada'
         )
         
@@ -107,7 +110,7 @@ def dashboard(request):
         primer_dia_mes = hoy.replace(day=1)
         consumo_mes = Venta.objects.filter(
             hijo__padre=request.user,
-            fecha_venta__date__gte=primer_dia_mes,
+            fecha_local__gte=primer_dia_mes,
             estado='pagada'
         ).aggregate(total=Sum('total'))['total'] or 0
         
@@ -272,10 +275,7 @@ def lista_usuarios(request):
     search = request.GET.get('search')
     if search:
         usuarios = usuarios.filter(
-            Q(username__icontains=search) |
-            Q(first_name__icontains=search) |
-            Q(last_name__icontains=search) |
-            Q(email__icontains=search)
+            filtro_texto(['username', 'first_name', 'last_name', 'email'], search)
         )
     
     # Filtro por tipo de usuario
@@ -299,7 +299,7 @@ def lista_usuarios(request):
     
     # Usuarios que han accedido hoy
     from django.utils import timezone
-    hoy = timezone.now().date()
+    hoy = timezone.localdate()
     accesos_hoy = Usuario.objects.filter(
         last_login__date=hoy
     ).count()
@@ -559,10 +559,8 @@ def regenerar_tarjeta(request, pk):
         try:
             numero_anterior = hijo.numero_tarjeta
             
-            # Regenerar número y código
-            hijo.numero_tarjeta = None
-            hijo.codigo_tarjeta = None
-            hijo.asignar_tarjeta()
+            # Regenerar número y código (revoca los QR/NFC anteriores)
+            hijo.regenerar_tarjeta()
             
             messages.success(request, f'Tarjeta regenerada exitosamente para {hijo.nombre_completo}.')
             
@@ -586,6 +584,27 @@ def regenerar_tarjeta(request, pk):
     return redirect('usuarios:detalle_hijo', pk=hijo.pk)
 
 
+@login_required
+def tarjeta_qr(request, pk):
+    """
+    Código QR de la tarjeta (token firmado) para imprimir o grabar en NFC
+    """
+    hijo = get_object_or_404(PerfilHijo, pk=pk)
+    
+    # El token permite cobrar con la tarjeta: solo administradores
+    if request.user.tipo_usuario != 'administrador':
+        messages.error(request, 'Solo los administradores pueden imprimir tarjetas.')
+        return redirect('usuarios:detalle_hijo', pk=hijo.pk)
+    
+    token = hijo.token_tarjeta
+    if not token:
+        raise Http404('El hijo no tiene tarjeta asignada')
+    
+    response = HttpResponse(qr_svg(token), content_type='image/svg+xml')
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
 @login_required
 def gestionar_tarjeta_manual(request, pk):
     """
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MetodoPago, PuntoVenta, Venta, DetalleVenta, PagoVenta, Factura
+from .models import MetodoPago, PuntoVenta, SecuenciaVenta, Venta, DetalleVenta, PagoVenta, Factura
 
 @admin.register(MetodoPago)
 class MetodoPagoAdmin(admin.ModelAdmin):
@@ -23,10 +23,22 @@ class PuntoVentaAdmin(admin.ModelAdmin):
     ordering = ('codigo',)
 
 
+@admin.register(SecuenciaVenta)
+class SecuenciaVentaAdmin(admin.ModelAdmin):
+    """
+    Administración para los contadores diarios de números de venta
+    """
+    list_display = ('punto_venta', 'fecha', 'ultimo_numero')
+    list_filter = ('punto_venta',)
+    ordering = ('-fecha', 'punto_venta')
+    
+    readonly_fields = ('punto_venta', 'fecha', 'ultimo_numero')
+
+
 class DetalleVentaInline(admin.TabularInline):
     model = DetalleVenta
     extra = 0
-    readonly_fields = ('subtotal',)
+    readonly_fields = ('subtotal', 'costo_unitario')
 
 
 class PagoVentaInline(admin.TabularInline):
@@ -0,0 +1,130 @@
+"""
+Claves de idempotencia para los endpoints de cobro del POS
+
+El POS envía una clave generada en el cliente (cabecera ``Idempotency-Key``)
+con cada intento de cobro. Si la respuesta se pierde y el cajero reintenta, el
+reintento encuentra la clave y recibe la respuesta guardada de la primera
+ejecución con una sola consulta por índice, sin volver a cobrar.
+
+La respuesta se guarda en la misma transacción que la venta: o quedan las dos
+registradas o ninguna, así que una clave sin respuesta nunca corresponde a una
+venta confirmada.
+"""
+from datetime import timedelta
+from functools import wraps
+import json
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import ClaveIdempotencia
+
+CABECERA = 'Idempotency-Key'
+
+# Una clave "en proceso" más vieja que esto quedó de un proceso interrumpido:
+# su venta nunca se confirmó y puede volver a ejecutarse
+ABANDONO = timedelta(minutes=2)
+
+
+def _ttl():
+    return timedelta(hours=settings.CANTINA_CONFIG.get('IDEMPOTENCY_TTL_HOURS', 24))
+
+
+def _respuesta_guardada(registro):
+    response = JsonResponse(registro.respuesta, status=registro.codigo_respuesta)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _reclamar_clave(request, clave):
+    """
+    Registra la clave como "en proceso" o devuelve la respuesta que
+    corresponde si ya existe.
+
+    Returns:
+        (registro, None) si esta petición debe ejecutar la venta,
+        (None, response) si la petición se responde sin ejecutarla
+    """
+    ahora = timezone.now()
+    registro = ClaveIdempotencia.objects.filter(clave=clave, fecha_expiracion__gt=ahora).first()
+
+    if registro is None:
+        # Las claves vencidas se pueden reutilizar
+        ClaveIdempotencia.objects.filter(clave=clave, fecha_expiracion__lte=ahora).delete()
+        try:
+            with transaction.atomic():
+                registro = ClaveIdempotencia.objects.create(
+                    clave=clave,
+                    usuario=request.user,
+                    ruta=request.path,
+                    fecha_expiracion=ahora + _ttl()
+                )
+            return registro, None
+        except IntegrityError:
+            # Otra petición con la misma clave llegó al mismo tiempo
+            registro = ClaveIdempotencia.objects.get(clave=clave)
+
+    if registro.usuario_id != request.user.id or registro.ruta != request.path:
+        return None, JsonResponse(
+            {'error': 'La clave de idempotencia ya fue usada para otra operación'}, status=422
+        )
+
+    if registro.estado == 'completada':
+        return None, _respuesta_guardada(registro)
+
+    retomada = ClaveIdempotencia.objects.filter(
+        pk=registro.pk, estado='en_proceso', fecha_creacion__lt=ahora - ABANDONO
+    ).update(fecha_creacion=ahora, fecha_expiracion=ahora + _ttl())
+    if retomada:
+        return registro, None
+
+    return None, JsonResponse(
+        {'error': 'La venta se está procesando. Espere unos segundos y reintente.'}, status=409
+    )
+
+
+def idempotente(vista):
+    """
+    Decorador para vistas de cobro que responden JSON.
+
+    Sin cabecera ``Idempotency-Key`` la vista se ejecuta normalmente. Con
+    cabecera, sólo se guarda el resultado de las respuestas exitosas (2xx);
+    ante un error la clave se libera para que el reintento vuelva a procesar.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        clave = request.headers.get(CABECERA, '').strip()
+        if request.method != 'POST' or not clave:
+            return vista(request, *args, **kwargs)
+
+        if len(clave) > ClaveIdempotencia._meta.get_field('clave').max_length:
+            return JsonResponse({'error': 'Clave de idempotencia inválida'}, status=400)
+
+        registro, response = _reclamar_clave(request, clave)
+        if response is not None:
+            return response
+
+        with transaction.atomic():
+            response = vista(request, *args, **kwargs)
+            if 200 <= response.status_code < 300:
+                ClaveIdempotencia.objects.filter(pk=registro.pk).update(
+                    estado='completada',
+                    codigo_respuesta=response.status_code,
+                    respuesta=json.loads(response.content)
+                )
+                return response
+            # Una respuesta de error no deja nada registrado
+            transaction.set_rollback(True)
+
+        ClaveIdempotencia.objects.filter(pk=registro.pk).delete()
+        return response
+
+    return envoltura
+
+
+def purgar_claves_vencidas():
+    """Elimina las claves cuyo plazo de conservación venció. Retorna la cantidad."""
+    eliminadas, _ = ClaveIdempotencia.objects.filter(fecha_expiracion__lte=timezone.now()).delete()
+    return eliminadas
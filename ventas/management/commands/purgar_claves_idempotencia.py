@@ -0,0 +1,14 @@
+"""
+Elimina las claves de idempotencia vencidas del POS
+"""
+from django.core.management.base import BaseCommand
+
+from ventas.idempotencia import purgar_claves_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Elimina las claves de idempotencia de ventas cuyo plazo venció'
+    
+    def handle(self, *args, **options):
+        eliminadas = purgar_claves_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'{eliminadas} claves de idempotencia eliminadas'))
@@ -0,0 +1,44 @@
+"""
+Rellena el costo unitario de los detalles de venta anteriores al campo
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from productos.models import Producto
+from ventas.models import DetalleVenta
+
+
+class Command(BaseCommand):
+    help = (
+        'Completa DetalleVenta.costo_unitario con el costo actual del producto en los '
+        'detalles que no lo tienen, por lotes de ids. No existe historial de costos, '
+        'así que es la mejor aproximación para las ventas viejas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Detalles por transacción (por defecto 5000)')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        if lote < 1:
+            raise CommandError('El lote debe ser mayor que cero')
+
+        costo_actual = Subquery(Producto.objects.filter(pk=OuterRef('producto_id')).values('precio_costo')[:1])
+        pendientes = DetalleVenta.objects.filter(costo_unitario__isnull=True).order_by('id')
+
+        rellenados = 0
+        ultimo_id = 0
+        while True:
+            # Un UPDATE por lote: cada transacción bloquea pocas filas
+            ids = list(pendientes.filter(id__gt=ultimo_id).values_list('id', flat=True)[:lote])
+            if not ids:
+                break
+            with transaction.atomic():
+                rellenados += DetalleVenta.objects.filter(
+                    id__in=ids, costo_unitario__isnull=True
+                ).update(costo_unitario=costo_actual)
+            ultimo_id = ids[-1]
+            self.stdout.write(f'{rellenados} detalles rellenados...')
+
+        self.stdout.write(self.style.SUCCESS(f'Costo unitario rellenado en {rellenados} detalles de venta'))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('ultimo_numero', models.PositiveIntegerField(default=0)),
+                ('punto_venta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='secuencias_venta', to='ventas.puntoventa')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Venta',
+                'verbose_name_plural': 'Secuencias de Venta',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='secuenciaventa',
+            constraint=models.UniqueConstraint(fields=('punto_venta', 'fecha'), name='secuencia_venta_unica_por_dia'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:27
+
+import zoneinfo
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+import django.utils.timezone
+
+
+# (modelo, campo de fecha y hora) a partir del cual se calcula fecha_local
+MODELOS = [
+    ('ventas.Venta', 'fecha_venta'),
+    ('ventas.PagoVenta', 'fecha_pago'),
+    ('ventas.Factura', 'fecha_emision'),
+]
+
+
+def rellenar_fecha_local(apps, schema_editor):
+    """Calcula fecha_local de las filas existentes (un UPDATE por tabla)"""
+    zona = zoneinfo.ZoneInfo(settings.TIME_ZONE)
+    for nombre, campo in MODELOS:
+        apps.get_model(nombre).objects.update(fecha_local=TruncDate(campo, tzinfo=zona))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0003_claveidempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='fecha_local',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False, help_text='Fecha local (America/Asuncion) del día escolar, para filtrar por índice'),
+        ),
+        migrations.AddField(
+            model_name='pagoventa',
+            name='fecha_local',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False, help_text='Fecha local (America/Asuncion) del día escolar, para filtrar por índice'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='fecha_local',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False, help_text='Fecha local (America/Asuncion) del día escolar, para filtrar por índice'),
+        ),
+        migrations.RunPython(rellenar_fecha_local, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['estado', 'fecha_local'], name='factura_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagoventa',
+            index=models.Index(fields=['fecha_local', 'metodo_pago'], name='pagoventa_fecha_metodo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['estado', 'fecha_local'], name='venta_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['hijo', 'estado', 'fecha_local'], name='venta_hijo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['cajero', 'estado', 'fecha_local'], name='venta_cajero_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0004_fecha_local'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detalleventa',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Costo del producto al momento de la venta (vacío en ventas anteriores sin rellenar)', max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0005_detalleventa_costo_unitario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='secuenciaventa',
+            name='base',
+            field=models.BigIntegerField(default=0, help_text='Valor de la secuencia de la base antes del primer número del día (PostgreSQL)'),
+        ),
+    ]
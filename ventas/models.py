@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, connection, transaction, IntegrityError
+from django.db.models import F
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.conf import settings
@@ -77,6 +78,111 @@ class PuntoVenta(models.Model):
         ordering = ['codigo']
 
 
+class SecuenciaVenta(models.Model):
+    """
+    Contador diario de números de venta por punto de venta.
+    Reemplaza el conteo de ventas del día al asignar cada número.
+
+    En PostgreSQL los números salen de una secuencia de la base por punto de
+    venta (``secuencia_venta_<id>``): ``nextval`` no bloquea ni se revierte,
+    así que las cajas no esperan a que otra venta confirme para numerar la
+    suya. El número del día es el valor de la secuencia menos ``base`` (su
+    valor al empezar el día); una venta revertida deja un hueco, como en la
+    numeración de facturas. En otras bases se incrementa ``ultimo_numero``.
+    """
+    punto_venta = models.ForeignKey(
+        PuntoVenta,
+        on_delete=models.CASCADE,
+        related_name='secuencias_venta'
+    )
+    fecha = models.DateField()
+    ultimo_numero = models.PositiveIntegerField(default=0)
+    base = models.BigIntegerField(
+        default=0,
+        help_text="Valor de la secuencia de la base antes del primer número del día (PostgreSQL)"
+    )
+    
+    @classmethod
+    def reservar(cls, punto_venta_id, fecha, cantidad=1):
+        """
+        Reserva ``cantidad`` números para el punto de venta y la fecha.
+        Retorna la lista de números en orden creciente (en PostgreSQL puede
+        tener saltos si otras cajas numeran al mismo tiempo).
+        """
+        if connection.vendor == 'postgresql':
+            return cls._reservar_en_secuencia(punto_venta_id, fecha, cantidad)
+        secuencia = cls.objects.filter(punto_venta_id=punto_venta_id, fecha=fecha)
+        with transaction.atomic():
+            if not secuencia.update(ultimo_numero=F('ultimo_numero') + cantidad):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(
+                            punto_venta_id=punto_venta_id,
+                            fecha=fecha,
+                            ultimo_numero=cantidad
+                        )
+                    return list(range(1, cantidad + 1))
+                except IntegrityError:
+                    # Otra caja creó el contador del día al mismo tiempo
+                    secuencia.update(ultimo_numero=F('ultimo_numero') + cantidad)
+            ultimo = secuencia.values_list('ultimo_numero', flat=True).get()
+            return list(range(ultimo - cantidad + 1, ultimo + 1))
+    
+    @classmethod
+    def _reservar_en_secuencia(cls, punto_venta_id, fecha, cantidad):
+        nombre = _crear_secuencia(punto_venta_id)
+        base = cls.objects.filter(punto_venta_id=punto_venta_id, fecha=fecha).values_list('base', flat=True).first()
+        if base is None:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM {nombre}')
+                actual = cursor.fetchone()[0]
+            # La primera venta del día de cada caja espera a que confirme la fila
+            secuencia, _ = cls.objects.get_or_create(
+                punto_venta_id=punto_venta_id, fecha=fecha, defaults={'base': actual}
+            )
+            base = secuencia.base
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT nextval('{nombre}') FROM generate_series(1, %s)", [cantidad])
+            return sorted(valor - base for valor, in cursor.fetchall())
+    
+    @staticmethod
+    def formatear(punto_venta_id, fecha, numero):
+        """Formato: V<AAAAMMDD>-<punto de venta>-<número>"""
+        return f'V{fecha:%Y%m%d}-{punto_venta_id:02d}-{numero:04d}'
+    
+    def __str__(self):
+        return f"{self.punto_venta} - {self.fecha}: {self.ultimo_numero}"
+    
+    class Meta:
+        verbose_name = "Secuencia de Venta"
+        verbose_name_plural = "Secuencias de Venta"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['punto_venta', 'fecha'],
+                name='secuencia_venta_unica_por_dia'
+            ),
+        ]
+
+
+# Secuencias de la base que este proceso ya sabe que existen
+_secuencias_creadas = set()
+
+
+def _crear_secuencia(punto_venta_id):
+    """Nombre de la secuencia de números de venta del punto de venta, creándola si falta"""
+    nombre = f'secuencia_venta_{int(punto_venta_id)}'
+    if nombre not in _secuencias_creadas:
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {nombre}')
+        except IntegrityError:
+            # Otra caja la creó al mismo tiempo
+            pass
+        # Si la venta se revierte también se revierte la creación
+        transaction.on_commit(lambda: _secuencias_creadas.add(nombre))
+    return nombre
+
+
 class Venta(models.Model):
     """
     Registro de ventas realizadas
@@ -157,6 +263,11 @@ class Venta(models.Model):
     )
     
     fecha_venta = models.DateTimeField(auto_now_add=True)
+    fecha_local = models.DateField(
+        default=timezone.localdate,
+        editable=False,
+        help_text="Fecha local (America/Asuncion) del día escolar, para filtrar por índice"
+    )
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
     # Observaciones
@@ -164,12 +275,10 @@ class Venta(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.numero_venta:
-            # Generar número de venta único
-            fecha_str = timezone.now().strftime('%Y%m%d')
-            ultimo_numero = Venta.objects.filter(
-                numero_venta__startswith=f'V{fecha_str}'
-            ).count() + 1
-            self.numero_venta = f'V{fecha_str}{ultimo_numero:04d}'
+            # Generar número de venta único desde el contador del punto de venta
+            fecha = timezone.localdate()
+            numero, = SecuenciaVenta.reservar(self.punto_venta_id, fecha)
+            self.numero_venta = SecuenciaVenta.formatear(self.punto_venta_id, fecha, numero)
         
         super().save(*args, **kwargs)
     
@@ -188,6 +297,11 @@ class Venta(models.Model):
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
         ordering = ['-fecha_venta']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_local'], name='venta_estado_fecha_idx'),
+            models.Index(fields=['hijo', 'estado', 'fecha_local'], name='venta_hijo_fecha_idx'),
+            models.Index(fields=['cajero', 'estado', 'fecha_local'], name='venta_cajero_fecha_idx'),
+        ]
 
 
 class DetalleVenta(models.Model):
@@ -222,8 +336,18 @@ class DetalleVenta(models.Model):
         help_text="Cantidad × Precio unitario"
     )
     
+    costo_unitario = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Costo del producto al momento de la venta (vacío en ventas anteriores sin rellenar)"
+    )
+    
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_unitario
+        if self.costo_unitario is None:
+            self.costo_unitario = self.producto.precio_costo
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -271,6 +395,11 @@ class PagoVenta(models.Model):
     )
     
     fecha_pago = models.DateTimeField(auto_now_add=True)
+    fecha_local = models.DateField(
+        default=timezone.localdate,
+        editable=False,
+        help_text="Fecha local (America/Asuncion) del día escolar, para filtrar por índice"
+    )
     
     def save(self, *args, **kwargs):
         # Calcular comisión
@@ -287,6 +416,9 @@ class PagoVenta(models.Model):
     class Meta:
         verbose_name = "Pago de Venta"
         verbose_name_plural = "Pagos de Venta"
+        indexes = [
+            models.Index(fields=['fecha_local', 'metodo_pago'], name='pagoventa_fecha_metodo_idx'),
+        ]
 
 
 class Factura(models.Model):
@@ -337,6 +469,11 @@ class Factura(models.Model):
     # Estados y fechas
     estado = models.CharField(max_length=20, choices=ESTADOS_DOCUMENTO, default='borrador')
     fecha_emision = models.DateTimeField(auto_now_add=True)
+    fecha_local = models.DateField(
+        default=timezone.localdate,
+        editable=False,
+        help_text="Fecha local (America/Asuncion) del día escolar, para filtrar por índice"
+    )
     fecha_vencimiento = models.DateField(blank=True, null=True)
     fecha_anulacion = models.DateTimeField(blank=True, null=True)
     
@@ -364,28 +501,16 @@ class Factura(models.Model):
         """Override para generar número y calcular montos"""
         if not self.numero_factura:
             # Importar aquí para evitar import circular
-            from facturacion.models import ConfiguracionFacturacion
-            
-            configuracion = ConfiguracionFacturacion.objects.first()
-            if not configuracion:
-                configuracion = ConfiguracionFacturacion.objects.create()
-            
-            if self.tipo_factura == 'boleta':
-                numero = configuracion.proximo_numero_boleta
-                self.numero_factura = f"BOL-{numero:06d}"
-                configuracion.proximo_numero_boleta += 1
-            else:
-                numero = configuracion.proximo_numero_factura  
-                self.numero_factura = f"FAC-{numero:06d}"
-                configuracion.proximo_numero_factura += 1
+            from facturacion.numeracion import siguiente_numero_factura
             
-            configuracion.save()
+            # Número del bloque reservado por el punto de venta de la venta
+            self.numero_factura = siguiente_numero_factura(self.venta.punto_venta_id)
         
         # Calcular montos
         if self.tipo_factura == 'factura_afecta':
             # Factura con IVA
-            from facturacion.models import ConfiguracionFacturacion
-            configuracion = ConfiguracionFacturacion.objects.first()
+            from ventas.referencias import configuracion_facturacion
+            configuracion = configuracion_facturacion()
             if configuracion:
                 iva_decimal = configuracion.iva_porcentaje / 100
                 self.subtotal_factura = self.venta.total / (1 + iva_decimal)
@@ -471,3 +596,41 @@ class Factura(models.Model):
         verbose_name = "Factura/Boleta"
         verbose_name_plural = "Facturas/Boletas"
         ordering = ['-fecha_emision']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_local'], name='factura_estado_fecha_idx'),
+        ]
+
+
+class ClaveIdempotencia(models.Model):
+    """
+    Resultado guardado de una operación del POS identificada por una clave
+    generada en el cliente. Un reintento con la misma clave recibe la misma
+    respuesta en lugar de procesar la venta otra vez.
+    """
+    ESTADO_CHOICES = [
+        ('en_proceso', 'En proceso'),
+        ('completada', 'Completada'),
+    ]
+    
+    clave = models.CharField(max_length=64, unique=True)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='claves_idempotencia'
+    )
+    ruta = models.CharField(max_length=200)
+    estado = models.CharField(max_length=15, choices=ESTADO_CHOICES, default='en_proceso')
+    
+    # Respuesta de la primera ejecución
+    codigo_respuesta = models.PositiveSmallIntegerField(null=True, blank=True)
+    respuesta = models.JSONField(null=True, blank=True)
+    
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_expiracion = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.clave} ({self.get_estado_display()})"
+    
+    class Meta:
+        verbose_name = "Clave de Idempotencia"
+        verbose_name_plural = "Claves de Idempotencia"
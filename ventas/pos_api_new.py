@@ -1,15 +1,105 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponseNotModified
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.db import models
 from usuarios.models import PerfilHijo
-from .models import Venta, DetalleVenta, PuntoVenta, PagoVenta, MetodoPago
+from usuarios.saldo import debitar_saldo, SaldoInsuficiente
+from usuarios.tarjetas import resolver_token, TokenInvalido, TarjetaRevocada
+from .models import Venta, DetalleVenta, PagoVenta, MetodoPago
+from .idempotencia import idempotente
+from . import referencias
+from .sincronizacion import registrar_ventas_sin_conexion, MAXIMO_VENTAS
 from productos.models import Producto
+from productos.stock import bloquear_productos, descontar_stock, StockInsuficiente
+from productos.catalogo import snapshot_catalogo, version_catalogo
+from productos.busqueda import indice_productos
+from cantina_tita.busqueda import filtro_texto
 from decimal import Decimal
 import json
 
+
+class VentaInvalida(Exception):
+    """Error de validación de una venta que se informa al POS"""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def _validar_items(items):
+    """
+    Valida los items del carrito y calcula el total.
+    Todos los productos se resuelven (y bloquean) en una sola consulta,
+    sin importar cuántas líneas tenga el carrito.
+    """
+    try:
+        lineas = [(int(item['producto_id']), int(item['cantidad'])) for item in items]
+    except (KeyError, TypeError, ValueError):
+        raise VentaInvalida('Items de venta inválidos')
+    
+    productos = bloquear_productos({producto_id for producto_id, _ in lineas})
+    
+    # Cantidad total pedida por producto (un producto puede repetirse en varias líneas)
+    cantidades = {}
+    for producto_id, cantidad in lineas:
+        if producto_id not in productos:
+            raise VentaInvalida('Producto no encontrado', status=404)
+        if cantidad <= 0:
+            raise VentaInvalida('Cantidad inválida')
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    
+    for producto_id, cantidad in cantidades.items():
+        producto = productos[producto_id]
+        if producto.requiere_stock and producto.stock_actual < cantidad:
+            raise VentaInvalida(
+                f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock_actual}'
+            )
+    
+    total_venta = Decimal('0')
+    items_validados = []
+    for producto_id, cantidad in lineas:
+        producto = productos[producto_id]
+        subtotal = producto.precio_venta * cantidad
+        total_venta += subtotal
+        
+        items_validados.append({
+            'producto': producto,
+            'cantidad': cantidad,
+            'precio_unitario': producto.precio_venta,
+            'costo_unitario': producto.precio_costo,
+            'subtotal': subtotal
+        })
+    
+    return items_validados, total_venta
+
+
+def _registrar_detalles(venta, items_validados):
+    """Crea los detalles de la venta y descuenta el stock en dos consultas"""
+    DetalleVenta.objects.bulk_create([
+        DetalleVenta(
+            venta=venta,
+            producto=item['producto'],
+            cantidad=item['cantidad'],
+            precio_unitario=item['precio_unitario'],
+            costo_unitario=item['costo_unitario'],
+            subtotal=item['subtotal']
+        )
+        for item in items_validados
+    ])
+    
+    descuentos = {}
+    for item in items_validados:
+        producto = item['producto']
+        if producto.requiere_stock:
+            descuentos[producto.id] = descuentos.get(producto.id, 0) + item['cantidad']
+    
+    try:
+        descontar_stock(descuentos)
+    except StockInsuficiente as e:
+        raise VentaInvalida(str(e))
+
+
 @csrf_exempt
 @login_required
 def buscar_tarjeta_ajax(request):
@@ -24,8 +114,7 @@ def buscar_tarjeta_ajax(request):
         try:
             # Buscar por número de tarjeta o nombre del hijo
             hijos = PerfilHijo.objects.select_related('padre').filter(
-                models.Q(numero_tarjeta__icontains=busqueda) |
-                models.Q(nombre_completo__icontains=busqueda),
+                filtro_texto(['numero_tarjeta', 'nombre_completo'], busqueda),
                 tarjeta_activa=True,
                 numero_tarjeta__isnull=False
             )[:10]  # Limitar a 10 resultados
@@ -88,6 +177,46 @@ def seleccionar_tarjeta_ajax(request):
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
+@csrf_exempt
+@login_required
+def tarjeta_por_token(request):
+    """
+    Identificar una tarjeta por el token firmado leído del QR o NFC.
+    La firma se verifica sin consultar la base y el hijo se trae por clave primaria.
+    """
+    if request.method == 'POST':
+        data = json.loads(request.body)
+        token = data.get('token', '').strip()
+        
+        if not token:
+            return JsonResponse({'error': 'Token requerido'}, status=400)
+        
+        try:
+            hijo = resolver_token(token, PerfilHijo.objects.select_related('padre'))
+            
+            return JsonResponse({
+                'success': True,
+                'tarjeta': {
+                    'id': hijo.id,
+                    'numeroTarjeta': hijo.numero_tarjeta,
+                    'nombreHijo': hijo.nombre_completo.upper(),
+                    'nombrePadre': hijo.padre.get_full_name() or hijo.padre.username,
+                    'saldoDisponible': float(hijo.saldo_virtual),
+                    'activa': hijo.tarjeta_activa
+                }
+            })
+            
+        except TokenInvalido as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except TarjetaRevocada as e:
+            return JsonResponse({'error': str(e)}, status=410)
+        except PerfilHijo.DoesNotExist:
+            return JsonResponse({'error': 'Tarjeta no encontrada'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': f'Error interno: {str(e)}'}, status=500)
+    
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
 @csrf_exempt
 @login_required
 def buscar_producto_ajax(request):
@@ -100,12 +229,8 @@ def buscar_producto_ajax(request):
             return JsonResponse({'success': True, 'productos': []})
         
         try:
-            # Buscar por código o nombre
-            productos = Producto.objects.filter(
-                models.Q(codigo__icontains=busqueda) |
-                models.Q(nombre__icontains=busqueda),
-                disponible=True
-            )[:15]  # Limitar a 15 resultados
+            # Buscar por código o nombre en el índice en memoria
+            productos = indice_productos.buscar(busqueda, limite=15)
             
             productos_list = []
             for producto in productos:
@@ -141,6 +266,28 @@ def buscar_producto_ajax(request):
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
+@login_required
+def catalogo_productos(request):
+    """Catálogo completo (o delta con ?desde=<versión>) para la búsqueda local del POS"""
+    if request.method == 'GET':
+        try:
+            # Si el cliente ya tiene la versión actual no se arma el catálogo
+            etag = f'"{version_catalogo()}"'
+            if request.headers.get('If-None-Match') == etag:
+                response = HttpResponseNotModified()
+            else:
+                catalogo = snapshot_catalogo(desde=request.GET.get('desde'))
+                response = JsonResponse({'success': True, **catalogo})
+                etag = f'"{catalogo["version"]}"'
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+            
+        except Exception as e:
+            return JsonResponse({'error': f'Error interno: {str(e)}'}, status=500)
+    
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
 @csrf_exempt
 @login_required
 def seleccionar_producto_ajax(request):
@@ -179,6 +326,7 @@ def seleccionar_producto_ajax(request):
 
 @csrf_exempt
 @login_required
+@idempotente
 def procesar_venta_saldo_virtual(request):
     """Procesar venta únicamente con saldo virtual"""
     if request.method == 'POST':
@@ -192,40 +340,14 @@ def procesar_venta_saldo_virtual(request):
                 if not hijo_id or not items:
                     return JsonResponse({'error': 'Datos incompletos'}, status=400)
                 
-                # Obtener hijo y validar saldo
+                # Obtener hijo
                 hijo = get_object_or_404(PerfilHijo, id=hijo_id)
                 
                 # Calcular total y validar stock
-                total_venta = Decimal('0')
-                items_validados = []
-                
-                for item in items:
-                    producto = get_object_or_404(Producto, id=item['producto_id'])
-                    cantidad = int(item['cantidad'])
-                    
-                    if producto.requiere_stock and producto.stock_actual < cantidad:
-                        return JsonResponse({
-                            'error': f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock_actual}'
-                        }, status=400)
-                    
-                    subtotal = producto.precio_venta * cantidad
-                    total_venta += subtotal
-                    
-                    items_validados.append({
-                        'producto': producto,
-                        'cantidad': cantidad,
-                        'precio_unitario': producto.precio_venta,
-                        'subtotal': subtotal
-                    })
-                
-                # Validar saldo suficiente
-                if hijo.saldo_virtual < total_venta:
-                    return JsonResponse({
-                        'error': f'Saldo insuficiente. Disponible: {hijo.saldo_virtual}, Requerido: {total_venta}'
-                    }, status=400)
-                
-                # Obtener punto de venta
-                punto_venta = PuntoVenta.objects.filter(activo=True).first()
+                items_validados, total_venta = _validar_items(items)
+                
+                # Obtener punto de venta (caché de referencias)
+                punto_venta = referencias.punto_venta_activo()
                 if not punto_venta:
                     return JsonResponse({'error': 'No hay puntos de venta activos'}, status=500)
                 
@@ -240,22 +362,10 @@ def procesar_venta_saldo_virtual(request):
                 )
                 
                 # Crear detalles y actualizar stock
-                for item in items_validados:
-                    DetalleVenta.objects.create(
-                        venta=venta,
-                        producto=item['producto'],
-                        cantidad=item['cantidad'],
-                        precio_unitario=item['precio_unitario'],
-                        subtotal=item['subtotal']
-                    )
-                    
-                    # Actualizar stock
-                    if item['producto'].requiere_stock:
-                        item['producto'].stock_actual -= item['cantidad']
-                        item['producto'].save()
+                _registrar_detalles(venta, items_validados)
                 
                 # Registrar pago con saldo virtual
-                metodo_saldo = MetodoPago.objects.filter(codigo='saldo_virtual').first()
+                metodo_saldo = referencias.metodo_pago('saldo_virtual')
                 if not metodo_saldo:
                     # Crear el método de pago saldo virtual si no existe
                     metodo_saldo = MetodoPago.objects.create(
@@ -271,9 +381,18 @@ def procesar_venta_saldo_virtual(request):
                     monto=total_venta
                 )
                 
-                # Descontar saldo
-                hijo.saldo_virtual -= total_venta
-                hijo.save()
+                # Descontar saldo (el débito valida el saldo disponible)
+                try:
+                    debitar_saldo(
+                        hijo,
+                        total_venta,
+                        realizada_por=request.user,
+                        punto_venta=punto_venta.codigo,
+                        venta=venta,
+                        observaciones=f'Compra en POS - Venta #{venta.numero_venta}'
+                    )
+                except SaldoInsuficiente as e:
+                    raise VentaInvalida(str(e))
                 
                 return JsonResponse({
                     'success': True,
@@ -282,6 +401,8 @@ def procesar_venta_saldo_virtual(request):
                     'nuevo_saldo': float(hijo.saldo_virtual)
                 })
                 
+        except VentaInvalida as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
         except Exception as e:
             return JsonResponse({'error': f'Error procesando venta: {str(e)}'}, status=500)
     
@@ -289,6 +410,7 @@ def procesar_venta_saldo_virtual(request):
 
 @csrf_exempt
 @login_required
+@idempotente
 def procesar_venta_mixta(request):
     """Procesar venta con saldo virtual + otro método de pago"""
     if request.method == 'POST':
@@ -308,27 +430,7 @@ def procesar_venta_mixta(request):
                 hijo = get_object_or_404(PerfilHijo, id=hijo_id)
                 
                 # Calcular total y validar stock
-                total_venta = Decimal('0')
-                items_validados = []
-                
-                for item in items:
-                    producto = get_object_or_404(Producto, id=item['producto_id'])
-                    cantidad = int(item['cantidad'])
-                    
-                    if producto.requiere_stock and producto.stock_actual < cantidad:
-                        return JsonResponse({
-                            'error': f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock_actual}'
-                        }, status=400)
-                    
-                    subtotal = producto.precio_venta * cantidad
-                    total_venta += subtotal
-                    
-                    items_validados.append({
-                        'producto': producto,
-                        'cantidad': cantidad,
-                        'precio_unitario': producto.precio_venta,
-                        'subtotal': subtotal
-                    })
+                items_validados, total_venta = _validar_items(items)
                 
                 # Validar montos
                 monto_saldo_virtual = hijo.saldo_virtual
@@ -343,8 +445,8 @@ def procesar_venta_mixta(request):
                 elif monto_saldo_virtual + monto_adicional != total_venta:
                     return JsonResponse({'error': 'Los montos no coinciden con el total'}, status=400)
                 
-                # Obtener punto de venta
-                punto_venta = PuntoVenta.objects.filter(activo=True).first()
+                # Obtener punto de venta (caché de referencias)
+                punto_venta = referencias.punto_venta_activo()
                 if not punto_venta:
                     return JsonResponse({'error': 'No hay puntos de venta activos'}, status=500)
                 
@@ -359,22 +461,10 @@ def procesar_venta_mixta(request):
                 )
                 
                 # Crear detalles y actualizar stock
-                for item in items_validados:
-                    DetalleVenta.objects.create(
-                        venta=venta,
-                        producto=item['producto'],
-                        cantidad=item['cantidad'],
-                        precio_unitario=item['precio_unitario'],
-                        subtotal=item['subtotal']
-                    )
-                    
-                    # Actualizar stock
-                    if item['producto'].requiere_stock:
-                        item['producto'].stock_actual -= item['cantidad']
-                        item['producto'].save()
+                _registrar_detalles(venta, items_validados)
                 
                 # Registrar pago con saldo virtual
-                metodo_saldo = MetodoPago.objects.filter(codigo='saldo_virtual').first()
+                metodo_saldo = referencias.metodo_pago('saldo_virtual')
                 if not metodo_saldo:
                     # Crear el método de pago saldo virtual si no existe
                     metodo_saldo = MetodoPago.objects.create(
@@ -391,9 +481,9 @@ def procesar_venta_mixta(request):
                 )
                 
                 # Registrar pago adicional
-                metodo_adicional = MetodoPago.objects.filter(codigo=forma_pago_adicional).first()
+                metodo_adicional = referencias.metodo_pago(forma_pago_adicional)
                 if not metodo_adicional:
-                    return JsonResponse({'error': f'Método de pago no válido: {forma_pago_adicional}'}, status=400)
+                    raise VentaInvalida(f'Método de pago no válido: {forma_pago_adicional}')
                 
                 PagoVenta.objects.create(
                     venta=venta,
@@ -402,8 +492,18 @@ def procesar_venta_mixta(request):
                 )
                 
                 # Usar todo el saldo disponible
-                hijo.saldo_virtual = Decimal('0')
-                hijo.save()
+                if monto_saldo_virtual > 0:
+                    try:
+                        debitar_saldo(
+                            hijo,
+                            monto_saldo_virtual,
+                            realizada_por=request.user,
+                            punto_venta=punto_venta.codigo,
+                            venta=venta,
+                            observaciones=f'Pago mixto en POS - Venta #{venta.numero_venta}'
+                        )
+                    except SaldoInsuficiente:
+                        raise VentaInvalida('El saldo de la tarjeta cambió durante la venta. Intente nuevamente.')
                 
                 response_data = {
                     'success': True,
@@ -421,6 +521,8 @@ def procesar_venta_mixta(request):
                 
                 return JsonResponse(response_data)
                 
+        except VentaInvalida as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
         except Exception as e:
             return JsonResponse({'error': f'Error procesando venta mixta: {str(e)}'}, status=500)
     
@@ -428,6 +530,7 @@ def procesar_venta_mixta(request):
 
 @csrf_exempt
 @login_required
+@idempotente
 def procesar_venta_efectivo(request):
     """Procesar venta únicamente en efectivo con cálculo de vuelto"""
     if request.method == 'POST':
@@ -446,27 +549,7 @@ def procesar_venta_efectivo(request):
                 hijo = get_object_or_404(PerfilHijo, id=hijo_id)
                 
                 # Calcular total y validar stock
-                total_venta = Decimal('0')
-                items_validados = []
-                
-                for item in items:
-                    producto = get_object_or_404(Producto, id=item['producto_id'])
-                    cantidad = int(item['cantidad'])
-                    
-                    if producto.requiere_stock and producto.stock_actual < cantidad:
-                        return JsonResponse({
-                            'error': f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock_actual}'
-                        }, status=400)
-                    
-                    subtotal = producto.precio_venta * cantidad
-                    total_venta += subtotal
-                    
-                    items_validados.append({
-                        'producto': producto,
-                        'cantidad': cantidad,
-                        'precio_unitario': producto.precio_venta,
-                        'subtotal': subtotal
-                    })
+                items_validados, total_venta = _validar_items(items)
                 
                 # Validar monto efectivo
                 if monto_efectivo_recibido < total_venta:
@@ -474,8 +557,8 @@ def procesar_venta_efectivo(request):
                 
                 vuelto = monto_efectivo_recibido - total_venta
                 
-                # Obtener punto de venta
-                punto_venta = PuntoVenta.objects.filter(activo=True).first()
+                # Obtener punto de venta (caché de referencias)
+                punto_venta = referencias.punto_venta_activo()
                 if not punto_venta:
                     return JsonResponse({'error': 'No hay puntos de venta activos'}, status=500)
                 
@@ -494,22 +577,10 @@ def procesar_venta_efectivo(request):
                 )
                 
                 # Crear detalles y actualizar stock
-                for item in items_validados:
-                    DetalleVenta.objects.create(
-                        venta=venta,
-                        producto=item['producto'],
-                        cantidad=item['cantidad'],
-                        precio_unitario=item['precio_unitario'],
-                        subtotal=item['subtotal']
-                    )
-                    
-                    # Actualizar stock
-                    if item['producto'].requiere_stock:
-                        item['producto'].stock_actual -= item['cantidad']
-                        item['producto'].save()
+                _registrar_detalles(venta, items_validados)
                 
                 # Registrar pago en efectivo
-                metodo_efectivo = MetodoPago.objects.filter(codigo='efectivo').first()
+                metodo_efectivo = referencias.metodo_pago('efectivo')
                 if not metodo_efectivo:
                     # Crear el método de pago efectivo si no existe
                     metodo_efectivo = MetodoPago.objects.create(
@@ -539,7 +610,45 @@ def procesar_venta_efectivo(request):
                 
                 return JsonResponse(response_data)
                 
+        except VentaInvalida as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
         except Exception as e:
             return JsonResponse({'error': f'Error procesando venta: {str(e)}'}, status=500)
     
-    return JsonResponse({'error': 'Método no permitido'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+@csrf_exempt
+@login_required
+def sincronizar_ventas(request):
+    """Registrar las ventas que el POS encoló mientras estuvo sin conexión"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            ventas = data.get('ventas')
+            
+            if not isinstance(ventas, list) or not ventas:
+                return JsonResponse({'error': 'Datos incompletos'}, status=400)
+            if len(ventas) > MAXIMO_VENTAS:
+                return JsonResponse({'error': f'Máximo {MAXIMO_VENTAS} ventas por envío'}, status=400)
+            
+            # Punto de venta de la terminal
+            punto_venta = referencias.punto_venta_activo(data.get('punto_venta') or None)
+            if not punto_venta:
+                return JsonResponse({'error': 'Punto de venta no encontrado'}, status=404)
+            
+            resultados = registrar_ventas_sin_conexion(ventas, punto_venta, request.user, ruta=request.path)
+            
+            return JsonResponse({
+                'success': True,
+                'resultados': resultados,
+                'aceptadas': sum(1 for r in resultados if r['estado'] == 'aceptada'),
+                'rechazadas': sum(1 for r in resultados if r['estado'] == 'rechazada'),
+                'pendientes': sum(1 for r in resultados if r['estado'] == 'pendiente'),
+            })
+            
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Formato de datos inválido'}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': f'Error sincronizando ventas: {str(e)}'}, status=500)
+    
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
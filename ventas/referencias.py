@@ -0,0 +1,117 @@
+"""
+Caché de las tablas de referencia del POS
+
+Métodos de pago, puntos de venta y la configuración de facturación se leen en
+cada venta pero casi nunca cambian. Se cargan juntos en una sola instantánea
+que se guarda en el caché de Django bajo una clave versionada
+(``referencias:<versión>``) y, además, en memoria del proceso.
+
+Cada consulta sólo lee la versión vigente del caché compartido: si coincide
+con la del proceso se usa la copia en memoria, sin tocar la base. Al guardar o
+borrar cualquiera de esas filas las señales aumentan la versión, con lo que
+todos los workers (que comparten el backend de caché) recargan la instantánea
+en su próxima consulta. Los servidores con cachés separados se enteran por el
+bus de invalidación, que descarta la copia en memoria.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CLAVE_VERSION = 'referencias:version'
+
+# Las instantáneas viejas se descartan solas
+DURACION = 24 * 60 * 60
+
+# (versión, datos) de la instantánea que tiene este proceso
+_memoria = (None, None)
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Valor inicial distinto después de vaciar el caché, para no confundir
+        # una versión nueva con la que tiene un proceso en memoria
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def _cargar():
+    from facturacion.models import ConfiguracionFacturacion
+    from .models import MetodoPago, PuntoVenta
+
+    return {
+        'metodos_pago': {metodo.codigo: metodo for metodo in MetodoPago.objects.all()},
+        'puntos_venta': list(PuntoVenta.objects.filter(activo=True)),
+        'configuracion': ConfiguracionFacturacion.objects.first(),
+    }
+
+
+def referencias():
+    """Instantánea vigente de las tablas de referencia"""
+    global _memoria
+    version = _version()
+    if _memoria[0] == version:
+        return _memoria[1]
+
+    clave = f'referencias:{version}'
+    datos = cache.get(clave)
+    if datos is None:
+        datos = _cargar()
+        cache.set(clave, datos, DURACION)
+
+    _memoria = (version, datos)
+    return datos
+
+
+def _aumentar_version():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        # La clave no existe (caché vacío): la próxima lectura crea una versión nueva
+        pass
+
+
+def invalidar():
+    """Fuerza la recarga en todos los procesos"""
+    _aumentar_version()
+    # Otra vez al confirmar: un proceso pudo recargar los datos anteriores
+    # entre el cambio y el commit
+    transaction.on_commit(_aumentar_version)
+
+
+def olvidar_local(ids=None):
+    """
+    Descarta la instantánea de este servidor (aviso del bus de invalidación):
+    la copia en memoria y la guardada en su caché
+    """
+    global _memoria
+    _memoria = (None, None)
+    _aumentar_version()
+
+
+def metodo_pago(codigo, solo_activos=False):
+    """MetodoPago con ese código, o None"""
+    metodo = referencias()['metodos_pago'].get(codigo)
+    if metodo is not None and solo_activos and not metodo.activo:
+        return None
+    return metodo
+
+
+def metodos_pago_activos():
+    """Dict código -> MetodoPago de los métodos activos"""
+    return {codigo: metodo for codigo, metodo in referencias()['metodos_pago'].items() if metodo.activo}
+
+
+def punto_venta_activo(codigo=None):
+    """Primer punto de venta activo (o el activo con ese código), o None"""
+    for punto in referencias()['puntos_venta']:
+        if codigo is None or punto.codigo == codigo:
+            return punto
+    return None
+
+
+def configuracion_facturacion():
+    """ConfiguracionFacturacion vigente, o None si no fue creada"""
+    return referencias()['configuracion']
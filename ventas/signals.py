@@ -0,0 +1,26 @@
+"""
+Señales de ventas: invalidan el caché de las tablas de referencia (también en
+los demás servidores, por el bus de invalidación)
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from cantina_tita import invalidacion
+from facturacion.models import ConfiguracionFacturacion
+from . import referencias
+from .models import MetodoPago, PuntoVenta
+
+
+@receiver(post_save, sender=MetodoPago, dispatch_uid='referencias_metodo_pago_guardado')
+@receiver(post_delete, sender=MetodoPago, dispatch_uid='referencias_metodo_pago_borrado')
+@receiver(post_save, sender=PuntoVenta, dispatch_uid='referencias_punto_venta_guardado')
+@receiver(post_delete, sender=PuntoVenta, dispatch_uid='referencias_punto_venta_borrado')
+@receiver(post_save, sender=ConfiguracionFacturacion, dispatch_uid='referencias_configuracion_guardada')
+@receiver(post_delete, sender=ConfiguracionFacturacion, dispatch_uid='referencias_configuracion_borrada')
+def invalidar_referencias(sender, instance, **kwargs):
+    referencias.invalidar()
+    invalidacion.publicar(sender._meta.label_lower, [instance.pk])
+
+
+for _etiqueta in ('ventas.metodopago', 'ventas.puntoventa', 'facturacion.configuracionfacturacion'):
+    invalidacion.suscribir(_etiqueta, referencias.olvidar_local)
@@ -0,0 +1,399 @@
+"""
+Sincronización de ventas registradas sin conexión en el POS
+
+Cuando la red o el servidor no responden, la terminal sigue vendiendo y
+encola las ventas localmente. Al recuperar la conexión envía la cola completa,
+en orden, y este módulo la registra por lotes:
+
+1. Productos y tarjetas del lote se bloquean con una consulta cada uno.
+2. Cada venta se valida en memoria contra el stock y el saldo que van
+   quedando, en el orden en que se hicieron; las que no pasan se rechazan
+   con su motivo sin afectar al resto.
+3. Ventas, detalles, pagos, débitos de saldo y descuentos de stock de las
+   ventas aceptadas se escriben con inserciones y UPDATEs por conjunto.
+
+Cada venta trae un ``id_local`` generado en la terminal que se guarda como
+clave de idempotencia: reenviar la cola (o una venta que sí llegó antes de
+que se cortara la conexión) no la registra dos veces. Si la clave todavía
+está "en proceso" (el cobro en línea con esa clave sigue corriendo) la venta
+queda 'pendiente' y el POS la reenvía más tarde; las claves vencidas o
+abandonadas se retoman como en ``idempotencia._reclamar_clave``.
+
+Cada venta se registra con la fecha en que se hizo en el POS (``fecha_local``),
+no con la de la sincronización: reportes, resumen diario y comisiones la
+cuentan en su día. Se rechazan las fechas futuras y las de hace más de
+``DIAS_VENTAS_SIN_CONEXION`` días.
+"""
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from cantina_tita.cache import invalidar_modelo
+from productos.stock import bloquear_productos, descontar_stock, StockInsuficiente
+from reportes.resumen import registrar_ventas_pagadas
+from usuarios.models import PerfilHijo
+from usuarios.saldo import debitar_saldos_en_lote, SaldoInsuficiente
+from .idempotencia import ABANDONO
+from .models import Venta, DetalleVenta, PagoVenta, SecuenciaVenta, ClaveIdempotencia
+from .referencias import metodos_pago_activos
+
+TAMANO_LOTE = 100
+MAXIMO_VENTAS = 1000
+
+
+class _VentaRechazada(Exception):
+    pass
+
+
+def _decimal(valor):
+    try:
+        return Decimal(str(valor))
+    except (InvalidOperation, TypeError, ValueError):
+        raise _VentaRechazada('Monto inválido')
+
+
+def _fecha_local(valor, hoy):
+    """
+    Día (hora local) de una venta según la fecha que envía el POS: fecha y
+    hora ISO 8601 (con zona o local) o sólo la fecha. Sin fecha, hoy.
+    """
+    if not valor:
+        return hoy
+    try:
+        momento = parse_datetime(str(valor))
+        fecha = parse_date(str(valor)) if momento is None else None
+    except ValueError:
+        raise _VentaRechazada('Fecha de la venta inválida')
+    if momento is not None:
+        if timezone.is_naive(momento):
+            momento = timezone.make_aware(momento)
+        fecha = timezone.localdate(momento)
+    if fecha is None:
+        raise _VentaRechazada('Fecha de la venta inválida')
+
+    if fecha > hoy:
+        raise _VentaRechazada('La fecha de la venta es posterior a hoy')
+    dias = settings.CANTINA_CONFIG.get('DIAS_VENTAS_SIN_CONEXION', 7)
+    if fecha < hoy - timedelta(days=dias):
+        raise _VentaRechazada(f'La venta tiene más de {dias} días y no se puede registrar')
+    return fecha
+
+
+def _forma_valida(venta):
+    """Si la venta tiene la forma esperada (items y pagos como listas de objetos)"""
+    items = venta.get('items')
+    pagos = venta.get('pagos', [])
+    return (
+        isinstance(items, list) and all(isinstance(item, dict) for item in items)
+        and isinstance(pagos, list) and all(isinstance(pago, dict) for pago in pagos)
+    )
+
+
+def _resultado_pendiente(id_local):
+    return {
+        'id_local': id_local,
+        'estado': 'pendiente',
+        'error': 'La venta se está procesando. Reintente en unos segundos.',
+    }
+
+
+def _resultado_guardado(clave):
+    respuesta = clave.respuesta or {}
+    return {
+        'id_local': clave.clave,
+        'estado': 'duplicada',
+        'venta_id': respuesta.get('venta_id'),
+        'numero_venta': respuesta.get('numero_venta'),
+    }
+
+
+class _Lote:
+    """Estado en memoria de un lote mientras se validan sus ventas"""
+
+    def __init__(self, ventas):
+        producto_ids = set()
+        hijo_ids = set()
+        for venta in ventas:
+            for item in venta.get('items') or []:
+                if isinstance(item, dict) and str(item.get('producto_id', '')).isdigit():
+                    producto_ids.add(int(item['producto_id']))
+            if str(venta.get('hijo_id') or '').isdigit():
+                hijo_ids.add(int(venta['hijo_id']))
+
+        self.productos = bloquear_productos(producto_ids)
+        self.hijos = {
+            hijo.pk: hijo
+            for hijo in PerfilHijo.objects.select_for_update().filter(pk__in=hijo_ids).order_by('pk')
+        }
+        self.metodos = metodos_pago_activos()
+        self.hoy = timezone.localdate()
+
+        # Stock y saldo que van quedando a medida que se aceptan ventas
+        self.stock = {producto_id: producto.stock_actual for producto_id, producto in self.productos.items()}
+        self.saldo = {hijo_id: hijo.saldo_disponible for hijo_id, hijo in self.hijos.items()}
+
+    def validar(self, datos):
+        """
+        Valida una venta contra el estado del lote y, si es válida, la aplica
+        en memoria. Retorna (hijo, lineas, pagos, total, fecha).
+        """
+        fecha = _fecha_local(datos.get('fecha_local'), self.hoy)
+
+        hijo = None
+        if datos.get('hijo_id'):
+            hijo = self.hijos.get(int(datos['hijo_id'])) if str(datos['hijo_id']).isdigit() else None
+            if hijo is None:
+                raise _VentaRechazada('Tarjeta no encontrada')
+
+        items = datos.get('items') or []
+        if not items:
+            raise _VentaRechazada('La venta no tiene items')
+
+        lineas = []
+        cantidades = {}
+        total = Decimal('0')
+        for item in items:
+            try:
+                producto = self.productos.get(int(item['producto_id']))
+                cantidad = int(item['cantidad'])
+            except (KeyError, TypeError, ValueError):
+                raise _VentaRechazada('Items de venta inválidos')
+            if producto is None:
+                raise _VentaRechazada('Producto no encontrado')
+            if cantidad <= 0:
+                raise _VentaRechazada('Cantidad inválida')
+            lineas.append((producto, cantidad))
+            cantidades[producto.id] = cantidades.get(producto.id, 0) + cantidad
+            total += producto.precio_venta * cantidad
+
+        for producto_id, cantidad in cantidades.items():
+            producto = self.productos[producto_id]
+            if producto.requiere_stock and self.stock[producto_id] < cantidad:
+                raise _VentaRechazada(
+                    f'Stock insuficiente para {producto.nombre}. Disponible: {self.stock[producto_id]}'
+                )
+
+        pagos = []
+        for pago in datos.get('pagos') or []:
+            metodo = self.metodos.get(pago.get('metodo_pago')) if isinstance(pago, dict) else None
+            if metodo is None:
+                raise _VentaRechazada('Método de pago no válido')
+            monto = _decimal(pago.get('monto'))
+            if monto <= 0:
+                raise _VentaRechazada('Monto inválido')
+            pagos.append((metodo, monto))
+
+        if sum(monto for _, monto in pagos) != total:
+            raise _VentaRechazada(f'Los pagos no coinciden con el total de la venta (Gs. {total:,.0f})')
+
+        monto_saldo = sum(monto for metodo, monto in pagos if metodo.codigo == 'saldo_virtual')
+        if monto_saldo:
+            if hijo is None:
+                raise _VentaRechazada('El pago con saldo virtual requiere una tarjeta')
+            if self.saldo[hijo.pk] < monto_saldo:
+                raise _VentaRechazada(
+                    f'Saldo insuficiente. Disponible: {self.saldo[hijo.pk]}, Requerido: {monto_saldo}'
+                )
+
+        # Aceptada: aplicar en memoria para las ventas siguientes del lote
+        for producto_id, cantidad in cantidades.items():
+            self.stock[producto_id] -= cantidad
+        if monto_saldo:
+            self.saldo[hijo.pk] -= monto_saldo
+
+        return hijo, lineas, pagos, total, fecha
+
+
+def _registrar_lote(ventas, punto_venta, cajero, ruta):
+    """
+    Valida y registra un lote de ventas en una sola transacción.
+    Retorna la lista de resultados en el orden recibido.
+
+    Lanza IntegrityError si otra petición registró al mismo tiempo la clave
+    de alguna venta del lote (nada del lote queda guardado).
+    """
+    resultados = [None] * len(ventas)
+    aceptadas = []
+
+    with transaction.atomic():
+        lote = _Lote(ventas)
+
+        for posicion, datos in enumerate(ventas):
+            try:
+                aceptadas.append((posicion, datos, lote.validar(datos)))
+            except _VentaRechazada as e:
+                resultados[posicion] = {'id_local': datos['id_local'], 'estado': 'rechazada', 'error': str(e)}
+
+        if not aceptadas:
+            return resultados
+
+        # Numeración: una reserva por día de venta para todo el lote
+        por_fecha = {}
+        for _, _, (_, _, _, _, fecha) in aceptadas:
+            por_fecha[fecha] = por_fecha.get(fecha, 0) + 1
+        numeros = {
+            fecha: iter(SecuenciaVenta.reservar(punto_venta.id, fecha, cantidad=cantidad))
+            for fecha, cantidad in sorted(por_fecha.items())
+        }
+
+        nuevas = []
+        for _, datos, (hijo, _, _, total, fecha) in aceptadas:
+            observaciones = 'Venta registrada sin conexión'
+            if datos.get('fecha_local'):
+                observaciones += f' - Hora en el POS: {datos["fecha_local"]}'
+            nuevas.append(Venta(
+                numero_venta=SecuenciaVenta.formatear(punto_venta.id, fecha, next(numeros[fecha])),
+                punto_venta=punto_venta,
+                cajero=cajero,
+                hijo=hijo,
+                subtotal=total,
+                total=total,
+                estado='pagada',
+                fecha_local=fecha,
+                observaciones=observaciones
+            ))
+        Venta.objects.bulk_create(nuevas)
+
+        detalles = []
+        pagos_venta = []
+        debitos = []
+        descuentos = {}
+        for venta, (_, _, (hijo, lineas, pagos, _, _)) in zip(nuevas, aceptadas):
+            for producto, cantidad in lineas:
+                detalles.append(DetalleVenta(
+                    venta=venta,
+                    producto=producto,
+                    cantidad=cantidad,
+                    precio_unitario=producto.precio_venta,
+                    costo_unitario=producto.precio_costo,
+                    subtotal=producto.precio_venta * cantidad
+                ))
+                if producto.requiere_stock:
+                    descuentos[producto.id] = descuentos.get(producto.id, 0) + cantidad
+            for metodo, monto in pagos:
+                comision = Decimal('0')
+                if metodo.tiene_comision:
+                    comision = monto * (metodo.porcentaje_comision / 100)
+                pagos_venta.append(PagoVenta(
+                    venta=venta, metodo_pago=metodo, monto=monto, comision=comision, fecha_local=venta.fecha_local
+                ))
+                if metodo.codigo == 'saldo_virtual':
+                    debitos.append((hijo, monto, venta, f'Venta sin conexión - Venta #{venta.numero_venta}'))
+
+        DetalleVenta.objects.bulk_create(detalles)
+        PagoVenta.objects.bulk_create(pagos_venta)
+        # bulk_create no dispara señales: encolar el alta en el resumen diario
+        # e invalidar los cálculos cacheados que dependen de las ventas
+        registrar_ventas_pagadas(nuevas)
+        invalidar_modelo(Venta)
+        descontar_stock(descuentos)
+        debitar_saldos_en_lote(debitos, realizada_por=cajero, punto_venta=punto_venta.codigo)
+
+        expiracion = timezone.now() + timedelta(hours=settings.CANTINA_CONFIG.get('IDEMPOTENCY_TTL_HOURS', 24))
+        claves = []
+        for venta, (posicion, datos, _) in zip(nuevas, aceptadas):
+            resultado = {
+                'id_local': datos['id_local'],
+                'estado': 'aceptada',
+                'venta_id': venta.id,
+                'numero_venta': venta.numero_venta,
+            }
+            resultados[posicion] = resultado
+            claves.append(ClaveIdempotencia(
+                clave=datos['id_local'],
+                usuario=cajero,
+                ruta=ruta,
+                estado='completada',
+                codigo_respuesta=200,
+                respuesta=resultado,
+                fecha_expiracion=expiracion
+            ))
+        ClaveIdempotencia.objects.bulk_create(claves)
+
+    return resultados
+
+
+def _claves_existentes(claves):
+    """
+    Claves del lote ya registradas que bloquean su venta. Las vencidas y las
+    "en proceso" abandonadas se eliminan: su venta nunca se confirmó (la
+    respuesta se guarda en la misma transacción que la venta) y se retoman.
+
+    Returns:
+        dict {clave: ClaveIdempotencia} de las completadas y en proceso vigentes
+    """
+    ahora = timezone.now()
+    ClaveIdempotencia.objects.filter(clave__in=claves).filter(
+        models.Q(fecha_expiracion__lte=ahora)
+        | models.Q(estado='en_proceso', fecha_creacion__lt=ahora - ABANDONO)
+    ).delete()
+    return {clave.clave: clave for clave in ClaveIdempotencia.objects.filter(clave__in=claves)}
+
+
+def registrar_ventas_sin_conexion(ventas, punto_venta, cajero, ruta=''):
+    """
+    Registra una cola de ventas hechas sin conexión.
+
+    Args:
+        ventas: lista ordenada de dicts con ``id_local``, ``items``
+            (producto_id, cantidad), ``pagos`` (metodo_pago, monto) y
+            opcionalmente ``hijo_id`` y ``fecha_local`` (fecha y hora de la
+            venta en el POS)
+        punto_venta: PuntoVenta de la terminal
+        cajero: usuario que sincroniza
+        ruta: ruta de la petición (se guarda con las claves de idempotencia)
+
+    Returns:
+        Lista de resultados, uno por venta y en el mismo orden, con
+        ``estado`` 'aceptada', 'rechazada', 'duplicada' o 'pendiente' (la
+        clave está en uso por otra petición: reenviar más tarde)
+    """
+    resultados = [None] * len(ventas)
+    largo_clave = ClaveIdempotencia._meta.get_field('clave').max_length
+
+    # Ventas ya registradas (reenvíos o ventas que llegaron antes del corte)
+    claves = [str(venta.get('id_local') or '') for venta in ventas if isinstance(venta, dict)]
+    registradas = _claves_existentes(claves)
+
+    pendientes = []
+    vistas = set()
+    for posicion, venta in enumerate(ventas):
+        id_local = str(venta.get('id_local') or '') if isinstance(venta, dict) else ''
+        if not id_local or len(id_local) > largo_clave:
+            resultados[posicion] = {'id_local': id_local, 'estado': 'rechazada', 'error': 'id_local inválido'}
+        elif id_local in registradas and registradas[id_local].estado == 'completada':
+            resultados[posicion] = _resultado_guardado(registradas[id_local])
+        elif id_local in registradas:
+            resultados[posicion] = _resultado_pendiente(id_local)
+        elif not _forma_valida(venta):
+            resultados[posicion] = {'id_local': id_local, 'estado': 'rechazada', 'error': 'Formato de venta inválido'}
+        elif id_local in vistas:
+            resultados[posicion] = {'id_local': id_local, 'estado': 'duplicada'}
+        else:
+            vistas.add(id_local)
+            pendientes.append((posicion, dict(venta, id_local=id_local)))
+
+    for inicio in range(0, len(pendientes), TAMANO_LOTE):
+        lote = pendientes[inicio:inicio + TAMANO_LOTE]
+        try:
+            parciales = _registrar_lote([venta for _, venta in lote], punto_venta, cajero, ruta)
+        except (StockInsuficiente, SaldoInsuficiente, IntegrityError):
+            # Otra caja modificó stock o saldo fuera del bloqueo, u otra
+            # petición tomó la clave de alguna venta: registrar de a una
+            parciales = []
+            for _, venta in lote:
+                try:
+                    parciales += _registrar_lote([venta], punto_venta, cajero, ruta)
+                except (StockInsuficiente, SaldoInsuficiente) as e:
+                    parciales.append({'id_local': venta['id_local'], 'estado': 'rechazada', 'error': str(e)})
+                except IntegrityError:
+                    parciales.append(_resultado_pendiente(venta['id_local']))
+
+        for (posicion, _), resultado in zip(lote, parciales):
+            resultados[posicion] = resultado
+
+    return resultados
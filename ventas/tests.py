@@ -1,3 +1,504 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from productos.models import Categoria, Producto
+from usuarios.models import Usuario, PerfilHijo, TransaccionTarjeta
+from .idempotencia import purgar_claves_vencidas
+from . import referencias
+from .models import Venta, DetalleVenta, PagoVenta, PuntoVenta, MetodoPago, SecuenciaVenta, ClaveIdempotencia
+
+
+class POSTestMixin:
+    """Datos mínimos para probar los endpoints del POS"""
+
+    def crear_datos_pos(self):
+        cache.clear()
+        self.cajero = Usuario.objects.create_user(
+            username='cajero', password='clave-cajero', tipo_usuario='cajero'
+        )
+        self.padre = Usuario.objects.create_user(
+            username='padre', password='clave-padre', tipo_usuario='padre'
+        )
+        self.hijo = PerfilHijo.objects.create(
+            padre=self.padre,
+            nombre_completo='Juan Pérez',
+            numero_tarjeta='5555000000000001',
+            tarjeta_activa=True,
+            saldo_virtual=Decimal('1000000'),
+        )
+        self.punto_venta = PuntoVenta.objects.create(nombre='Caja 1', codigo='CAJA1')
+        MetodoPago.objects.create(codigo='saldo_virtual', nombre='Saldo Virtual', genera_factura=False)
+        MetodoPago.objects.create(codigo='efectivo', nombre='Efectivo')
+        categoria = Categoria.objects.create(nombre='Snacks')
+        self.productos = [
+            Producto.objects.create(
+                categoria=categoria,
+                codigo=f'P{i:03d}',
+                nombre=f'Producto {i}',
+                precio_costo=Decimal('2000'),
+                precio_venta=Decimal('3000'),
+                stock_actual=100,
+            )
+            for i in range(8)
+        ]
+        self.client.force_login(self.cajero)
+
+    def items(self, cantidad_lineas):
+        return [
+            {'producto_id': producto.id, 'cantidad': 2}
+            for producto in self.productos[:cantidad_lineas]
+        ]
+
+    def post_json(self, nombre_url, data, **extra):
+        return self.client.post(
+            reverse(nombre_url), data=json.dumps(data), content_type='application/json', **extra
+        )
+
+
+class CheckoutQueryCountTest(POSTestMixin, TestCase):
+    """La cantidad de consultas por venta no depende de las líneas del carrito"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+
+    def contar_consultas(self, nombre_url, data):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.post_json(nombre_url, data)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(consultas)
+
+    def assertConsultasConstantes(self, nombre_url, data_para):
+        # La primera venta del día crea el contador de números de venta
+        self.contar_consultas(nombre_url, data_para(1))
+        una_linea = self.contar_consultas(nombre_url, data_para(1))
+        ocho_lineas = self.contar_consultas(nombre_url, data_para(8))
+        self.assertEqual(una_linea, ocho_lineas)
+
+    def test_venta_saldo_virtual(self):
+        self.assertConsultasConstantes(
+            'ventas:api_procesar_venta_saldo',
+            lambda n: {'hijo_id': self.hijo.id, 'items': self.items(n)},
+        )
+
+    def test_venta_efectivo(self):
+        self.assertConsultasConstantes(
+            'ventas:api_procesar_venta_efectivo',
+            lambda n: {'hijo_id': self.hijo.id, 'items': self.items(n), 'monto_efectivo_recibido': 100000},
+        )
+
+    def test_venta_mixta(self):
+        def data(n):
+            PerfilHijo.objects.filter(pk=self.hijo.pk).update(saldo_virtual=Decimal('1000'))
+            total = 3000 * 2 * n
+            return {
+                'hijo_id': self.hijo.id,
+                'items': self.items(n),
+                'forma_pago_adicional': 'efectivo',
+                'monto_adicional': total - 1000,
+            }
+
+        self.assertConsultasConstantes('ventas:api_procesar_venta_mixta', data)
+
+    def test_descuenta_stock_y_crea_detalles(self):
+        items = self.items(3) + [{'producto_id': self.productos[0].id, 'cantidad': 1}]
+        response = self.post_json(
+            'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': items}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+        venta = Venta.objects.get(pk=response.json()['venta_id'])
+        self.assertEqual(venta.total, Decimal('21000'))
+        self.assertEqual(DetalleVenta.objects.filter(venta=venta).count(), 4)
+
+        stock = dict(Producto.objects.values_list('id', 'stock_actual'))
+        self.assertEqual(stock[self.productos[0].id], 97)
+        self.assertEqual(stock[self.productos[1].id], 98)
+        self.assertEqual(stock[self.productos[3].id], 100)
+
+    def test_stock_insuficiente_no_registra_venta(self):
+        items = [{'producto_id': self.productos[0].id, 'cantidad': 60}] * 2
+        response = self.post_json(
+            'ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': items}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Venta.objects.exists())
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock_actual, 100)
+
+
+class CacheReferenciasTest(POSTestMixin, TestCase):
+    """Métodos de pago, puntos de venta y configuración se leen del caché"""
+
+    TABLAS = ('ventas_metodopago', 'ventas_puntoventa', 'facturacion_configuracionfacturacion')
+
+    def setUp(self):
+        self.crear_datos_pos()
+
+    def test_cobro_sin_consultas_a_tablas_de_referencia(self):
+        data = {'hijo_id': self.hijo.id, 'items': self.items(2)}
+        self.post_json('ventas:api_procesar_venta_saldo', data)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.post_json('ventas:api_procesar_venta_saldo', data)
+        self.assertEqual(response.status_code, 200, response.content)
+        for consulta in consultas.captured_queries:
+            for tabla in self.TABLAS:
+                self.assertNotIn(f'FROM "{tabla}"', consulta['sql'])
+
+    def test_guardar_invalida_el_cache(self):
+        self.assertEqual(referencias.punto_venta_activo(), self.punto_venta)
+        self.punto_venta.activo = False
+        self.punto_venta.save()
+        self.assertIsNone(referencias.punto_venta_activo())
+
+        MetodoPago.objects.filter(codigo='efectivo').delete()
+        self.assertIsNone(referencias.metodo_pago('efectivo'))
+
+    def test_otro_proceso_ve_la_nueva_version(self):
+        referencias.referencias()
+        # Otro worker cambió la tabla: sólo aumentó la versión en el caché compartido
+        MetodoPago.objects.filter(codigo='efectivo').update(nombre='Contado')
+        self.assertEqual(referencias.metodo_pago('efectivo').nombre, 'Efectivo')
+        cache.incr(referencias.CLAVE_VERSION)
+        self.assertEqual(referencias.metodo_pago('efectivo').nombre, 'Contado')
+
+
+class IdempotenciaCobroTest(POSTestMixin, TestCase):
+    """Reintentos del POS con la misma clave de idempotencia"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+        self.data = {'hijo_id': self.hijo.id, 'items': self.items(2)}
+
+    def cobrar(self, clave, data=None):
+        return self.post_json(
+            'ventas:api_procesar_venta_saldo', data or self.data, HTTP_IDEMPOTENCY_KEY=clave
+        )
+
+    def test_reintento_devuelve_la_misma_venta(self):
+        primera = self.cobrar('clave-1')
+        self.assertEqual(primera.status_code, 200, primera.content)
+
+        with self.assertNumQueries(3):  # sesión, usuario y la clave
+            reintento = self.cobrar('clave-1')
+
+        self.assertEqual(reintento.json(), primera.json())
+        self.assertEqual(reintento['Idempotent-Replayed'], 'true')
+        self.assertEqual(Venta.objects.count(), 1)
+        self.assertEqual(PerfilHijo.objects.get(pk=self.hijo.pk).saldo_virtual, Decimal('988000'))
+
+    def test_claves_distintas_son_ventas_distintas(self):
+        self.cobrar('clave-1')
+        self.cobrar('clave-2')
+        self.assertEqual(Venta.objects.count(), 2)
+
+    def test_error_libera_la_clave(self):
+        sin_stock = {'hijo_id': self.hijo.id, 'items': [{'producto_id': self.productos[0].id, 'cantidad': 500}]}
+        self.assertEqual(self.cobrar('clave-1', sin_stock).status_code, 400)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+
+        self.assertEqual(self.cobrar('clave-1').status_code, 200)
+        self.assertEqual(Venta.objects.count(), 1)
+
+    def test_clave_en_proceso(self):
+        ClaveIdempotencia.objects.create(
+            clave='clave-1', usuario=self.cajero, ruta=reverse('ventas:api_procesar_venta_saldo'),
+            fecha_expiracion=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(self.cobrar('clave-1').status_code, 409)
+        self.assertFalse(Venta.objects.exists())
+
+    def test_purga_claves_vencidas(self):
+        self.cobrar('clave-1')
+        ClaveIdempotencia.objects.update(fecha_expiracion=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purgar_claves_vencidas(), 1)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+
+
+class TarjetaPorTokenTest(POSTestMixin, TestCase):
+    """Identificación de tarjetas por el token del QR/NFC"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+
+    def test_token_valido_una_consulta_por_clave_primaria(self):
+        token = self.hijo.token_tarjeta
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.post_json('ventas:api_tarjeta_token', {'token': token.lower()})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['tarjeta']['id'], self.hijo.id)
+        consultas_hijo = [q['sql'] for q in consultas.captured_queries if 'usuarios_perfilhijo' in q['sql']]
+        self.assertEqual(len(consultas_hijo), 1)
+        self.assertNotIn('LIKE', consultas_hijo[0])
+
+    def test_firma_alterada(self):
+        token = self.hijo.token_tarjeta
+        alterado = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        response = self.post_json('ventas:api_tarjeta_token', {'token': alterado})
+        self.assertEqual(response.status_code, 400)
+
+    def test_regenerar_revoca_el_token(self):
+        token = self.hijo.token_tarjeta
+        self.hijo.regenerar_tarjeta()
+        response = self.post_json('ventas:api_tarjeta_token', {'token': token})
+        self.assertEqual(response.status_code, 410)
+        response = self.post_json('ventas:api_tarjeta_token', {'token': self.hijo.token_tarjeta})
+        self.assertEqual(response.status_code, 200)
+
+    def test_tarjeta_inactiva(self):
+        token = self.hijo.token_tarjeta
+        self.hijo.desactivar_tarjeta()
+        response = self.post_json('ventas:api_tarjeta_token', {'token': token})
+        self.assertEqual(response.status_code, 404)
+
+
+class SincronizacionVentasTest(POSTestMixin, TestCase):
+    """Cola de ventas hechas sin conexión enviada en un solo pedido"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+
+    def venta(self, id_local, producto=0, cantidad=1, metodo='efectivo', **extra):
+        return dict({
+            'id_local': id_local,
+            'items': [{'producto_id': self.productos[producto].id, 'cantidad': cantidad}],
+            'pagos': [{'metodo_pago': metodo, 'monto': 3000 * cantidad}],
+        }, **extra)
+
+    def sincronizar(self, ventas):
+        response = self.post_json('ventas:api_sincronizar_ventas', {'ventas': ventas})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [resultado['estado'] for resultado in response.json()['resultados']]
+
+    def test_registra_lotes_con_consultas_constantes(self):
+        # La primera venta del día crea el contador de números de venta
+        self.sincronizar([self.venta('inicial', producto=7)])
+        with CaptureQueriesContext(connection) as pocas:
+            self.sincronizar([self.venta(f'a{i}', producto=i % 8) for i in range(5)])
+        with CaptureQueriesContext(connection) as muchas:
+            # Menos de 76 ventas: SQLite parte los INSERT de Venta en lotes de 76 filas
+            self.sincronizar([self.venta(f'b{i}', producto=i % 8) for i in range(70)])
+
+        self.assertEqual(len(pocas), len(muchas))
+        self.assertEqual(Venta.objects.count(), 76)
+        self.assertEqual(len(set(Venta.objects.values_list('numero_venta', flat=True))), 76)
+        self.assertEqual(DetalleVenta.objects.count(), 76)
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock_actual, 100 - 10)
+
+    def test_varios_lotes(self):
+        estados = self.sincronizar([self.venta(f'v{i}', producto=i % 8) for i in range(250)])
+        self.assertEqual(estados.count('aceptada'), 250)
+        self.assertEqual(max(Venta.objects.values_list('numero_venta', flat=True))[-4:], '0250')
+
+    def test_conflictos_de_stock_y_saldo_en_orden(self):
+        Producto.objects.filter(pk=self.productos[0].pk).update(stock_actual=3)
+        PerfilHijo.objects.filter(pk=self.hijo.pk).update(saldo_virtual=Decimal('9000'))
+
+        estados = self.sincronizar([
+            self.venta('s1', producto=0, cantidad=2),
+            self.venta('s2', producto=0, cantidad=2),
+            self.venta('t1', producto=1, cantidad=2, metodo='saldo_virtual', hijo_id=self.hijo.id),
+            self.venta('t2', producto=1, cantidad=1, metodo='saldo_virtual', hijo_id=self.hijo.id),
+            self.venta('t3', producto=1, cantidad=1, metodo='saldo_virtual', hijo_id=self.hijo.id),
+        ])
+
+        self.assertEqual(estados, ['aceptada', 'rechazada', 'aceptada', 'aceptada', 'rechazada'])
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock_actual, 1)
+        self.assertEqual(PerfilHijo.objects.get(pk=self.hijo.pk).saldo_virtual, Decimal('0'))
+        saldos = list(
+            TransaccionTarjeta.objects.filter(hijo=self.hijo).order_by('id').values_list('saldo_anterior', 'saldo_posterior')
+        )
+        self.assertEqual(saldos, [(Decimal('9000'), Decimal('3000')), (Decimal('3000'), Decimal('0'))])
+
+    def test_ventas_en_el_dia_en_que_se_hicieron(self):
+        hoy = timezone.localdate()
+        anteayer = hoy - timedelta(days=2)
+        # 23:30 de anteayer, enviado por el POS en UTC (ya es el día siguiente)
+        hora_pos = timezone.localtime().replace(hour=23, minute=30) - timedelta(days=2)
+        hora_pos = hora_pos.astimezone(dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+
+        estados = self.sincronizar([
+            self.venta('d1', fecha_local=hora_pos, metodo='saldo_virtual', hijo_id=self.hijo.id),
+            self.venta('d2'),
+            self.venta('d3', fecha_local=str(hoy + timedelta(days=1))),
+            self.venta('d4', fecha_local=str(hoy - timedelta(days=30))),
+            self.venta('d5', fecha_local='ayer'),
+        ])
+
+        self.assertEqual(estados, ['aceptada', 'aceptada', 'rechazada', 'rechazada', 'rechazada'])
+        vieja = Venta.objects.get(hijo=self.hijo)
+        self.assertEqual(vieja.fecha_local, anteayer)
+        self.assertTrue(vieja.numero_venta.startswith(f'V{anteayer:%Y%m%d}-'))
+        self.assertEqual(vieja.pagos.get().fecha_local, anteayer)
+        self.assertEqual(TransaccionTarjeta.objects.get(venta_relacionada=vieja).fecha_local, anteayer)
+        self.assertEqual(Venta.objects.exclude(pk=vieja.pk).get().fecha_local, hoy)
+
+    def test_reenvio_no_duplica(self):
+        self.sincronizar([self.venta('r1'), self.venta('r2')])
+        estados = self.sincronizar([self.venta('r1'), self.venta('r2'), self.venta('r3')])
+        self.assertEqual(estados, ['duplicada', 'duplicada', 'aceptada'])
+        self.assertEqual(Venta.objects.count(), 3)
+
+    def crear_clave(self, clave, **campos):
+        campos.setdefault('fecha_expiracion', timezone.now() + timedelta(hours=1))
+        return ClaveIdempotencia.objects.create(
+            clave=clave, usuario=self.cajero, ruta='/ventas/api/procesar-venta-saldo/', **campos
+        )
+
+    def test_clave_en_proceso_queda_pendiente(self):
+        self.crear_clave('p1')
+        estados = self.sincronizar([self.venta('p0'), self.venta('p1'), self.venta('p2')])
+        self.assertEqual(estados, ['aceptada', 'pendiente', 'aceptada'])
+        self.assertEqual(Venta.objects.count(), 2)
+        self.assertEqual(ClaveIdempotencia.objects.get(clave='p1').estado, 'en_proceso')
+
+    def test_retoma_claves_abandonadas_y_vencidas(self):
+        self.crear_clave('a1')
+        ClaveIdempotencia.objects.filter(clave='a1').update(fecha_creacion=timezone.now() - timedelta(minutes=5))
+        self.crear_clave('e1', estado='completada', fecha_expiracion=timezone.now() - timedelta(seconds=1))
+        estados = self.sincronizar([self.venta('a1'), self.venta('e1')])
+        self.assertEqual(estados, ['aceptada', 'aceptada'])
+        self.assertEqual(set(ClaveIdempotencia.objects.values_list('estado', flat=True)), {'completada'})
+
+    def test_rechaza_solo_la_venta_mal_formada(self):
+        estados = self.sincronizar([
+            self.venta('m1'),
+            dict(self.venta('m2'), items=5),
+            dict(self.venta('m3'), items={'producto_id': self.productos[0].id}),
+            dict(self.venta('m4'), pagos='efectivo'),
+            self.venta('m5'),
+        ])
+        self.assertEqual(estados, ['aceptada', 'rechazada', 'rechazada', 'rechazada', 'aceptada'])
+        self.assertEqual(Venta.objects.count(), 2)
+
+    def test_fecha_local_en_ventas_pagos_y_transacciones(self):
+        self.sincronizar([
+            self.venta('f1'),
+            self.venta('f2', metodo='saldo_virtual', hijo_id=self.hijo.id),
+        ])
+        hoy = timezone.localdate()
+        self.assertEqual(set(Venta.objects.values_list('fecha_local', flat=True)), {hoy})
+        self.assertEqual(set(PagoVenta.objects.values_list('fecha_local', flat=True)), {hoy})
+        self.assertEqual(TransaccionTarjeta.objects.get(hijo=self.hijo).fecha_local, hoy)
+
+
+class CostoUnitarioTest(POSTestMixin, TestCase):
+    """Los detalles guardan el costo del producto al momento de la venta"""
+
+    def setUp(self):
+        self.crear_datos_pos()
+
+    def test_venta_y_sincronizacion_guardan_el_costo(self):
+        response = self.post_json('ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(1)})
+        self.assertEqual(response.status_code, 200, response.content)
+        Producto.objects.filter(pk=self.productos[0].pk).update(precio_costo=Decimal('2500'))
+        self.post_json('ventas:api_sincronizar_ventas', {'ventas': [{
+            'id_local': 'c1',
+            'items': [{'producto_id': self.productos[0].id, 'cantidad': 1}],
+            'pagos': [{'metodo_pago': 'efectivo', 'monto': 3000}],
+        }]})
+        self.assertEqual(
+            list(DetalleVenta.objects.order_by('id').values_list('costo_unitario', flat=True)),
+            [Decimal('2000'), Decimal('2500')]
+        )
+
+    def test_rellenar_por_lotes(self):
+        self.post_json('ventas:api_procesar_venta_saldo', {'hijo_id': self.hijo.id, 'items': self.items(3)})
+        DetalleVenta.objects.update(costo_unitario=None)
+        Producto.objects.filter(pk=self.productos[0].pk).update(precio_costo=Decimal('2500'))
+
+        call_command('rellenar_costo_unitario', lote=2, stdout=io.StringIO())
+        self.assertEqual(
+            list(DetalleVenta.objects.order_by('producto__codigo').values_list('costo_unitario', flat=True)),
+            [Decimal('2500'), Decimal('2000'), Decimal('2000')]
+        )
+
+
+class NumeroVentaConcurrenteTest(TransactionTestCase):
+    """Asignación de números de venta con varias ventas en paralelo"""
+
+    VENTAS = 50
+
+    def setUp(self):
+        self.cajero = Usuario.objects.create_user(username='cajero', tipo_usuario='cajero')
+        self.cajas = [
+            PuntoVenta.objects.create(nombre='Caja 1', codigo='CAJA1'),
+            PuntoVenta.objects.create(nombre='Caja 2', codigo='CAJA2'),
+        ]
+
+    def crear_venta(self, punto_venta, errores):
+        try:
+            while True:
+                try:
+                    with transaction.atomic():
+                        Venta.objects.create(punto_venta=punto_venta, cajero=self.cajero, estado='pagada')
+                    return
+                except OperationalError:
+                    # SQLite no soporta escrituras concurrentes: reintentar
+                    time.sleep(0.01)
+        except Exception as e:
+            errores.append(e)
+        finally:
+            connection.close()
+
+    def test_sin_colisiones(self):
+        errores = []
+        hilos = [
+            threading.Thread(target=self.crear_venta, args=(self.cajas[i % 2], errores))
+            for i in range(self.VENTAS)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        numeros = list(Venta.objects.values_list('numero_venta', flat=True))
+        self.assertEqual(len(numeros), self.VENTAS)
+        self.assertEqual(len(set(numeros)), self.VENTAS)
+        for caja in self.cajas:
+            del_dia = Venta.objects.filter(punto_venta=caja).values_list('numero_venta', flat=True)
+            self.assertEqual(sorted(int(numero[-4:]) for numero in del_dia), list(range(1, self.VENTAS // 2 + 1)))
+
+    @skipUnless(connection.vendor == 'postgresql', 'Secuencias de la base sólo en PostgreSQL')
+    def test_numerar_no_espera_a_otra_venta(self):
+        hoy = timezone.localdate()
+        caja = self.cajas[0]
+        SecuenciaVenta.reservar(caja.id, hoy)
+        numeros = []
+
+        def reservar():
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET LOCAL lock_timeout = '200ms'")
+                    numeros.extend(SecuenciaVenta.reservar(caja.id, hoy))
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            # Venta abierta con su número reservado
+            self.assertEqual(SecuenciaVenta.reservar(caja.id, hoy), [2])
+            hilo = threading.Thread(target=reservar)
+            hilo.start()
+            hilo.join()
+        self.assertEqual(numeros, [3])
+
+    def test_reserva_de_rango(self):
+        hoy = timezone.localdate()
+        caja = self.cajas[0]
+        self.assertEqual(SecuenciaVenta.reservar(caja.id, hoy), [1])
+        self.assertEqual(SecuenciaVenta.reservar(caja.id, hoy, cantidad=10), list(range(2, 12)))
+        self.assertEqual(SecuenciaVenta.reservar(self.cajas[1].id, hoy), [1])
+        self.assertEqual(SecuenciaVenta.formatear(caja.id, hoy, 7), f'V{hoy:%Y%m%d}-{caja.id:02d}-0007')
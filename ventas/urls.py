@@ -16,11 +16,14 @@ urlpatterns = [
     # APIs para tarjetas virtuales
     path('api/buscar-tarjeta/', pos_api.buscar_tarjeta_ajax, name='api_buscar_tarjeta'),
     path('api/seleccionar-tarjeta/', pos_api.seleccionar_tarjeta_ajax, name='api_seleccionar_tarjeta'),
+    path('api/tarjeta-token/', pos_api.tarjeta_por_token, name='api_tarjeta_token'),
     path('api/buscar-producto/', pos_api.buscar_producto_ajax, name='api_buscar_producto'),
+    path('api/catalogo-productos/', pos_api.catalogo_productos, name='api_catalogo_productos'),
     path('api/seleccionar-producto/', pos_api.seleccionar_producto_ajax, name='api_seleccionar_producto'),
     path('api/procesar-venta-saldo/', pos_api.procesar_venta_saldo_virtual, name='api_procesar_venta_saldo'),
     path('api/procesar-venta-mixta/', pos_api.procesar_venta_mixta, name='api_procesar_venta_mixta'),
     path('api/procesar-venta-efectivo/', pos_api.procesar_venta_efectivo, name='api_procesar_venta_efectivo'),
+    path('api/sincronizar-ventas/', pos_api.sincronizar_ventas, name='api_sincronizar_ventas'),
     path('nueva/', views.nueva_venta, name='nueva_venta'),
     path('<int:pk>/', views.detalle_venta, name='detalle_venta'),
     path('<int:pk>/factura/', views.generar_factura, name='generar_factura'),
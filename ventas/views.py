@@ -10,7 +10,10 @@ import json
 
 from .models import Venta, DetalleVenta, MetodoPago, PuntoVenta, Factura, PagoVenta
 from productos.models import Producto
-from usuarios.models import PerfilHijo, TransaccionTarjeta
+from productos.stock import reservar_stock, StockInsuficiente
+from productos.busqueda import indice_productos, normalizar
+from usuarios.models import PerfilHijo
+from usuarios.saldo import debitar_saldo, SaldoInsuficiente
 
 @login_required
 def pos_dashboard(request):
@@ -64,19 +67,18 @@ def buscar_producto(request):
         if not termino:
             return JsonResponse({'error': 'Debe proporcionar un término de búsqueda'})
         
-        # Buscar por código exacto primero
-        producto = Producto.objects.filter(codigo=termino, disponible=True).first()
+        # Buscar en el índice en memoria (el código exacto queda primero)
+        productos = indice_productos.buscar(
+            termino, limite=10, queryset=Producto.objects.select_related('categoria')
+        )
+        producto = None
+        if productos and normalizar(productos[0].codigo) == normalizar(termino):
+            producto = productos[0]
         
         if not producto:
-            # Buscar por nombre parcial
-            productos = Producto.objects.filter(
-                nombre__icontains=termino,
-                disponible=True
-            )[:10]  # Limitar a 10 resultados
-            
-            if productos.count() == 1:
-                producto = productos.first()
-            elif productos.count() > 1:
+            if len(productos) == 1:
+                producto = productos[0]
+            elif len(productos) > 1:
                 return JsonResponse({
                     'multiple': True,
                     'productos': [{
@@ -178,21 +180,23 @@ def procesar_venta(request):
                     estado='pendiente'
                 )
                 
-                # Generar número de venta
-                venta.numero_venta = f"V{venta.id:06d}"
-                
                 subtotal = Decimal('0.00')
                 
+                # Reservar stock de todos los productos (bloqueo en orden de id)
+                cantidades = {}
+                for item in items:
+                    producto_id = int(item['producto_id'])
+                    cantidades[producto_id] = cantidades.get(producto_id, 0) + int(item['cantidad'])
+                productos = reservar_stock(cantidades)
+                
                 # Procesar items
                 for item in items:
-                    producto = get_object_or_404(Producto, id=item['producto_id'])
-                    cantidad = Decimal(str(item['cantidad']))
+                    producto = productos.get(int(item['producto_id']))
+                    if producto is None:
+                        raise Producto.DoesNotExist('Producto no encontrado')
+                    cantidad = int(item['cantidad'])
                     precio = Decimal(str(item['precio']))
                     
-                    # Verificar stock
-                    if producto.stock_actual < cantidad:
-                        return JsonResponse({'error': f'Stock insuficiente para {producto.nombre}'})
-                    
                     # Crear detalle de venta
                     detalle = DetalleVenta.objects.create(
                         venta=venta,
@@ -203,10 +207,6 @@ def procesar_venta(request):
                     )
                     
                     subtotal += detalle.subtotal
-                    
-                    # Actualizar stock
-                    producto.stock_actual -= cantidad
-                    producto.save()
                 
                 # Calcular totales
                 venta.subtotal = subtotal
@@ -225,24 +225,15 @@ def procesar_venta(request):
                         puede_comprar, mensaje = hijo.puede_realizar_compra(monto)
                         
                         if not puede_comprar:
-                            return JsonResponse({'error': mensaje})
+                            raise ValueError(mensaje)
                         
-                        # Descontar saldo
-                        saldo_anterior = hijo.saldo_virtual
-                        hijo.saldo_virtual -= monto
-                        hijo.save()
-                        
-                        # Registrar transacción
-                        TransaccionTarjeta.objects.create(
-                            hijo=hijo,
-                            numero_tarjeta_utilizada=hijo.numero_tarjeta,
-                            tipo_transaccion='compra',
-                            monto=-monto,
-                            saldo_anterior=saldo_anterior,
-                            saldo_posterior=hijo.saldo_virtual,
-                            estado='exitosa',
+                        # Descontar saldo y registrar transacción
+                        debitar_saldo(
+                            hijo,
+                            monto,
                             realizada_por=request.user,
                             punto_venta=punto_venta.codigo,
+                            venta=venta,
                             observaciones=f'Compra en POS - Venta #{venta.numero_venta}'
                         )
                     
@@ -273,8 +264,9 @@ def procesar_venta(request):
                     try:
                         # Crear factura automáticamente
                         from facturacion.models import ConfiguracionFacturacion
+                        from .referencias import configuracion_facturacion
                         
-                        config = ConfiguracionFacturacion.objects.first()
+                        config = configuracion_facturacion()
                         if not config:
                             # Crear configuración básica si no existe
                             config = ConfiguracionFacturacion.objects.create(
@@ -311,6 +303,8 @@ def procesar_venta(request):
                     'numero_factura': numero_factura
                 })
                 
+        except (StockInsuficiente, SaldoInsuficiente) as e:
+            return JsonResponse({'error': str(e)})
         except Exception as e:
             return JsonResponse({'error': f'Error procesando venta: {str(e)}'})
     
@@ -355,8 +349,9 @@ def generar_factura(request, pk):
         
         # Crear factura
         from facturacion.models import ConfiguracionFacturacion
+        from .referencias import configuracion_facturacion
         
-        config = ConfiguracionFacturacion.objects.first()
+        config = configuracion_facturacion()
         if not config:
             # Crear configuración básica si no existe
             config = ConfiguracionFacturacion.objects.create(